@@ -1,6 +1,16 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Precarga opcional del SDK de Gemini en segundo plano: el worker
+        # empieza a atender requests sin esperar el import
+        if settings.GEMINI_WARMUP:
+            from .llm_service import calentar
+            threading.Thread(target=calentar, name='gemini-warmup', daemon=True).start()
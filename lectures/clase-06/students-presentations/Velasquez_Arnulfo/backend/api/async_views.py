@@ -0,0 +1,308 @@
+"""
+Variantes async de AdaptarContenidoView y PublicarContenidoView.
+
+DRF no soporta vistas async, así que son vistas nativas de Django
+(async def) que devuelven JsonResponse. Rinden de verdad bajo ASGI
+(uvicorn backend.asgi:application): cada request espera a la red social o a
+Gemini en el event loop en lugar de ocupar un hilo del servidor.
+"""
+import json
+import time
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import Post, Publication, PublicationEvent
+from .llm_service import adaptar_contenido_con_gemini, normalizar_plataformas
+from .publish_service import validar_opciones, ejecutar_publicacion_async
+from .http_client import cerrar_clientes_async
+from .job_queue import huella_opciones, reclamar_en_request, guardar_resultado, fallar_trabajo
+
+
+async def iterar_en_hilo(generador):
+    """
+    Recorre un generador síncrono (que bloquea esperando a Gemini y usa la
+    BD) en un hilo aparte y entrega sus elementos al event loop. Bajo ASGI
+    Django consume completo cualquier iterador síncrono antes de enviarlo;
+    así el StreamingHttpResponse sale de a poco también con uvicorn.
+    """
+    loop = asyncio.get_running_loop()
+    cola = asyncio.Queue()
+    fin = object()
+
+    def producir():
+        try:
+            for elemento in generador:
+                loop.call_soon_threadsafe(cola.put_nowait, elemento)
+        finally:
+            connection.close()
+            loop.call_soon_threadsafe(cola.put_nowait, fin)
+
+    tarea = asyncio.ensure_future(sync_to_async(producir, thread_sensitive=False)())
+    while (elemento := await cola.get()) is not fin:
+        yield elemento
+    await tarea
+
+
+class VistaAsync(View):
+    """
+    Base de las vistas async: sin CSRF (igual que las APIView de DRF) y
+    con el body leído como JSON.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        finally:
+            # Bajo WSGI cada request corre en un event loop propio (async_to_sync)
+            # que se descarta al terminar: sus clientes httpx se cierran con él
+            if not isinstance(request, ASGIRequest):
+                await cerrar_clientes_async()
+
+    def datos(self, request):
+        try:
+            return json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return None
+
+
+class AsyncAdaptarContenidoView(VistaAsync):
+    """
+    Igual que AdaptarContenidoView pero async.
+    Endpoint: POST /api/async/adaptar/
+    """
+    async def post(self, request, *args, **kwargs):
+        datos = self.datos(request)
+        if datos is None:
+            return JsonResponse({"error": "JSON inválido"}, status=400)
+
+        titulo = datos.get('titulo')
+        contenido = datos.get('contenido')
+        if not titulo or not contenido:
+            return JsonResponse({"error": "Faltan datos"}, status=400)
+
+        try:
+            plataformas = normalizar_plataformas(datos.get('plataformas'))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        nuevo_post = await Post.objects.acreate(titulo=titulo, contenido_original=contenido)
+
+        # El SDK de Gemini es síncrono: corre en un hilo aparte sin bloquear el loop
+        adaptaciones_json = await sync_to_async(adaptar_contenido_con_gemini, thread_sensitive=False)(titulo, contenido, plataformas)
+        if "error" in adaptaciones_json:
+            return JsonResponse(adaptaciones_json, status=500)
+
+        pubs = await Publication.objects.abulk_create([
+            Publication(
+                post=nuevo_post,
+                plataforma=plataforma,
+                contenido_adaptado=datos_plataforma.get('text', ''),
+                hashtags=datos_plataforma.get('hashtags', []),
+                estado='draft'
+            )
+            for plataforma, datos_plataforma in adaptaciones_json.items()
+        ])
+
+        # Import diferido: views importa iterar_en_hilo de este módulo
+        from .views import serializar_adaptacion
+
+        response_data = {"post_id": nuevo_post.id, "adaptaciones": {
+            pub.plataforma: serializar_adaptacion(pub, adaptaciones_json[pub.plataforma])
+            for pub in pubs
+        }}
+
+        return JsonResponse(response_data, status=201)
+
+
+class AsyncPublicarContenidoView(VistaAsync):
+    """
+    Publica una Publicación en la red social dentro del request (sin cola)
+    y responde con el resultado final. Respeta el header Idempotency-Key
+    igual que PublicarContenidoView.
+    Endpoint: POST /api/async/publicar/
+    """
+    async def post(self, request, *args, **kwargs):
+        datos = self.datos(request)
+        if datos is None:
+            return JsonResponse({"error": "JSON inválido"}, status=400)
+
+        opciones = {
+            'image_url': datos.get('image_url'),
+            'video_url': datos.get('video_url'),
+            'whatsapp_number': datos.get('whatsapp_number'),
+        }
+        try:
+            pub = await Publication.objects.aget(id=datos.get('publication_id'))
+        except (Publication.DoesNotExist, ValueError, TypeError):
+            return JsonResponse({"error": "Publicación no encontrada"}, status=404)
+
+        error = validar_opciones(pub, opciones)
+        if error:
+            return JsonResponse({"error": error}, status=400)
+
+        if pub.estado == 'published':
+            resultado = {"platform": pub.plataforma, "status": "success", "id": pub.api_id, "url": pub.published_url}
+            return self.respuesta(pub, None, resultado, repetido=True)
+
+        # Reclama la publicación (job en 'running' con la fila bloqueada) antes de
+        # llamar a la red social: ni otro request ni el worker la publican en paralelo
+        clave = request.headers.get('Idempotency-Key')
+        job, pedido, creado = await sync_to_async(reclamar_en_request)(pub, opciones, clave)
+        if not creado:
+            if pedido and pedido.huella != huella_opciones(opciones):
+                return JsonResponse({"error": "Idempotency-Key ya usada con otros datos"}, status=422)
+            if pedido and pedido.resultado:
+                return self.respuesta(pub, pedido.job_id, pedido.resultado, repetido=True)
+            if job is None:
+                return JsonResponse({"error": "La publicación ya se está procesando"}, status=409)
+            # Ya hay un job en curso (de la cola o de otro request): no publicar en paralelo
+            return self.respuesta(pub, job.id, None, repetido=True)
+
+        try:
+            resultado = await ejecutar_publicacion_async(pub, opciones)
+        except Exception as e:
+            await sync_to_async(fallar_trabajo)(job, e)
+            raise
+
+        # Cierra el job y sus pedidos; si quedó pendiente (contenedor de Instagram,
+        # error transitorio) lo sigue el worker desde la cola
+        await sync_to_async(guardar_resultado)(job, resultado)
+
+        return self.respuesta(pub, job.id, resultado, repetido=False)
+
+    def respuesta(self, pub, job_id, resultado, repetido):
+        body = {
+            "status": "completed" if resultado else "queued",
+            "job_id": job_id,
+            "publication_id": pub.id,
+            "platform": pub.plataforma
+        }
+        if resultado:
+            body["resultado"] = resultado
+        response = JsonResponse(body, status=200 if resultado else 202)
+        if repetido:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class EventosPostView(VistaAsync):
+    """
+    Stream SSE (text/event-stream) con los cambios de estado de las
+    Publicaciones de un Post: encolada, publicando, esperando a la red
+    social, publicada o fallida. El cliente publica con POST /api/publicar/
+    y escucha acá en lugar de esperar la respuesta o sondear el job.
+
+    Los eventos salen de la tabla PublicationEvent, así llegan aunque los
+    escriba otro proceso (publish_worker, dispatch_scheduled). Bajo ASGI
+    cada cliente conectado es una corrutina dormida, no un hilo; bajo WSGI
+    (gunicorn backend.wsgi) el stream sale con un generador síncrono y
+    cada cliente ocupa un worker mientras dure.
+
+    El stream termina cuando no quedan publicaciones en curso o a los
+    SSE_MAX_SECONDS; EventSource reconecta solo y con el header
+    Last-Event-ID retoma desde el último evento recibido.
+    Endpoint: GET /api/posts/<id>/events/
+    """
+    ESTADOS_EN_CURSO = ('queued', 'processing', 'scheduled')
+
+    async def get(self, request, id, *args, **kwargs):
+        if not await Post.objects.filter(id=id).aexists():
+            return JsonResponse({"error": "Post no encontrado"}, status=404)
+
+        try:
+            ultimo = int(request.headers.get('Last-Event-ID') or request.GET.get('desde') or 0)
+        except ValueError:
+            ultimo = 0
+
+        if isinstance(request, ASGIRequest):
+            eventos = self.eventos(id, ultimo)
+        else:
+            # Bajo WSGI Django junta completo un iterador async antes de enviarlo
+            eventos = self.eventos_sync(id, ultimo)
+
+        response = StreamingHttpResponse(eventos, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Que nginx no acumule el stream
+        return response
+
+    def consultar(self, post_id, ultimo):
+        """
+        Eventos del post posteriores a `ultimo` y si queda alguna publicación
+        en curso (solo se consulta si no hubo eventos).
+        """
+        nuevos = list(
+            PublicationEvent.objects.filter(post_id=post_id, id__gt=ultimo)
+            .select_related('publication').order_by('id')[:100]
+        )
+        en_curso = bool(nuevos) or Publication.objects.filter(
+            post_id=post_id, estado__in=self.ESTADOS_EN_CURSO
+        ).exists()
+        return nuevos, en_curso
+
+    async def eventos(self, post_id, ultimo):
+        # Milisegundos que espera EventSource antes de reconectar
+        yield f"retry: {int(settings.SSE_POLL_INTERVAL * 3000)}\n\n"
+
+        inicio = ultimo_envio = time.monotonic()
+        while time.monotonic() - inicio < settings.SSE_MAX_SECONDS:
+            nuevos, en_curso = await sync_to_async(self.consultar)(post_id, ultimo)
+            for evento in nuevos:
+                ultimo = evento.id
+                yield self.formatear(evento)
+
+            if nuevos:
+                ultimo_envio = time.monotonic()
+            elif not en_curso:
+                yield "event: end\ndata: {}\n\n"
+                return
+            # Comentario SSE: mantiene viva la conexión en proxies y detecta clientes caídos
+            elif time.monotonic() - ultimo_envio >= settings.SSE_HEARTBEAT_SECONDS:
+                ultimo_envio = time.monotonic()
+                yield ": ping\n\n"
+
+            await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+
+    def eventos_sync(self, post_id, ultimo):
+        """
+        El mismo stream para WSGI: bloquea el worker en time.sleep entre consultas.
+        """
+        yield f"retry: {int(settings.SSE_POLL_INTERVAL * 3000)}\n\n"
+
+        inicio = ultimo_envio = time.monotonic()
+        while time.monotonic() - inicio < settings.SSE_MAX_SECONDS:
+            nuevos, en_curso = self.consultar(post_id, ultimo)
+            for evento in nuevos:
+                ultimo = evento.id
+                yield self.formatear(evento)
+
+            if nuevos:
+                ultimo_envio = time.monotonic()
+            elif not en_curso:
+                yield "event: end\ndata: {}\n\n"
+                return
+            elif time.monotonic() - ultimo_envio >= settings.SSE_HEARTBEAT_SECONDS:
+                ultimo_envio = time.monotonic()
+                yield ": ping\n\n"
+
+            time.sleep(settings.SSE_POLL_INTERVAL)
+
+    def formatear(self, evento):
+        datos = {
+            "publication_id": evento.publication_id,
+            "platform": evento.publication.plataforma,
+            "tipo": evento.tipo,
+            "mensaje": evento.mensaje,
+            "datos": evento.datos,
+            "creado_en": evento.creado_en.isoformat(),
+        }
+        return f"id: {evento.id}\nevent: {evento.tipo}\ndata: {json.dumps(datos)}\n\n"
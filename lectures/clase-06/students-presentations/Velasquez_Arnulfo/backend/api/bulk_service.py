@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post, Publication
+from .llm_service import adaptar_lote_con_gemini, normalizar_plataformas
+
+
+def leer_semillas(contenido, nombre_archivo):
+    """
+    Lee las semillas (titulo, contenido) de un CSV con columnas 'titulo' y
+    'contenido' o de un JSONL con un objeto por línea.
+    Lanza ValueError si el formato no es válido.
+    """
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+
+    if nombre_archivo.lower().endswith('.csv'):
+        filas = list(csv.DictReader(io.StringIO(contenido)))
+    elif nombre_archivo.lower().endswith(('.jsonl', '.ndjson')):
+        try:
+            filas = [json.loads(linea) for linea in contenido.splitlines() if linea.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSONL inválido: {e}")
+    else:
+        raise ValueError("Formato no soportado: usa un archivo .csv o .jsonl")
+
+    return validar_semillas(filas)
+
+
+def validar_semillas(filas):
+    """
+    Convierte una lista de dicts {titulo, contenido} en tuplas.
+    Lanza ValueError indicando la primera fila incompleta.
+    """
+    semillas = []
+    for numero, fila in enumerate(filas, start=1):
+        titulo = (fila.get('titulo') or '').strip() if isinstance(fila, dict) else ''
+        contenido = (fila.get('contenido') or '').strip() if isinstance(fila, dict) else ''
+        if not titulo or not contenido:
+            raise ValueError(f"Fila {numero}: faltan 'titulo' o 'contenido'")
+        semillas.append((titulo, contenido))
+    if not semillas:
+        raise ValueError("No hay posts para adaptar")
+    return semillas
+
+
+def armar_lotes(semillas, tamano_lote, max_caracteres):
+    """
+    Agrupa los índices de las semillas en lotes de hasta `tamano_lote` y
+    hasta `max_caracteres` de texto original, para que el prompt de cada
+    llamada a Gemini no crezca de más. Una semilla muy larga va sola.
+    """
+    lotes, actual, caracteres = [], [], 0
+    for i, (titulo, contenido) in enumerate(semillas):
+        largo = len(titulo) + len(contenido)
+        if actual and (len(actual) >= tamano_lote or caracteres + largo > max_caracteres):
+            lotes.append(actual)
+            actual, caracteres = [], 0
+        actual.append(i)
+        caracteres += largo
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+def adaptar_en_lote(semillas, plataformas=None, tamano_lote=None, concurrencia=None):
+    """
+    Adapta muchas semillas agrupándolas en lotes (varias por llamada a
+    Gemini) que corren en un pool de hilos acotado (LLM_BULK_CONCURRENCY).
+
+    Los Post se crean todos juntos con bulk_create y las Publication de cada
+    lote con otro bulk_create apenas el lote termina.
+
+    Es un generador: produce un dict de progreso por lote terminado
+    ({"hechos", "total", "posts"}) y al final uno con "fin": True y el resumen.
+    """
+    plataformas = normalizar_plataformas(plataformas)
+    tamano_lote = tamano_lote or settings.LLM_BULK_BATCH_SIZE
+    concurrencia = concurrencia or settings.LLM_BULK_CONCURRENCY
+    inicio = time.monotonic()
+
+    posts = Post.objects.bulk_create([
+        Post(titulo=titulo, contenido_original=contenido) for titulo, contenido in semillas
+    ])
+    lotes = armar_lotes(semillas, tamano_lote, settings.LLM_BULK_MAX_CHARS)
+
+    def procesar(indices):
+        try:
+            return indices, adaptar_lote_con_gemini([semillas[i] for i in indices], plataformas)
+        except Exception as e:
+            return indices, [{"error": f"Error al procesar la solicitud: {e}"}] * len(indices)
+        finally:
+            # Cada hilo abre su propia conexión a la BD (cache de adaptaciones)
+            connection.close()
+
+    hechos = ok = errores = 0
+    with ThreadPoolExecutor(max_workers=min(concurrencia, len(lotes))) as executor:
+        futuros = [executor.submit(procesar, lote) for lote in lotes]
+        for futuro in as_completed(futuros):
+            indices, resultados = futuro.result()
+
+            nuevas = []
+            for i, adaptaciones in zip(indices, resultados):
+                if "error" in adaptaciones:
+                    continue
+                nuevas += [
+                    Publication(
+                        post=posts[i],
+                        plataforma=plataforma,
+                        contenido_adaptado=datos.get('text', ''),
+                        hashtags=datos.get('hashtags', []),
+                        estado='draft'
+                    )
+                    for plataforma, datos in adaptaciones.items()
+                ]
+            Publication.objects.bulk_create(nuevas)
+
+            ids_por_post = {}
+            for pub in nuevas:
+                ids_por_post.setdefault(pub.post_id, {})[pub.plataforma] = pub.id
+
+            resumen = []
+            for i, adaptaciones in zip(indices, resultados):
+                if "error" in adaptaciones:
+                    errores += 1
+                    resumen.append({"post_id": posts[i].id, "titulo": posts[i].titulo, "error": adaptaciones["error"]})
+                else:
+                    ok += 1
+                    resumen.append({"post_id": posts[i].id, "titulo": posts[i].titulo, "publicaciones": ids_por_post.get(posts[i].id, {})})
+
+            hechos += len(indices)
+            yield {"hechos": hechos, "total": len(semillas), "posts": resumen}
+
+    segundos = time.monotonic() - inicio
+    yield {
+        "fin": True,
+        "total": len(semillas),
+        "ok": ok,
+        "errores": errores,
+        "lotes": len(lotes),
+        "segundos": round(segundos, 2),
+        "posts_por_minuto": round(ok / segundos * 60, 1) if segundos else None,
+    }
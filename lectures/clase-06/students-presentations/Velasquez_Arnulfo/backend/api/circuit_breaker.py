@@ -0,0 +1,240 @@
+import time
+import asyncio
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+
+from .models import CircuitBreakerState
+from .rate_limit import ultima_espera, reiniciar_espera
+from .retry_service import es_reintentable
+
+logger = logging.getLogger(__name__)
+
+
+def _obtener_estado(plataforma):
+    estado, _ = CircuitBreakerState.objects.get_or_create(
+        plataforma=plataforma, defaults={'ventana_inicio': time.time()}
+    )
+    return estado
+
+
+def _transicion(registro, **cambios):
+    """
+    Cambia el estado solo si nadie lo modificó desde que lo leímos
+    (compare-and-swap por versión). Retorna True si ganamos.
+    """
+    return bool(CircuitBreakerState.objects.filter(id=registro.id, version=registro.version).update(
+        version=F('version') + 1, **cambios
+    ))
+
+
+def permitir_llamada(plataforma):
+    """
+    Decide si se puede llamar a la plataforma.
+
+    - closed: siempre.
+    - open: nunca, hasta que pasen CIRCUIT_OPEN_SECONDS.
+    - half_open: solo una llamada de prueba a la vez (en todos los procesos).
+
+    Returns:
+        (True, 0) o (False, segundos_hasta_reintentar)
+    """
+    permitido, segundos, _ = _permitir(plataforma)
+    return permitido, segundos
+
+
+def _permitir(plataforma):
+    """
+    permitir_llamada + el prueba_desde que marcó esta llamada si es la de
+    prueba del half-open (None si no lo es), para poder liberarla.
+    """
+    config = settings.CIRCUIT_BREAKER
+    estado = _obtener_estado(plataforma)
+    ahora = time.time()
+
+    if estado.estado == 'closed':
+        return True, 0, None
+
+    if estado.estado == 'open':
+        restante = estado.abierto_en + config['open_seconds'] - ahora
+        if restante > 0:
+            return False, restante, None
+        # Pasó el tiempo: este proceso intenta ser quien hace la llamada de prueba
+        if _transicion(estado, estado='half_open', prueba_desde=ahora):
+            logger.warning(f"Circuito {plataforma}: half-open, enviando llamada de prueba")
+            return True, 0, ahora
+        return False, config['probe_timeout'], None
+
+    # half_open: si la prueba anterior quedó colgada, otro puede probar
+    if ahora - (estado.prueba_desde or 0) > config['probe_timeout']:
+        if _transicion(estado, prueba_desde=ahora):
+            return True, 0, ahora
+    return False, config['probe_timeout'], None
+
+
+def liberar_prueba(plataforma, prueba_desde):
+    """
+    La llamada de prueba no llegó al proveedor (la frenó el rate limiter):
+    el circuito sigue half-open, sin contar fallo, y la siguiente llamada
+    puede probar de inmediato en vez de esperar probe_timeout.
+    """
+    if prueba_desde is None:
+        return
+    CircuitBreakerState.objects.filter(
+        plataforma=plataforma, estado='half_open', prueba_desde=prueba_desde
+    ).update(version=F('version') + 1, prueba_desde=None)
+
+
+def registrar_resultado(plataforma, fallo, lenta):
+    """
+    Registra el resultado de una llamada y abre/cierra el circuito.
+    Dispara por tasa de error o por tasa de llamadas lentas dentro de la ventana.
+    """
+    config = settings.CIRCUIT_BREAKER
+    estado = _obtener_estado(plataforma)
+    ahora = time.time()
+
+    if estado.estado == 'half_open':
+        if fallo or lenta:
+            _transicion(estado, estado='open', abierto_en=ahora, prueba_desde=None)
+            logger.error(f"Circuito {plataforma}: la prueba falló, vuelve a open")
+        else:
+            _transicion(estado, estado='closed', llamadas=0, fallos=0, lentas=0,
+                        ventana_inicio=ahora, prueba_desde=None)
+            logger.info(f"Circuito {plataforma}: closed")
+        return
+
+    if estado.estado != 'closed':
+        return
+
+    # Ventana vencida: empezamos a contar de nuevo
+    if ahora - estado.ventana_inicio > config['window_seconds']:
+        _transicion(estado, llamadas=0, fallos=0, lentas=0, ventana_inicio=ahora)
+
+    CircuitBreakerState.objects.filter(id=estado.id).update(
+        llamadas=F('llamadas') + 1,
+        fallos=F('fallos') + (1 if fallo else 0),
+        lentas=F('lentas') + (1 if lenta else 0),
+    )
+
+    estado.refresh_from_db()
+    if estado.estado != 'closed' or estado.llamadas < config['min_calls']:
+        return
+
+    tasa_error = estado.fallos / estado.llamadas
+    tasa_lentas = estado.lentas / estado.llamadas
+    if tasa_error >= config['error_rate'] or tasa_lentas >= config['slow_rate']:
+        if _transicion(estado, estado='open', abierto_en=ahora):
+            logger.error(
+                f"Circuito {plataforma}: OPEN (errores {tasa_error:.0%}, lentas {tasa_lentas:.0%} "
+                f"en {estado.llamadas} llamadas)"
+            )
+
+
+def _resultado_abierto(plataforma, segundos):
+    return {
+        "platform": plataforma,
+        "status": "error",
+        "message": f"{plataforma} no está respondiendo (circuito abierto), reintentar en {segundos:.0f}s",
+        "circuit_open": True,
+        "retryable": True,
+        "retry_after": segundos
+    }
+
+
+def _clasificar(plataforma, result, inicio):
+    """
+    Retorna (fallo, lenta) para una llamada que terminó sin excepción.
+    El tiempo esperando en el rate limiter no es latencia del proveedor.
+    """
+    latencia = time.monotonic() - inicio - ultima_espera()
+    umbral = settings.CIRCUIT_SLOW_CALL_SECONDS.get(plataforma, settings.CIRCUIT_SLOW_CALL_SECONDS['default'])
+    fallo = isinstance(result, dict) and result.get('status') == 'error' and es_reintentable(result)
+    return fallo, latencia > umbral
+
+
+def circuit_breaker(plataforma):
+    """
+    Decorador: si el circuito de la plataforma está abierto retorna al instante
+    un error 'circuit_open' (reintentable más tarde) sin tocar la red.
+    Cuenta como fallo solo lo que indica una caída del proveedor (errores
+    transitorios o llamadas lentas), no los 4xx permanentes ni el throttling.
+    Funciona también sobre funciones async.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper_async(*args, **kwargs):
+                permitido, segundos, prueba = await sync_to_async(_permitir)(plataforma)
+                if not permitido:
+                    return _resultado_abierto(plataforma, segundos)
+
+                reiniciar_espera()
+                inicio = time.monotonic()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception:
+                    await sync_to_async(registrar_resultado)(plataforma, fallo=True, lenta=False)
+                    raise
+
+                if isinstance(result, dict) and result.get('throttled'):
+                    # No llegamos a llamar al proveedor
+                    await sync_to_async(liberar_prueba)(plataforma, prueba)
+                    return result
+
+                fallo, lenta = _clasificar(plataforma, result, inicio)
+                await sync_to_async(registrar_resultado)(plataforma, fallo=fallo, lenta=lenta)
+                return result
+
+            return wrapper_async
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            permitido, segundos, prueba = _permitir(plataforma)
+            if not permitido:
+                return _resultado_abierto(plataforma, segundos)
+
+            reiniciar_espera()
+            inicio = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                registrar_resultado(plataforma, fallo=True, lenta=False)
+                raise
+
+            if isinstance(result, dict) and result.get('throttled'):
+                # No llegamos a llamar al proveedor
+                liberar_prueba(plataforma, prueba)
+                return result
+
+            fallo, lenta = _clasificar(plataforma, result, inicio)
+            registrar_resultado(plataforma, fallo=fallo, lenta=lenta)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def estado_circuitos():
+    """
+    Estado de todos los circuitos (para el endpoint).
+    """
+    config = settings.CIRCUIT_BREAKER
+    ahora = time.time()
+    estados = []
+    for estado in CircuitBreakerState.objects.order_by('plataforma'):
+        reabre_en = None
+        if estado.estado == 'open':
+            reabre_en = max(0, round(estado.abierto_en + config['open_seconds'] - ahora, 1))
+        estados.append({
+            "plataforma": estado.plataforma,
+            "estado": estado.estado,
+            "llamadas": estado.llamadas,
+            "fallos": estado.fallos,
+            "lentas": estado.lentas,
+            "half_open_en_segundos": reabre_en
+        })
+    return estados
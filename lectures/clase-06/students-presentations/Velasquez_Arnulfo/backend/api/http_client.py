@@ -0,0 +1,120 @@
+import os
+import asyncio
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# Plataformas que comparten host usan la misma sesión (y el mismo pool de conexiones)
+ALIAS_PLATAFORMAS = {
+    'instagram': 'facebook',  # Ambas van a graph.facebook.com
+}
+
+_sesiones = {}
+_lock = threading.Lock()
+
+
+class SesionConTimeout(requests.Session):
+    """
+    Session de requests que aplica un timeout (connect, read) por defecto
+    a todas las llamadas que no indiquen uno explícito.
+    """
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def crear_sesion():
+    """
+    Crea una sesión keep-alive con un pool de conexiones ajustado.
+    Los reintentos los maneja retry_service, no urllib3.
+    """
+    sesion = SesionConTimeout(timeout=(settings.SOCIAL_HTTP_CONNECT_TIMEOUT, settings.SOCIAL_HTTP_READ_TIMEOUT))
+    adapter = HTTPAdapter(
+        pool_connections=settings.SOCIAL_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.SOCIAL_HTTP_POOL_MAXSIZE,
+        max_retries=0,
+    )
+    sesion.mount('https://', adapter)
+    sesion.mount('http://', adapter)
+    sesion.headers.update({'Connection': 'keep-alive'})
+    return sesion
+
+
+def get_session(plataforma):
+    """
+    Devuelve la sesión HTTP compartida de una plataforma, creándola la primera vez.
+    Se reutiliza entre requests y entre hilos del mismo proceso, así que las
+    conexiones TCP+TLS a cada API quedan abiertas (keep-alive).
+    """
+    clave = ALIAS_PLATAFORMAS.get(plataforma, plataforma)
+    sesion = _sesiones.get(clave)
+    if sesion is None:
+        with _lock:
+            sesion = _sesiones.get(clave)
+            if sesion is None:
+                sesion = crear_sesion()
+                _sesiones[clave] = sesion
+    return sesion
+
+
+def cerrar_sesiones():
+    """
+    Cierra todas las sesiones abiertas (y sus conexiones).
+    """
+    with _lock:
+        for sesion in _sesiones.values():
+            sesion.close()
+        _sesiones.clear()
+
+
+# Clientes async (httpx) por event loop: un AsyncClient no se puede usar
+# desde otro loop. Con ASGI (uvicorn) hay un solo loop por proceso; bajo WSGI
+# cada vista async corre en un loop nuevo y VistaAsync cierra sus clientes
+# (cerrar_clientes_async) al terminar el request.
+_clientes_async = weakref.WeakKeyDictionary()
+
+
+def get_async_client(plataforma):
+    """
+    Devuelve el httpx.AsyncClient compartido de una plataforma en el event
+    loop actual. Su pool mantiene las conexiones abiertas (keep-alive) y
+    limita cuántas hay a la vez, así cientos de publicaciones concurrentes
+    comparten unas pocas conexiones por API.
+    """
+    loop = asyncio.get_running_loop()
+    clientes = _clientes_async.setdefault(loop, {})
+    clave = ALIAS_PLATAFORMAS.get(plataforma, plataforma)
+    cliente = clientes.get(clave)
+    if cliente is None:
+        cliente = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.SOCIAL_HTTP_READ_TIMEOUT, connect=settings.SOCIAL_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.SOCIAL_HTTP_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SOCIAL_HTTP_POOL_MAXSIZE,
+            ),
+            follow_redirects=True,  # Igual que requests
+        )
+        clientes[clave] = cliente
+    return cliente
+
+
+async def cerrar_clientes_async():
+    """
+    Cierra los clientes async del event loop actual (y sus conexiones).
+    """
+    clientes = _clientes_async.pop(asyncio.get_running_loop(), {})
+    for cliente in clientes.values():
+        await cliente.aclose()
+
+
+# Tras un fork (gunicorn --preload) el hijo no debe reutilizar los sockets del padre
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_sesiones.clear)
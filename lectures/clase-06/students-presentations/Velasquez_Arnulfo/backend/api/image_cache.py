@@ -0,0 +1,250 @@
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.parse
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+
+from .models import ImagenGenerada
+from .http_client import get_session
+from .media_service import BLOQUE_LECTURA, nombre_media
+
+logger = logging.getLogger(__name__)
+
+CARPETA = 'generated_images'
+POLLINATIONS_URL = 'https://image.pollinations.ai/prompt/'
+EXTENSIONES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+# Las descargas corren en un pool propio: la adaptación no espera a Pollinations
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PREFETCH_CONCURRENCY, thread_name_prefix='imagenes'
+                )
+    return _executor
+
+
+def seed_para(prompt):
+    """
+    Seed fija por prompt: el mismo prompt da la misma imagen (y la misma
+    fila en la cache) en lugar de una nueva en cada adaptación.
+    """
+    return int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16) % 1_000_000
+
+
+def url_pollinations(prompt, seed):
+    return f"{POLLINATIONS_URL}{urllib.parse.quote(prompt)}?nologo=true&seed={seed}"
+
+
+def desde_url_pollinations(url):
+    """
+    (prompt, seed) de una URL armada por url_pollinations, o None.
+    """
+    if not url or not url.startswith(POLLINATIONS_URL):
+        return None
+    partes = urllib.parse.urlparse(url)
+    seed = urllib.parse.parse_qs(partes.query).get('seed', [''])[0]
+    if not seed.isdigit():
+        return None
+    return urllib.parse.unquote(partes.path[len('/prompt/'):]), int(seed)
+
+
+def clave_imagen(prompt, seed):
+    return hashlib.sha256(f"{seed}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def url_media(nombre):
+    """
+    URL de un archivo de MEDIA_ROOT: absoluta si hay PUBLIC_BASE_URL, si no relativa.
+    """
+    return f"{settings.PUBLIC_BASE_URL}{settings.MEDIA_URL}{nombre}"
+
+
+def media_publica():
+    """
+    True si una red social puede descargar nuestro /media/: hay URL pública
+    configurada y el backend realmente sirve los archivos.
+    """
+    return bool(settings.PUBLIC_BASE_URL) and settings.SERVE_MEDIA
+
+
+def precargar(prompt, seed):
+    """
+    Registra la imagen de (prompt, seed) y, si no está descargada ni
+    descargándose, la manda a bajar en segundo plano. Retorna la fila.
+    """
+    ahora = timezone.now()
+    imagen, creada = ImagenGenerada.objects.get_or_create(
+        clave=clave_imagen(prompt, seed),
+        defaults={'prompt': prompt, 'seed': seed, 'url_origen': url_pollinations(prompt, seed), 'ultimo_uso': ahora}
+    )
+
+    # Una descarga 'pending' más vieja que el timeout quedó colgada (el proceso murió)
+    colgada = imagen.estado == 'pending' and imagen.ultimo_uso < ahora - timedelta(seconds=settings.IMAGE_PREFETCH_TIMEOUT * 2)
+    relanzar = imagen.estado in ('failed', 'evicted') or colgada
+    if relanzar:
+        # Compare-and-swap: solo un proceso la relanza
+        relanzar = ImagenGenerada.objects.filter(
+            id=imagen.id, estado=imagen.estado, ultimo_uso=imagen.ultimo_uso
+        ).update(estado='pending', ultimo_uso=ahora, error='')
+        imagen.estado = 'pending'
+    elif not creada:
+        ImagenGenerada.objects.filter(id=imagen.id).update(ultimo_uso=ahora)
+
+    if creada or relanzar:
+        _pool().submit(_descargar, imagen.id)
+    return imagen
+
+
+def _descargar(imagen_id):
+    """
+    Baja la imagen en streaming (hasheando mientras llega) y la guarda como
+    generated_images/<sha256 del contenido><ext>. Si el archivo ya existe
+    (otro prompt dio la misma imagen) no se vuelve a escribir.
+    """
+    try:
+        imagen = ImagenGenerada.objects.get(id=imagen_id)
+        inicio = time.monotonic()
+        with get_session('pollinations').get(
+            imagen.url_origen, stream=True,
+            timeout=(settings.SOCIAL_HTTP_CONNECT_TIMEOUT, settings.IMAGE_PREFETCH_TIMEOUT)
+        ) as response:
+            tipo = response.headers.get('Content-Type', '').split(';')[0].strip()
+            if response.status_code != 200 or not tipo.startswith('image/'):
+                raise IOError(f"Pollinations respondió HTTP {response.status_code} ({tipo or 'sin Content-Type'})")
+
+            huella = hashlib.sha256()
+            tamano = 0
+            with tempfile.TemporaryFile() as temporal:
+                for bloque in response.iter_content(chunk_size=BLOQUE_LECTURA):
+                    tamano += len(bloque)
+                    if tamano > settings.IMAGE_MAX_BYTES:
+                        raise IOError(f"La imagen supera {settings.IMAGE_MAX_BYTES} bytes")
+                    huella.update(bloque)
+                    temporal.write(bloque)
+
+                nombre = f"{CARPETA}/{huella.hexdigest()}{EXTENSIONES.get(tipo, '.jpg')}"
+                if not default_storage.exists(nombre):
+                    temporal.seek(0)
+                    nombre = default_storage.save(nombre, File(temporal))
+
+        ImagenGenerada.objects.filter(id=imagen_id).update(estado='ready', archivo=nombre, bytes=tamano)
+        logger.info(f"Imagen {imagen.clave[:12]} descargada en {time.monotonic() - inicio:.1f}s ({tamano} bytes)")
+        desalojar()
+    except Exception as e:
+        logger.warning(f"No se pudo descargar la imagen {imagen_id}: {e}")
+        ImagenGenerada.objects.filter(id=imagen_id).update(estado='failed', error=str(e)[:500])
+    finally:
+        # Hilo del pool: cierra su conexión a la BD
+        connection.close()
+
+
+def desalojar():
+    """
+    Si los archivos superan GENERATED_IMAGES_MAX_MB, borra los de uso más
+    antiguo hasta quedar en el 90% del límite. Un archivo compartido por
+    varias filas cuenta una vez y se borra cuando se desalojan todas.
+    Las filas quedan como 'evicted' (con su url_origen) para volver a
+    bajarlas o usar Pollinations si se piden otra vez.
+    """
+    limite = settings.GENERATED_IMAGES_MAX_MB * 1024 * 1024
+    archivos = {}  # archivo -> (bytes, último uso de cualquiera de sus filas)
+    for archivo, tamano, ultimo_uso in ImagenGenerada.objects.filter(estado='ready').values_list(
+        'archivo', 'bytes', 'ultimo_uso'
+    ):
+        anterior = archivos.get(archivo)
+        archivos[archivo] = (tamano, max(ultimo_uso, anterior[1]) if anterior else ultimo_uso)
+
+    total = sum(tamano for tamano, _ in archivos.values())
+    if total <= limite:
+        return 0
+
+    borrados = 0
+    for archivo, (tamano, _) in sorted(archivos.items(), key=lambda item: item[1][1]):
+        if total <= limite * 0.9:
+            break
+        ImagenGenerada.objects.filter(archivo=archivo, estado='ready').update(estado='evicted')
+        try:
+            default_storage.delete(archivo)
+        except Exception as e:
+            logger.warning(f"No se pudo borrar {archivo}: {e}")
+        total -= tamano
+        borrados += 1
+    logger.info(f"Imágenes generadas: {borrados} archivos desalojados, quedan {total / 1024 / 1024:.1f} MB")
+    return borrados
+
+
+def url_imagen(prompt):
+    """
+    URL para la adaptación: la copia local si ya está descargada y /media/
+    se sirve (SERVE_MEDIA); si no, la de Pollinations (misma seed) mientras
+    la precarga corre en segundo plano.
+    """
+    imagen = precargar(prompt, seed_para(prompt))
+    if settings.SERVE_MEDIA and imagen.estado == 'ready' and default_storage.exists(imagen.archivo):
+        return url_media(imagen.archivo)
+    return imagen.url_origen
+
+
+def url_para_publicar(url, plataforma):
+    """
+    Cambia una imagen generada por su copia local al publicar, si ya está
+    descargada. Así la red social no espera a que Pollinations la renderice
+    (Facebook la sube desde el disco). No espera una descarga en curso: eso
+    bloquearía el request o el hilo del worker; la URL de Pollinations sirve
+    igual y la precarga ya la está renderizando.
+
+    Instagram descarga la imagen por su cuenta: solo recibe la copia local
+    si media_publica(); si no, recibe la URL de Pollinations.
+    """
+    nombre = nombre_media(url)
+    if nombre and nombre.startswith(f"{CARPETA}/"):
+        # Ya es la copia local (la adaptación salió de la cache de imágenes)
+        imagen = ImagenGenerada.objects.filter(archivo=nombre).order_by('-ultimo_uso').first()
+        existe = default_storage.exists(nombre)
+        if existe and (plataforma != 'instagram' or media_publica()):
+            return url_media(nombre)
+        return imagen.url_origen if imagen else url
+
+    datos = desde_url_pollinations(url)
+    if not datos or (plataforma == 'instagram' and not media_publica()):
+        return url
+
+    imagen = precargar(*datos)
+    if imagen.estado == 'ready' and default_storage.exists(imagen.archivo):
+        return url_media(imagen.archivo)
+    return url
+
+
+def estadisticas():
+    """
+    Cantidad y tamaño de las imágenes por estado (para el endpoint).
+    """
+    por_estado = {estado: {"imagenes": 0, "bytes": 0} for estado in ('pending', 'ready', 'failed', 'evicted')}
+    archivos = set()
+    for estado, archivo, tamano in ImagenGenerada.objects.values_list('estado', 'archivo', 'bytes'):
+        por_estado[estado]["imagenes"] += 1
+        if estado == 'ready' and archivo not in archivos:
+            archivos.add(archivo)
+            por_estado[estado]["bytes"] += tamano
+    return {
+        "limite_mb": settings.GENERATED_IMAGES_MAX_MB,
+        "archivos": len(archivos),
+        "mb_usados": round(por_estado['ready']["bytes"] / 1024 / 1024, 2),
+        "por_estado": por_estado,
+    }
@@ -0,0 +1,352 @@
+import json
+import hashlib
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Publication, PublishJob, PublishAttempt, PublicationEvent
+from .publish_service import ejecutar_publicacion, validar_opciones
+from .retry_service import reintentos_diferidos
+from .notification_service import notify_event
+
+logger = logging.getLogger(__name__)
+
+
+def generar_worker_id():
+    """
+    Identificador único del proceso worker (host + pid).
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encolar_publicacion(pub, opciones):
+    """
+    Crea un PublishJob pendiente y marca la publicación como 'queued'.
+    """
+    with transaction.atomic():
+        job = PublishJob.objects.create(publication=pub, opciones=opciones)
+        pub.estado = 'queued'
+        pub.auto_retry_count = 0  # Cada pedido del usuario trae su propio presupuesto de reintentos
+        pub.save(update_fields=['estado', 'auto_retry_count'])
+        notify_event(pub, 'queued', f"En cola para {pub.plataforma.upper()}", job_id=job.id)
+    return job
+
+
+def huella_opciones(opciones):
+    """
+    sha256 de las opciones del pedido, para detectar una Idempotency-Key
+    reutilizada con otro contenido.
+    """
+    return hashlib.sha256(json.dumps(opciones, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def trabajo_activo(pub):
+    """
+    Trabajo pendiente o en ejecución de la publicación, si lo hay.
+    """
+    return pub.jobs.filter(estado__in=('pending', 'running')).order_by('-id').first()
+
+
+def encolar_si_libre(pub, opciones):
+    """
+    Encola la publicación salvo que ya tenga un job en curso, que se reutiliza.
+    La fila de la publicación se bloquea (SELECT ... FOR UPDATE; en SQLite
+    serializa el BEGIN IMMEDIATE) antes de buscar el job en curso: dos
+    pedidos simultáneos no pueden encolar dos jobs.
+
+    Returns:
+        (job, creado)
+    """
+    with transaction.atomic():
+        Publication.objects.select_for_update().filter(id=pub.id).first()
+        job = trabajo_activo(pub)
+        if job:
+            return job, False
+        return encolar_publicacion(pub, opciones), True
+
+
+def encolar_pedido(pub, opciones, clave):
+    """
+    Encola la publicación registrando el pedido en el ledger (PublishAttempt).
+    Si la clave ya se usó para esta publicación no encola nada y retorna el
+    pedido existente; la restricción única resuelve las carreras entre
+    requests simultáneos. Si ya hay un job en curso se reutiliza
+    (encolar_si_libre, con la fila bloqueada).
+
+    Returns:
+        (pedido, creado)
+    """
+    existente = PublishAttempt.objects.filter(publication=pub, idempotency_key=clave).first()
+    if existente:
+        return existente, False
+
+    try:
+        with transaction.atomic():
+            # Si ya hay un job en curso para la publicación, el pedido se engancha a ese
+            job, _ = encolar_si_libre(pub, opciones)
+            pedido = PublishAttempt.objects.create(
+                publication=pub, idempotency_key=clave, huella=huella_opciones(opciones), job=job
+            )
+    except IntegrityError:
+        # Otro request con la misma clave ganó la carrera (y su job es el único encolado)
+        return PublishAttempt.objects.get(publication=pub, idempotency_key=clave), False
+
+    return pedido, True
+
+
+def reclamar_en_request(pub, opciones, clave=None):
+    """
+    Reclama la publicación para publicarla dentro del request (vista async,
+    sin pasar por el worker). Con la fila bloqueada, igual que
+    encolar_si_libre, crea su PublishJob directamente en 'running': ningún
+    otro request ni worker la publica en paralelo mientras dure el lease.
+    Si ya hay un job en curso no reclama nada y retorna ese.
+
+    Con `clave` (Idempotency-Key) registra el pedido en el ledger en la
+    misma transacción; si la clave ya se usó retorna el pedido existente.
+
+    Returns:
+        (job, pedido, creado)
+    """
+    if clave:
+        existente = PublishAttempt.objects.filter(publication=pub, idempotency_key=clave).select_related('job').first()
+        if existente:
+            return existente.job, existente, False
+
+    try:
+        with transaction.atomic():
+            Publication.objects.select_for_update().filter(id=pub.id).first()
+            job = trabajo_activo(pub)
+            creado = job is None
+            if creado:
+                job = PublishJob.objects.create(
+                    publication=pub, opciones=opciones, estado='running', intentos=1,
+                    worker_id=f"request:{generar_worker_id()}", reclamado_en=timezone.now()
+                )
+            pedido = None
+            if clave:
+                # Si había un job en curso el pedido se engancha a ese
+                pedido = PublishAttempt.objects.create(
+                    publication=pub, idempotency_key=clave, huella=huella_opciones(opciones), job=job
+                )
+    except IntegrityError:
+        # Otro request con la misma clave ganó la carrera: su job es el que publica
+        pedido = PublishAttempt.objects.select_related('job').get(publication=pub, idempotency_key=clave)
+        return pedido.job, pedido, False
+
+    return job, pedido, creado
+
+
+def encolar_post_completo(post, opciones, opciones_por_plataforma=None, plataformas=None, clave=None):
+    """
+    Encola todas las Publications no publicadas de un Post, un job por red:
+    los workers (publish_worker) las publican en paralelo. Cada una sigue
+    el mismo camino que POST /api/publicar/: si ya tiene un job en curso se
+    reutiliza y, con `clave` (Idempotency-Key), cada red registra su pedido
+    en el ledger como '<clave>:<plataforma>'.
+
+    Args:
+        opciones: image_url, video_url, whatsapp_number comunes a todas
+        opciones_por_plataforma: dict {plataforma: {...}} que sobrescribe las comunes
+        plataformas: lista de plataformas a publicar (None = todas las no publicadas)
+
+    Returns:
+        dict {plataforma: resultado}; las encoladas con status 'queued' y job_id
+    """
+    opciones_por_plataforma = opciones_por_plataforma or {}
+
+    pubs = post.publications.exclude(estado='published')
+    if plataformas:
+        pubs = pubs.filter(plataforma__in=plataformas)
+
+    resultados = {}
+    for pub in pubs:
+        base = {"platform": pub.plataforma, "publication_id": pub.id}
+        opciones_pub = {**opciones, **opciones_por_plataforma.get(pub.plataforma, {})}
+        error = validar_opciones(pub, opciones_pub)
+        if error:
+            resultados[pub.plataforma] = {**base, "status": "error", "message": error}
+            continue
+
+        if clave:
+            pedido, _ = encolar_pedido(pub, opciones_pub, f"{clave}:{pub.plataforma}")
+            if pedido.huella != huella_opciones(opciones_pub):
+                resultados[pub.plataforma] = {**base, "status": "error", "message": "Idempotency-Key ya usada con otros datos"}
+                continue
+            if pedido.resultado:
+                resultados[pub.plataforma] = {**pedido.resultado, **base}
+                continue
+            job_id = pedido.job_id
+        else:
+            job, _ = encolar_si_libre(pub, opciones_pub)
+            job_id = job.id
+
+        resultados[pub.plataforma] = {**base, "status": "queued", "job_id": job_id}
+    return resultados
+
+
+def cerrar_pedidos(job):
+    """
+    Guarda el resultado final del job en los pedidos que lo originaron.
+    """
+    PublishAttempt.objects.filter(job=job).update(
+        estado='completed', resultado=job.resultado, terminado_en=job.terminado_en
+    )
+
+
+def reclamar_trabajos(worker_id, limite=10, lease_segundos=600):
+    """
+    Reclama hasta `limite` trabajos disponibles para este worker.
+
+    En Postgres usa SELECT ... FOR UPDATE SKIP LOCKED para que varios workers
+    no se bloqueen entre sí. En todos los motores el UPDATE condicional
+    (estado sigue igual) garantiza que un trabajo solo lo toma un worker.
+    Los trabajos 'running' con lease vencido (worker caído) se vuelven a reclamar.
+    """
+    ahora = timezone.now()
+    vencidos = ahora - timedelta(seconds=lease_segundos)
+
+    disponibles = PublishJob.objects.filter(
+        Q(estado='pending', disponible_desde__lte=ahora) |
+        Q(estado='running', reclamado_en__lt=vencidos)
+    ).order_by('disponible_desde', 'id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            disponibles = disponibles.select_for_update(skip_locked=True)
+
+        candidatos = list(disponibles.values_list('id', 'estado', 'reclamado_en')[:limite])
+
+        reclamados = []
+        for job_id, estado, reclamado_en in candidatos:
+            actualizados = PublishJob.objects.filter(
+                id=job_id, estado=estado, reclamado_en=reclamado_en
+            ).update(estado='running', worker_id=worker_id, reclamado_en=ahora)
+            if actualizados:
+                reclamados.append(job_id)
+
+    return list(PublishJob.objects.filter(id__in=reclamados).select_related('publication__post'))
+
+
+def procesar_trabajo(job):
+    """
+    Ejecuta un trabajo reclamado y guarda su resultado.
+    Pensado para correr dentro de un hilo del pool del worker.
+    """
+    try:
+        job.intentos += 1
+        job.save(update_fields=['intentos'])
+
+        # Los reintentos se delegan a la cola en vez de dormir el hilo
+        with reintentos_diferidos():
+            resultado = ejecutar_publicacion(job.publication, job.opciones)
+        return guardar_resultado(job, resultado)
+
+    except Exception as e:
+        logger.exception(f"Error procesando job #{job.id}")
+        return fallar_trabajo(job, e)
+
+    finally:
+        # Cada hilo abre su propia conexión; la cerramos para no dejarla colgada
+        connection.close()
+
+
+def guardar_resultado(job, resultado):
+    """
+    Guarda el resultado de un intento del job. Si la red social sigue
+    procesando o hubo un error transitorio, el job vuelve a la cola
+    (sin bloquear el hilo); si no, se cierra junto con sus pedidos.
+    """
+    job.resultado = resultado
+
+    if resultado.get('status') in ('pending', 'retry'):
+        job.estado = 'pending'
+        job.disponible_desde = timezone.now() + timedelta(seconds=resultado.get('retry_in', 5))
+        job.worker_id = None
+        job.reclamado_en = None
+        job.save(update_fields=['resultado', 'estado', 'disponible_desde', 'worker_id', 'reclamado_en'])
+        return job
+
+    job.estado = 'failed' if resultado.get('status') == 'error' else 'done'
+    job.terminado_en = timezone.now()
+    job.save(update_fields=['resultado', 'estado', 'terminado_en'])
+    cerrar_pedidos(job)
+    return job
+
+
+def fallar_trabajo(job, e):
+    """
+    Marca el job y su publicación como fallidos por una excepción inesperada.
+    """
+    job.resultado = {"platform": job.publication.plataforma, "status": "error", "message": str(e)}
+    job.estado = 'failed'
+    Publication.objects.filter(id=job.publication_id).update(estado='failed', last_error=str(e), error_log=str(e))
+    notify_event(job.publication, 'failed', str(e), error=str(e))
+    job.terminado_en = timezone.now()
+    job.save(update_fields=['resultado', 'estado', 'terminado_en'])
+    cerrar_pedidos(job)
+    return job
+
+
+def programar_publicaciones(pub_ids, scheduled_at, opciones):
+    """
+    Programa varias publicaciones para `scheduled_at` con un solo UPDATE.
+    Las ya publicadas o en curso no se tocan. Retorna cuántas se programaron.
+    """
+    return Publication.objects.filter(id__in=pub_ids).exclude(
+        estado__in=('published', 'queued', 'processing')
+    ).update(estado='scheduled', scheduled_at=scheduled_at, opciones_programadas=opciones)
+
+
+def reclamar_programadas(worker_id, limite=100):
+    """
+    Reclama hasta `limite` publicaciones programadas que ya vencieron y crea
+    sus PublishJob directamente en 'running' para este dispatcher.
+
+    La consulta usa el índice (estado, scheduled_at): solo lee las filas
+    vencidas, no toda la tabla. En Postgres SELECT ... FOR UPDATE SKIP LOCKED
+    reparte filas distintas entre dispatchers sin que se bloqueen; en SQLite
+    la transacción empieza con BEGIN IMMEDIATE (transaction_mode en settings)
+    y los dispatchers reclaman de a uno. En ambos casos una publicación
+    programada solo se despacha una vez.
+    """
+    ahora = timezone.now()
+    vencidas = Publication.objects.filter(estado='scheduled', scheduled_at__lte=ahora).order_by('scheduled_at', 'id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            vencidas = vencidas.select_for_update(skip_locked=True)
+
+        pubs = list(vencidas.only('id', 'post_id', 'plataforma', 'opciones_programadas')[:limite])
+        if not pubs:
+            return []
+
+        Publication.objects.filter(id__in=[pub.id for pub in pubs]).update(estado='queued', auto_retry_count=0)
+        jobs = PublishJob.objects.bulk_create([
+            PublishJob(
+                publication_id=pub.id, opciones=pub.opciones_programadas or {}, estado='running',
+                worker_id=worker_id, reclamado_en=ahora
+            )
+            for pub in pubs
+        ])
+        PublicationEvent.objects.bulk_create([
+            PublicationEvent(
+                post_id=pub.post_id, publication_id=pub.id, tipo='queued',
+                mensaje=f"Programada: en cola para {pub.plataforma.upper()}", datos={"job_id": job.id}
+            )
+            for pub, job in zip(pubs, jobs)
+        ])
+
+    return list(PublishJob.objects.filter(id__in=[job.id for job in jobs]).select_related('publication__post'))
+
+
+def proxima_programada():
+    """
+    Fecha de la próxima publicación programada (un solo salto por el índice).
+    """
+    return Publication.objects.filter(estado='scheduled').order_by('scheduled_at').values_list('scheduled_at', flat=True).first()
@@ -0,0 +1,123 @@
+import copy
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AdaptacionCache
+
+logger = logging.getLogger(__name__)
+
+# Nivel en memoria (LRU por proceso) delante del nivel persistente en BD
+_memoria = OrderedDict()
+_lock = threading.Lock()
+_contadores = {"memoria": 0, "bd": 0, "misses": 0}
+
+
+def clave_cache(titulo, contenido, modelo, prompt_version, plataformas=None):
+    """
+    sha256 del contenido que determina la respuesta de Gemini.
+    `plataformas` solo cuando se pidió un subconjunto de redes.
+    """
+    partes = [titulo, contenido, modelo, prompt_version]
+    if plataformas:
+        partes.append(list(plataformas))
+    semilla = json.dumps(partes, ensure_ascii=False)
+    return hashlib.sha256(semilla.encode('utf-8')).hexdigest()
+
+
+def _contar(nivel):
+    with _lock:
+        _contadores[nivel] += 1
+
+
+def _guardar_en_memoria(clave, respuesta, expira_en):
+    with _lock:
+        _memoria[clave] = (respuesta, expira_en)
+        _memoria.move_to_end(clave)
+        while len(_memoria) > settings.LLM_CACHE_MEMORY_ENTRIES:
+            _memoria.popitem(last=False)
+
+
+def obtener(clave):
+    """
+    Busca la adaptación en memoria y luego en la BD. Retorna una copia
+    (el llamador puede modificarla) o None si no está o expiró.
+    """
+    ahora = timezone.now()
+    with _lock:
+        guardado = _memoria.get(clave)
+        if guardado and guardado[1] > ahora:
+            _memoria.move_to_end(clave)
+            _contadores["memoria"] += 1
+            return copy.deepcopy(guardado[0])
+        _memoria.pop(clave, None)
+
+    entrada = AdaptacionCache.objects.filter(clave=clave, expira_en__gt=ahora).first()
+    if entrada is None:
+        _contar("misses")
+        return None
+
+    AdaptacionCache.objects.filter(id=entrada.id).update(hits=F('hits') + 1, ultimo_uso=ahora)
+    _guardar_en_memoria(clave, entrada.respuesta, entrada.expira_en)
+    _contar("bd")
+    return copy.deepcopy(entrada.respuesta)
+
+
+def guardar(clave, respuesta, modelo, prompt_version):
+    """
+    Guarda una adaptación exitosa en ambos niveles y desaloja las vencidas
+    y las menos usadas si la tabla pasa de LLM_CACHE_MAX_ENTRIES.
+    """
+    ahora = timezone.now()
+    expira_en = ahora + timedelta(seconds=settings.LLM_CACHE_TTL)
+    try:
+        AdaptacionCache.objects.update_or_create(clave=clave, defaults={
+            "modelo": modelo, "prompt_version": prompt_version, "respuesta": respuesta,
+            "ultimo_uso": ahora, "expira_en": expira_en
+        })
+    except IntegrityError:
+        # Otro proceso guardó la misma clave al mismo tiempo: la respuesta es equivalente
+        pass
+    _guardar_en_memoria(clave, copy.deepcopy(respuesta), expira_en)
+    desalojar()
+
+
+def desalojar():
+    """
+    Borra las entradas vencidas y, si sobran, las de uso más antiguo.
+    """
+    AdaptacionCache.objects.filter(expira_en__lte=timezone.now()).delete()
+
+    sobrantes = AdaptacionCache.objects.count() - settings.LLM_CACHE_MAX_ENTRIES
+    if sobrantes > 0:
+        viejas = AdaptacionCache.objects.order_by('ultimo_uso').values_list('id', flat=True)[:sobrantes]
+        AdaptacionCache.objects.filter(id__in=list(viejas)).delete()
+        logger.info(f"Cache de adaptaciones: {sobrantes} entradas desalojadas")
+
+
+def estadisticas():
+    """
+    Contadores de hits/misses de este proceso y tamaño de la cache (para el endpoint).
+    """
+    with _lock:
+        contadores = dict(_contadores)
+        en_memoria = len(_memoria)
+    consultas = contadores["memoria"] + contadores["bd"] + contadores["misses"]
+    aciertos = contadores["memoria"] + contadores["bd"]
+    return {
+        "hits_memoria": contadores["memoria"],
+        "hits_bd": contadores["bd"],
+        "misses": contadores["misses"],
+        "hit_rate": round(aciertos / consultas, 3) if consultas else None,
+        "entradas_memoria": en_memoria,
+        "entradas_bd": AdaptacionCache.objects.count(),
+        "hits_bd_historicos": AdaptacionCache.objects.aggregate(total=Sum('hits'))['total'] or 0,
+    }
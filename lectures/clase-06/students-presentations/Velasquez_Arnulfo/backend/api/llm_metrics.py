@@ -0,0 +1,155 @@
+import json
+import time
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LLMCallMetric
+
+logger = logging.getLogger(__name__)
+
+
+class MedicionLLM:
+    """
+    Mide una llamada a Gemini y la guarda en LLMCallMetric al salir del
+    bloque, termine bien o con excepción (la excepción se propaga igual):
+
+        with MedicionLLM('adaptar') as medicion:
+            respuesta = modelo.generate_content(prompt)
+            medicion.registrar_respuesta(respuesta)
+            datos = json.loads(respuesta.text)   # un JSONDecodeError queda como json_error
+            medicion.imagen_ms = ...
+    """
+    def __init__(self, operacion, semillas=1):
+        self.operacion = operacion
+        self.semillas = semillas
+        self.modelo = settings.GEMINI_MODEL
+        self.latencia_ms = None
+        self.primer_chunk_ms = None
+        self.imagen_ms = None
+        self.json_error = False
+        self.uso = None
+
+    def __enter__(self):
+        self.inicio = time.monotonic()
+        return self
+
+    def _transcurrido_ms(self):
+        return (time.monotonic() - self.inicio) * 1000
+
+    def registrar_chunk(self, chunk):
+        """
+        En streaming: anota el primer chunk y guarda el uso (viene en el último).
+        """
+        if self.primer_chunk_ms is None:
+            self.primer_chunk_ms = self._transcurrido_ms()
+        self.uso = getattr(chunk, 'usage_metadata', None) or self.uso
+
+    def registrar_respuesta(self, respuesta):
+        """
+        Fin de la llamada: latencia y tokens de usage_metadata.
+        """
+        self.latencia_ms = self._transcurrido_ms()
+        self.uso = getattr(respuesta, 'usage_metadata', None) or self.uso
+
+    def __exit__(self, tipo, excepcion, traceback):
+        if self.latencia_ms is None:
+            self.latencia_ms = self._transcurrido_ms()
+        self.json_error = self.json_error or isinstance(excepcion, json.JSONDecodeError)
+
+        prompt_tokens = getattr(self.uso, 'prompt_token_count', None)
+        respuesta_tokens = getattr(self.uso, 'candidates_token_count', None)
+        try:
+            LLMCallMetric.objects.create(
+                modelo=self.modelo,
+                operacion=self.operacion,
+                semillas=self.semillas,
+                prompt_tokens=prompt_tokens,
+                respuesta_tokens=respuesta_tokens,
+                total_tokens=getattr(self.uso, 'total_token_count', None),
+                costo_usd=costo_estimado(prompt_tokens, respuesta_tokens),
+                latencia_ms=self.latencia_ms,
+                primer_chunk_ms=self.primer_chunk_ms,
+                imagen_ms=self.imagen_ms,
+                json_error=self.json_error,
+                error=f"{type(excepcion).__name__}: {excepcion}" if excepcion else ''
+            )
+        except Exception:
+            # Las métricas nunca deben romper una adaptación
+            logger.exception("No se pudo guardar la métrica de la llamada a Gemini")
+        return False
+
+
+def costo_estimado(prompt_tokens, respuesta_tokens):
+    """
+    Costo en USD según GEMINI_PRICING (precio por millón de tokens).
+    """
+    if prompt_tokens is None and respuesta_tokens is None:
+        return None
+    precios = settings.GEMINI_PRICING
+    return ((prompt_tokens or 0) * precios['input'] + (respuesta_tokens or 0) * precios['output']) / 1_000_000
+
+
+def percentil(valores, p):
+    """
+    Percentil p (0-100) por rango más cercano; None si no hay valores.
+    """
+    valores = sorted(v for v in valores if v is not None)
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return round(valores[indice], 1)
+
+
+def resumen_metricas(dias=7, modelo=None):
+    """
+    Agregados por día y modelo de las llamadas a Gemini (para el endpoint):
+    cantidad, errores, percentiles de latencia y tokens, y costo por adaptación.
+    Los percentiles se calculan en Python porque SQLite no los tiene.
+    """
+    desde = timezone.now() - timedelta(days=dias)
+    llamadas = LLMCallMetric.objects.filter(creado_en__gte=desde)
+    if modelo:
+        llamadas = llamadas.filter(modelo=modelo)
+
+    grupos = defaultdict(list)
+    for fila in llamadas.annotate(dia=TruncDate('creado_en')).values(
+        'dia', 'modelo', 'semillas', 'prompt_tokens', 'respuesta_tokens', 'costo_usd',
+        'latencia_ms', 'primer_chunk_ms', 'imagen_ms', 'json_error', 'error'
+    ):
+        grupos[(fila['dia'], fila['modelo'])].append(fila)
+
+    resumen = []
+    for (dia, nombre_modelo), filas in sorted(grupos.items(), reverse=True):
+        latencias = [f['latencia_ms'] for f in filas]
+        exitosas = [f for f in filas if not f['error']]
+        costo = sum(f['costo_usd'] or 0 for f in filas)
+        adaptaciones = sum(f['semillas'] for f in exitosas)
+        resumen.append({
+            "dia": dia,
+            "modelo": nombre_modelo,
+            "llamadas": len(filas),
+            "errores": len(filas) - len(exitosas),
+            "json_errores": sum(1 for f in filas if f['json_error']),
+            "adaptaciones": adaptaciones,
+            "latencia_ms": {p: percentil(latencias, n) for p, n in (("p50", 50), ("p90", 90), ("p99", 99))},
+            "primer_chunk_ms_p50": percentil([f['primer_chunk_ms'] for f in filas], 50),
+            "imagen_ms_p95": percentil([f['imagen_ms'] for f in filas], 95),
+            "prompt_tokens": {
+                "p50": percentil([f['prompt_tokens'] for f in filas], 50),
+                "p95": percentil([f['prompt_tokens'] for f in filas], 95),
+                "total": sum(f['prompt_tokens'] or 0 for f in filas),
+            },
+            "respuesta_tokens": {
+                "p50": percentil([f['respuesta_tokens'] for f in filas], 50),
+                "p95": percentil([f['respuesta_tokens'] for f in filas], 95),
+                "total": sum(f['respuesta_tokens'] or 0 for f in filas),
+            },
+            "costo_usd": round(costo, 6),
+            "costo_por_adaptacion_usd": round(costo / adaptaciones, 6) if adaptaciones else None,
+        })
+    return resumen
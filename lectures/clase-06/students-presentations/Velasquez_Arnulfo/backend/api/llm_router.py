@@ -0,0 +1,311 @@
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+
+from .models import LLMCallMetric
+from .llm_metrics import percentil
+
+logger = logging.getLogger(__name__)
+
+# Estado por proceso: cada worker tiene su propia cuota en vuelo y su propia
+# vista de qué modelos devolvieron 429 hace poco
+_lock = threading.Lock()
+_lugares = None         # Semáforo de LLM_MAX_CONCURRENCY llamadas en vuelo
+_executor = None
+_agotado_hasta = {}     # modelo -> time.monotonic() en que vuelve a tener cuota
+_umbrales = {}          # (modelo, operacion) -> (segundos, calculado_en)
+_contadores = Counter()  # en_vuelo, en_cola, hedges, hedges_ganados, failovers, rechazos
+
+# Muestras mínimas de latencia para confiar en el percentil
+MIN_MUESTRAS_HEDGE = 20
+UMBRAL_TTL = 60
+
+
+class CuotaAgotada(Exception):
+    """
+    Todos los modelos están sin cuota o no hubo lugar en la compuerta dentro
+    de LLM_QUEUE_MAX_WAIT. `retry_after` son los segundos sugeridos.
+    """
+    def __init__(self, retry_after):
+        super().__init__(f"Gemini sin cuota disponible, reintentar en {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def cadena_modelos():
+    """
+    El modelo principal (GEMINI_MODEL) seguido de GEMINI_FALLBACK_MODELS.
+    """
+    return list(dict.fromkeys([settings.GEMINI_MODEL, *settings.GEMINI_FALLBACK_MODELS]))
+
+
+def _compuerta():
+    global _lugares, _executor
+    if _lugares is None:
+        with _lock:
+            if _lugares is None:
+                _lugares = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+                # El doble de hilos: las llamadas perdedoras de un hedge terminan en segundo plano
+                _executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_CONCURRENCY * 2, thread_name_prefix='gemini')
+    return _lugares
+
+
+def _contar(contador, cantidad=1):
+    # Se llama desde muchos hilos a la vez: += sin el lock pierde actualizaciones
+    with _lock:
+        _contadores[contador] += cantidad
+
+
+def _tomar_lugar(timeout):
+    """
+    Toma un lugar de la compuerta esperando hasta `timeout` segundos
+    (None = sin esperar).
+    """
+    lugares = _compuerta()
+    tomado = lugares.acquire(timeout=timeout) if timeout else lugares.acquire(blocking=False)
+    if tomado:
+        _contar('en_vuelo')
+    return tomado
+
+
+def _liberar_lugar():
+    _contar('en_vuelo', -1)
+    _lugares.release()
+
+
+def es_error_de_cuota(error):
+    codigo = getattr(error, 'code', None)
+    return type(error).__name__ == 'ResourceExhausted' or (isinstance(codigo, int) and codigo == 429)
+
+
+def _vale_otro_modelo(error):
+    """
+    429, timeouts y errores 5xx: otro modelo puede responder. Un 400/403
+    (prompt inválido, API key) fallaría igual en todos.
+    """
+    codigo = getattr(error, 'code', None)
+    return not isinstance(codigo, int) or codigo in (408, 429) or codigo >= 500
+
+
+def segundos_sin_cuota(error):
+    """
+    Lee el retry_delay que Gemini manda con el 429; si no viene, LLM_QUOTA_COOLDOWN.
+    """
+    coincidencia = re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)', str(error)) or \
+        re.search(r'retry in ([\d.]+)\s*s', str(error))
+    return float(coincidencia.group(1)) if coincidencia else settings.LLM_QUOTA_COOLDOWN
+
+
+def marcar_sin_cuota(modelo, segundos):
+    with _lock:
+        _agotado_hasta[modelo] = max(_agotado_hasta.get(modelo, 0), time.monotonic() + segundos)
+    logger.warning(f"Gemini {modelo}: 429, sin cuota por {segundos:.0f}s")
+
+
+def modelos_disponibles():
+    ahora = time.monotonic()
+    return [m for m in cadena_modelos() if _agotado_hasta.get(m, 0) <= ahora]
+
+
+def admitir():
+    """
+    Compuerta por proceso: espera en cola (hasta LLM_QUEUE_MAX_WAIT) a que
+    haya un lugar libre y al menos un modelo con cuota, en vez de disparar
+    contra una cuota que ya sabemos agotada.
+
+    Retorna los modelos disponibles, con un lugar tomado (hay que liberarlo).
+    Lanza CuotaAgotada si se acaba la espera.
+    """
+    limite = time.monotonic() + settings.LLM_QUEUE_MAX_WAIT
+    _contar('en_cola')
+    try:
+        while True:
+            modelos = modelos_disponibles()
+            if not modelos:
+                vuelve = min(_agotado_hasta.get(m, 0) for m in cadena_modelos())
+                if vuelve > limite:
+                    _contar('rechazos')
+                    raise CuotaAgotada(vuelve - time.monotonic())
+                logger.info(f"Gemini sin cuota: esperando {vuelve - time.monotonic():.1f}s")
+                time.sleep(max(0.0, vuelve - time.monotonic()))
+                continue
+
+            if not _tomar_lugar(max(0.001, limite - time.monotonic())):
+                _contar('rechazos')
+                raise CuotaAgotada(settings.LLM_QUEUE_MAX_WAIT)
+            return modelos
+    finally:
+        _contar('en_cola', -1)
+
+
+def umbral_hedge(modelo, operacion):
+    """
+    Segundos tras los cuales se pide también al modelo de respaldo: el
+    percentil LLM_HEDGE_PERCENTILE de las últimas llamadas exitosas de ese
+    modelo y operación (LLMCallMetric), recalculado cada minuto.
+    """
+    clave = (modelo, operacion)
+    guardado = _umbrales.get(clave)
+    if guardado and time.monotonic() - guardado[1] < UMBRAL_TTL:
+        return guardado[0]
+
+    latencias = list(
+        LLMCallMetric.objects.filter(modelo=modelo, operacion=operacion, error='')
+        .order_by('-id').values_list('latencia_ms', flat=True)[:200]
+    )
+    if len(latencias) < MIN_MUESTRAS_HEDGE:
+        segundos = settings.LLM_HEDGE_DEFAULT_SECONDS
+    else:
+        segundos = max(settings.LLM_HEDGE_MIN_SECONDS, percentil(latencias, settings.LLM_HEDGE_PERCENTILE) / 1000)
+    _umbrales[clave] = (segundos, time.monotonic())
+    return segundos
+
+
+def _llamar(modelo, prompt, generation_config, plazo):
+    from .llm_service import obtener_modelo
+
+    try:
+        return obtener_modelo(modelo).generate_content(
+            prompt, generation_config=generation_config,
+            request_options={"timeout": max(1.0, plazo - time.monotonic())}
+        )
+    finally:
+        _liberar_lugar()
+
+
+def generar(prompt, generation_config, medicion):
+    """
+    generate_content con la cadena de modelos, en un plazo total de
+    LLM_TIMEOUT_SECONDS:
+
+    - Si el principal no respondió en su percentil de latencia
+      (umbral_hedge), se lanza la misma llamada al siguiente modelo y gana
+      la primera respuesta (la otra termina en segundo plano y se descarta).
+    - Si un modelo devuelve 429 queda marcado sin cuota y se pasa al
+      siguiente; lo mismo con timeouts y errores 5xx.
+
+    Deja en `medicion.modelo` el modelo que respondió.
+    """
+    restantes = admitir()
+    plazo = time.monotonic() + settings.LLM_TIMEOUT_SECONDS
+    en_vuelo = {}
+    ultimo_error = None
+    modelo_hedge = None
+
+    def lanzar():
+        modelo = restantes.pop(0)
+        en_vuelo[_executor.submit(_llamar, modelo, prompt, generation_config, plazo)] = modelo
+
+    lanzar()
+    hedge_en = float('inf')
+    if settings.LLM_HEDGE_PERCENTILE and restantes:
+        hedge_en = time.monotonic() + umbral_hedge(en_vuelo[next(iter(en_vuelo))], medicion.operacion)
+
+    while en_vuelo:
+        espera = min(plazo, hedge_en) - time.monotonic()
+        hechos, _ = wait(list(en_vuelo), timeout=max(0.0, espera), return_when=FIRST_COMPLETED)
+
+        for futuro in hechos:
+            modelo = en_vuelo.pop(futuro)
+            try:
+                respuesta = futuro.result()
+            except Exception as e:
+                ultimo_error = e
+                logger.warning(f"Gemini {modelo} falló: {e}")
+                if es_error_de_cuota(e):
+                    marcar_sin_cuota(modelo, segundos_sin_cuota(e))
+                if not _vale_otro_modelo(e):
+                    raise
+                continue
+            if modelo == modelo_hedge:
+                _contar('hedges_ganados')
+            medicion.modelo = modelo
+            return respuesta
+
+        ahora = time.monotonic()
+        if ahora >= plazo:
+            break
+        # Solo modelos con cuota, por si otro pedido recibió un 429 mientras tanto
+        restantes[:] = [m for m in restantes if m in modelos_disponibles()]
+        if not en_vuelo and restantes:
+            # Falló el que estaba en vuelo: failover al siguiente
+            if restantes and _tomar_lugar(max(0.001, plazo - ahora)):
+                _contar('failovers')
+                lanzar()
+        elif restantes and ahora >= hedge_en:
+            # Un solo hedge por pedido y solo si la compuerta tiene lugar libre
+            hedge_en = float('inf')
+            if _tomar_lugar(None):
+                modelo_hedge = restantes[0]
+                logger.info(f"Gemini: sin respuesta en el p{settings.LLM_HEDGE_PERCENTILE:.0f}, hedge a {modelo_hedge}")
+                _contar('hedges')
+                lanzar()
+
+    if en_vuelo or ultimo_error is None:
+        raise TimeoutError(f"Gemini no respondió en {settings.LLM_TIMEOUT_SECONDS:.0f}s")
+    raise ultimo_error
+
+
+def generar_stream(prompt, generation_config, medicion):
+    """
+    Versión streaming: sin hedge (el primer chunk llega rápido), pero con la
+    compuerta, el plazo y el failover ante 429 antes del primer chunk.
+    Genera los chunks de la respuesta.
+    """
+    from .llm_service import obtener_modelo
+
+    modelos = admitir()
+    plazo = time.monotonic() + settings.LLM_TIMEOUT_SECONDS
+    try:
+        for i, modelo in enumerate(modelos):
+            try:
+                chunks = iter(obtener_modelo(modelo).generate_content(
+                    prompt, generation_config=generation_config, stream=True,
+                    request_options={"timeout": max(1.0, plazo - time.monotonic())}
+                ))
+                primero = next(chunks)
+            except StopIteration:
+                return
+            except Exception as e:
+                if es_error_de_cuota(e):
+                    marcar_sin_cuota(modelo, segundos_sin_cuota(e))
+                if i + 1 < len(modelos) and _vale_otro_modelo(e):
+                    logger.warning(f"Gemini {modelo} falló: {e}, probando {modelos[i + 1]}")
+                    _contar('failovers')
+                    continue
+                raise
+
+            medicion.modelo = modelo
+            yield primero
+            yield from chunks
+            return
+    finally:
+        _liberar_lugar()
+
+
+def estado_modelos():
+    """
+    Estado de la compuerta y de la cadena de modelos en este proceso (para el endpoint).
+    """
+    ahora = time.monotonic()
+    with _lock:
+        contadores = dict(_contadores)
+    return {
+        "max_concurrencia": settings.LLM_MAX_CONCURRENCY,
+        **{
+            nombre: contadores.get(nombre, 0)
+            for nombre in ('en_vuelo', 'en_cola', 'rechazos', 'hedges', 'hedges_ganados', 'failovers')
+        },
+        "modelos": [
+            {
+                "modelo": modelo,
+                "sin_cuota_por_segundos": round(max(0.0, _agotado_hasta.get(modelo, 0) - ahora), 1),
+                "umbral_hedge_segundos": _umbrales.get((modelo, 'adaptar'), (None,))[0],
+            }
+            for modelo in cadena_modelos()
+        ],
+    }
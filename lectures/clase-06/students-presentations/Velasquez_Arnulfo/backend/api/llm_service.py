@@ -1,93 +1,216 @@
 # backend/api/llm_service.py
 
-import google.generativeai as genai
 import os
-import requests
-import urllib.parse
 import json
-from io import BytesIO
-from PIL import Image
-# Ya no necesitamos 'asyncio'
+import time
+import threading
+from functools import lru_cache
+from django.conf import settings
+
+from . import llm_cache, llm_router
+from .llm_metrics import MedicionLLM
+from .llm_validacion import LIMITES_CARACTERES, MAX_PALABRAS_GANCHO, corregir_adaptacion, forzar_adaptacion
 
 # --- Configuración de la API de Gemini (desde .env) ---
 api_key_from_env = os.getenv('GEMINI_API_KEY')
-if api_key_from_env:
-    genai.configure(api_key=api_key_from_env)
-else:
+if not api_key_from_env:
     print("ADVERTENCIA: GEMINI_API_KEY no encontrada en el entorno. La generación de contenido fallará.")
+
+# google.generativeai (grpc, protobuf) tarda ~1s en importarse: se carga recién
+# en la primera adaptación, no al arrancar cada worker
+_modelos = {}
+_modelo_lock = threading.Lock()
+
+
+def obtener_modelo(nombre=None):
+    """
+    GenerativeModel de Gemini, uno por nombre y por proceso (None = GEMINI_MODEL).
+    La primera llamada importa y configura el SDK.
+    """
+    nombre = nombre or settings.GEMINI_MODEL
+    if nombre not in _modelos:
+        with _modelo_lock:
+            if nombre not in _modelos:
+                import google.generativeai as genai
+
+                genai.configure(api_key=api_key_from_env)
+                _modelos[nombre] = genai.GenerativeModel(
+                    nombre,
+                    system_instruction=INSTRUCCION_SISTEMA,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+    return _modelos[nombre]
+
+
+def calentar():
+    """
+    Carga el SDK y el modelo por adelantado (GEMINI_WARMUP) para que la
+    primera adaptación no pague el import.
+    """
+    if api_key_from_env:
+        obtener_modelo()
 # --- FIN Configuración ---
 
 
-def crear_prompt(titulo, contenido):
-    """
-    Genera el prompt para el modelo de lenguaje de Gemini, solicitando adaptaciones JSON.
-    """
-    return f"""
-    Eres un experto en marketing de redes sociales. Tu tarea es adaptar el siguiente contenido para 5 plataformas.
-    Para Instagram, también debes sugerir un prompt para una IA de generación de imágenes.
-    Para TikTok, también debes sugerir un "gancho" para el video.
-
-    Contenido Original:
-    Título: "{titulo}"
-    Contenido: "{contenido}"
-
-    Debes retornar ÚNICAMENTE un objeto JSON válido, sin ningún texto antes o después. La estructura debe ser la siguiente:
-
-    {{
-      "facebook": {{
-        "text": "Texto adaptado para Facebook (tono casual/informativo, máximo 500 caracteres).",
-        "hashtags": ["#Innovacion", "#Tecnologia"],
-        "character_count": 0
-      }},
-      "instagram": {{
-        "text": "Texto adaptado para Instagram (tono visual/casual, máximo 200 caracteres, con emojis).",
-        "hashtags": ["#Tech", "#Innovation", "#NewFeature"],
-        "character_count": 0,
-        "suggested_image_prompt": "Prompt para IA de imagen (ej. 'Modern tech interface, abstract lines, vibrant colors, high detail')"
-      }},
-      "linkedin": {{
-        "text": "Texto adaptado para LinkedIn (tono profesional, máximo 600 caracteres, con estructura profesional).",
-        "hashtags": ["#Technology", "#Innovation", "#Negocios"],
-        "character_count": 0,
-        "tone": "professional"
-      }},
-      "tiktok": {{
-        "text": "Texto adaptado para TikTok (tono joven/trending, máximo 150 caracteres, con emojis).",
-        "hashtags": ["#Tech", "#Viral", "#NewFeature"],
-        "character_count": 0,
-        "video_hook": "Frase corta y muy llamativa para el inicio de un video de TikTok (max 15 palabras)."
-      }},
-      "whatsapp": {{
-        "text": "Texto adaptado para WhatsApp (tono conversacional/directo, máximo 300 caracteres, con emojis).",
-        "character_count": 0,
-        "format": "conversational"
-      }}
-    }}
-
-    Instrucciones Adicionales:
-    - Reemplaza los textos de ejemplo con el contenido real adaptado.
-    - Calcula el 'character_count' real para cada texto.
-    - NO incluyas '```json' ni '```' en la respuesta. Solo el JSON.
+# Súbela cada vez que cambie el prompt (INSTRUCCION_SISTEMA, esquemas o
+# crear_prompt) o la validación de la respuesta: invalida las adaptaciones en cache
+PROMPT_VERSION = 3
+
+# Estimación para el guard de tamaño (sin llamar a count_tokens): ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+# Reglas de cada red, en el orden en que se generan
+REGLAS_PLATAFORMA = {
+    'facebook': f"tono casual/informativo, máximo {LIMITES_CARACTERES['facebook']} caracteres.",
+    'instagram': f"tono visual/casual, máximo {LIMITES_CARACTERES['instagram']} caracteres, con emojis. "
+                 "'suggested_image_prompt': prompt en inglés para una IA de imágenes "
+                 "(ej. 'Modern tech interface, abstract lines, vibrant colors, high detail').",
+    'linkedin': f"tono profesional, máximo {LIMITES_CARACTERES['linkedin']} caracteres, con estructura profesional. "
+                "'tone': \"professional\".",
+    'tiktok': f"tono joven/trending, máximo {LIMITES_CARACTERES['tiktok']} caracteres, con emojis. 'video_hook': "
+              f"frase corta y muy llamativa para el inicio del video (máximo {MAX_PALABRAS_GANCHO} palabras).",
+    'whatsapp': f"tono conversacional/directo, máximo {LIMITES_CARACTERES['whatsapp']} caracteres, con emojis, "
+                "sin hashtags. 'format': \"conversational\".",
+}
+PLATAFORMAS = list(REGLAS_PLATAFORMA)
+
+# Parte fija del prompt: va en el modelo (system_instruction) en lugar de
+# repetirse dentro de cada pedido
+INSTRUCCION_SISTEMA = (
+    "Eres un experto en marketing de redes sociales. Adaptas el contenido que te pasan a las redes pedidas, "
+    "siguiendo sus reglas, y respondes solo con el JSON del esquema. 'hashtags': relevantes, con '#'. "
+    "'character_count': largo real de 'text'. Si recibes varios contenidos numerados, adapta cada uno "
+    "por separado bajo su número, sin mezclar información."
+)
+
+
+@lru_cache(maxsize=None)
+def reglas_prompt(plataformas):
+    """
+    Líneas de reglas de las redes pedidas (tupla), armadas una vez por
+    combinación: un pedido de una sola red no paga las reglas de las otras.
+    """
+    return "\n".join(f"- {plataforma}: {REGLAS_PLATAFORMA[plataforma]}" for plataforma in plataformas)
+
+
+# Campos de cada red en el response_schema (además de text y character_count)
+_CAMPOS_EXTRA = {
+    'facebook': ['hashtags'],
+    'instagram': ['hashtags', 'suggested_image_prompt'],
+    'linkedin': ['hashtags', 'tone'],
+    'tiktok': ['hashtags', 'video_hook'],
+    'whatsapp': ['format'],
+}
+
+
+def _esquema_red(plataforma):
+    propiedades = {"text": {"type": "string"}, "character_count": {"type": "integer"}}
+    for campo in _CAMPOS_EXTRA[plataforma]:
+        propiedades[campo] = {"type": "array", "items": {"type": "string"}} if campo == 'hashtags' else {"type": "string"}
+    return {"type": "object", "properties": propiedades, "required": list(propiedades)}
+
+
+@lru_cache(maxsize=None)
+def config_respuesta(plataformas, semillas=None):
+    """
+    generation_config con el response_schema de las redes pedidas (tupla).
+    Con `semillas` el esquema es el de un lote: {"0": {...}, "1": {...}}.
+    Se arma una vez por combinación y proceso.
+    """
+    esquema = {
+        "type": "object",
+        "properties": {p: _esquema_red(p) for p in plataformas},
+        "required": list(plataformas),
+    }
+    if semillas is not None:
+        claves = [str(i) for i in range(semillas)]
+        esquema = {"type": "object", "properties": {clave: esquema for clave in claves}, "required": claves}
+    return {"response_mime_type": "application/json", "response_schema": esquema}
+
+
+def normalizar_plataformas(plataformas):
+    """
+    Valida y ordena la lista de plataformas pedidas. None o vacía = todas.
+    Lanza ValueError si hay alguna desconocida.
+    """
+    if not plataformas:
+        return PLATAFORMAS
+    desconocidas = set(plataformas) - set(PLATAFORMAS)
+    if desconocidas:
+        raise ValueError(f"Plataformas no soportadas: {', '.join(sorted(desconocidas))}")
+    return [p for p in PLATAFORMAS if p in plataformas]
+
+
+def clave_adaptacion(titulo, contenido, plataformas):
+    """
+    Clave de cache de una adaptación; pedir las 5 redes usa la misma clave de siempre.
+    """
+    subconjunto = None if plataformas == PLATAFORMAS else plataformas
+    return llm_cache.clave_cache(titulo, contenido, settings.GEMINI_MODEL, PROMPT_VERSION, subconjunto)
+
+
+def recortar_contenido(contenido, max_tokens=None):
     """
+    Guard de tamaño: si el contenido supera LLM_MAX_CONTENT_TOKENS (estimado)
+    se queda con el comienzo y el final, cortando en fin de oración, y marca
+    el salto con [...]. Un post largo no necesita mandarse entero para
+    adaptarlo a un texto de 150-600 caracteres.
+    """
+    max_caracteres = (max_tokens or settings.LLM_MAX_CONTENT_TOKENS) * CARACTERES_POR_TOKEN
+    if len(contenido) <= max_caracteres:
+        return contenido
+
+    inicio = contenido[:int(max_caracteres * 0.8)]
+    final = contenido[-int(max_caracteres * 0.2):]
+    corte = max(inicio.rfind('. '), inicio.rfind('\n'))
+    if corte > len(inicio) // 2:
+        inicio = inicio[:corte + 1]
+    corte = min((i for i in (final.find('. '), final.find('\n')) if i != -1), default=-1)
+    if corte != -1 and corte < len(final) // 2:
+        final = final[corte + 1:]
+
+    print(f"Contenido recortado de {len(contenido)} a {len(inicio) + len(final)} caracteres para Gemini")
+    return f"{inicio.strip()}\n[...]\n{final.strip()}"
+
+
+def crear_prompt(titulo, contenido, plataformas=None):
+    """
+    Genera el prompt para Gemini: reglas de las redes pedidas y el contenido.
+    El rol va en INSTRUCCION_SISTEMA y el formato en el response_schema
+    (config_respuesta).
+    """
+    plataformas = normalizar_plataformas(plataformas)
+    return f'{reglas_prompt(tuple(plataformas))}\nTítulo: "{titulo}"\nContenido: "{recortar_contenido(contenido)}"'
+
+
+def crear_prompt_lote(semillas, plataformas=None):
+    """
+    Prompt que pide las adaptaciones de varias semillas (titulo, contenido)
+    en una sola respuesta, con una clave por semilla ("0", "1", ...).
+    """
+    plataformas = normalizar_plataformas(plataformas)
+    originales = "\n".join(
+        f'[{i}] Título: "{titulo}"\nContenido: "{recortar_contenido(contenido)}"'
+        for i, (titulo, contenido) in enumerate(semillas)
+    )
+    return f'{reglas_prompt(tuple(plataformas))}\n{originales}'
 
 # --- Las funciones de imagen y audio se quedan aquí, pero no las llamamos ---
 def generar_imagen_con_pollinations(prompt_imagen: str):
     """
-    Genera una URL de imagen usando la API gratuita de Pollinations.ai.
-    Devuelve la URL pública directa de Pollinations.
+    URL de la imagen de Pollinations.ai para el prompt. La seed sale del
+    prompt, así que el mismo prompt reutiliza la misma imagen: si ya está
+    descargada en MEDIA_ROOT/generated_images/ se devuelve la copia local;
+    si no, la URL de Pollinations y la descarga sigue en segundo plano
+    (api/image_cache.py).
     """
+    # image_cache trae requests y httpx (http_client): se importa recién al generar la primera imagen
+    from . import image_cache
+
     print(f"Generando URL de imagen con Pollinations.ai para: {prompt_imagen}")
     try:
-        # 1. Construir la URL (Pollinations usa GET con el prompt en la URL)
-        # Es importante codificar el prompt para URL
-        encoded_prompt = urllib.parse.quote(prompt_imagen)
-        # Añadimos seed aleatoria para variedad y nologo para evitar marcas de agua si es posible
-        # Usamos una URL absoluta directa
-        image_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?nologo=true&seed={os.urandom(2).hex()}"
-        
+        image_url = image_cache.url_imagen(prompt_imagen)
         print(f"URL de imagen generada: {image_url}")
-        
-        # Devolvemos la URL directa. NO descargamos la imagen.
         return image_url
 
     except Exception as e:
@@ -100,44 +223,193 @@ def generar_audio_con_gemini(texto: str):
 # --- Fin de funciones desactivadas ---
 
 
+def agregar_imagen_generada(respuesta_json):
+    """
+    Genera la imagen del prompt sugerido para Instagram y la comparte con
+    Facebook (si ya está en el JSON). Retorna los milisegundos que tomó
+    armar la URL de Pollinations (None si no había prompt de imagen).
+    """
+    image_prompt = respuesta_json.get('instagram', {}).get('suggested_image_prompt')
+    if isinstance(image_prompt, str) and image_prompt.strip():
+        image_prompt = image_prompt.strip()
+        print(f"Prompt de imagen sugerido: {image_prompt}")
+
+        # Llamar a la función de Pollinations
+        inicio = time.monotonic()
+        image_url = generar_imagen_con_pollinations(image_prompt)
+        imagen_ms = (time.monotonic() - inicio) * 1000
+
+        if image_url:
+            respuesta_json['instagram']['generated_image_url'] = image_url
+            print(f"Imagen generada y añadida al JSON: {image_url}")
+
+            # Compartir la imagen con Facebook
+            if 'facebook' in respuesta_json:
+                respuesta_json['facebook']['generated_image_url'] = image_url
+                print("Imagen compartida con Facebook.")
+        return imagen_ms
+    return None
+
+
+class ParserJSONIncremental:
+    """
+    Recibe por pedazos el JSON que escribe Gemini ({"facebook": {...}, ...})
+    y devuelve cada objeto de plataforma apenas se cierra su '}', sin esperar
+    al resto. Respeta strings y escapes, así que llaves dentro del texto no lo confunden.
+    """
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.profundidad = 0
+        self.en_string = False
+        self.escape = False
+        self.inicio_string = None
+        self.clave = None           # Última string vista en el primer nivel
+        self.inicio_objeto = None   # Dónde empezó el objeto de plataforma en curso
+
+    def agregar(self, texto):
+        """
+        Agrega un pedazo y retorna la lista de (plataforma, datos) completados.
+        """
+        self.buffer += texto
+        completos = []
+        while self.pos < len(self.buffer):
+            c = self.buffer[self.pos]
+            if self.en_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.en_string = False
+                    if self.profundidad == 1:
+                        self.clave = json.loads(self.buffer[self.inicio_string:self.pos + 1])
+            elif c == '"':
+                self.en_string = True
+                self.inicio_string = self.pos
+            elif c in '{[':
+                self.profundidad += 1
+                if self.profundidad == 2 and c == '{':
+                    self.inicio_objeto = self.pos
+            elif c in '}]':
+                if self.profundidad == 2 and self.inicio_objeto is not None:
+                    completos.append((self.clave, json.loads(self.buffer[self.inicio_objeto:self.pos + 1])))
+                    self.inicio_objeto = None
+                self.profundidad -= 1
+            self.pos += 1
+        return completos
+
+
+def regenerar_plataformas(titulo, contenido, motivos, modelos=None):
+    """
+    Pide otra vez a Gemini solo las redes que no se pudieron corregir
+    localmente ({plataforma: motivo}), diciéndole qué falló.
+    Retorna el JSON de esas redes ({} si la llamada falla) y agrega a
+    `modelos` el modelo que respondió.
+    """
+    plataformas = [p for p in PLATAFORMAS if p in motivos]
+    correcciones = "\n".join(f"- {plataforma}: {motivo}" for plataforma, motivo in motivos.items())
+    prompt = f"{crear_prompt(titulo, contenido, plataformas)}\nTu respuesta anterior no sirvió:\n{correcciones}"
+    try:
+        with MedicionLLM('reparar') as medicion:
+            respuesta = llm_router.generar(prompt, config_respuesta(tuple(plataformas)), medicion)
+            medicion.registrar_respuesta(respuesta)
+            if modelos is not None:
+                modelos.add(medicion.modelo)
+            respuesta_json = json.loads(respuesta.text)
+        return respuesta_json if isinstance(respuesta_json, dict) else {}
+    except Exception as e:
+        print(f"Error al regenerar {', '.join(plataformas)}: {e}")
+        return {}
+
+
+def validar_adaptaciones(titulo, contenido, respuesta_json, plataformas, modelos=None):
+    """
+    Post-proceso de la respuesta de Gemini (api/llm_validacion.py): corrige
+    cada red localmente y vuelve a llamar al modelo, en un solo pedido, solo
+    por las que no tienen arreglo. Si la segunda respuesta tampoco sirve se
+    recorta en una palabra. Retorna {plataforma: datos} de las redes pedidas
+    que quedaron con texto; `modelos` junta los modelos que respondieron.
+    """
+    corregidas, motivos = {}, {}
+    for plataforma in plataformas:
+        datos, motivo = corregir_adaptacion(plataforma, respuesta_json.get(plataforma))
+        if motivo:
+            motivos[plataforma] = motivo
+        else:
+            corregidas[plataforma] = datos
+
+    if motivos:
+        print(f"Adaptaciones a regenerar: {motivos}")
+        nuevas = regenerar_plataformas(titulo, contenido, motivos, modelos)
+        for plataforma in motivos:
+            datos, motivo = corregir_adaptacion(plataforma, nuevas.get(plataforma))
+            if motivo:
+                # Lo que falte en una respuesta (p. ej. el prompt de imagen) se toma de la otra
+                datos = forzar_adaptacion(plataforma, nuevas.get(plataforma), respuesta_json.get(plataforma)) or \
+                    forzar_adaptacion(plataforma, respuesta_json.get(plataforma), nuevas.get(plataforma))
+            if datos:
+                corregidas[plataforma] = datos
+
+    return {p: corregidas[p] for p in plataformas if p in corregidas}
+
+
+def guardar_en_cache(clave, respuesta_json, modelos):
+    """
+    Guarda la adaptación solo si todas sus partes las escribió GEMINI_MODEL:
+    la clave de la cache es la del modelo principal, y una respuesta de un
+    modelo de respaldo no debe servirse como si fuera suya.
+    """
+    respaldo = set(modelos) - {settings.GEMINI_MODEL}
+    if respaldo:
+        print(f"Adaptación de {', '.join(sorted(respaldo))}: no se guarda en cache")
+        return
+    llm_cache.guardar(clave, respuesta_json, settings.GEMINI_MODEL, PROMPT_VERSION)
+
+
 # Función principal VUELVE A SER SÍNCRONA (sin 'async def')
-def adaptar_contenido_con_gemini(titulo: str, contenido: str):
+def adaptar_contenido_con_gemini(titulo: str, contenido: str, plataformas=None, usar_cache=True):
     """
     Función principal SÍNCRONA que coordina la adaptación de texto.
+    Las adaptaciones exitosas se guardan en cache (api/llm_cache.py): el mismo
+    título y contenido no vuelve a llamar a Gemini.
+
+    Args:
+        plataformas: lista de redes a generar (None = las 5)
+        usar_cache: False para pedir un texto nuevo (regenerar); el resultado igual se guarda
     """
+    try:
+        plataformas = normalizar_plataformas(plataformas)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    clave = clave_adaptacion(titulo, contenido, plataformas)
+    en_cache = llm_cache.obtener(clave) if usar_cache else None
+    if en_cache is not None:
+        return en_cache
+
     if not api_key_from_env:
         return {"error": "API Key de Gemini no configurada."}
 
     try:
-        # --- 1. Generar el texto JSON primero (siempre usa el modelo flash para esto) ---
-        text_model = genai.GenerativeModel('models/gemini-flash-latest')
-        
-        prompt = crear_prompt(titulo, contenido)
+        # --- 1. Generar el texto JSON primero ---
+        prompt = crear_prompt(titulo, contenido, plataformas)
         
-        generation_config = genai.types.GenerationConfig(
-            response_mime_type="application/json"
-        )
-        
-        # Llamada síncrona (sin 'await')
-        text_response = text_model.generate_content(prompt, generation_config=generation_config)
-        respuesta_json = json.loads(text_response.text)
-
-        # --- 2. GENERACIÓN DE IMAGEN (POLLINATIONS) ---
-        if 'instagram' in respuesta_json and 'suggested_image_prompt' in respuesta_json['instagram']:
-            image_prompt = respuesta_json['instagram']['suggested_image_prompt']
-            print(f"Prompt de imagen sugerido: {image_prompt}")
-            
-            # Llamar a la función de Pollinations
-            image_url = generar_imagen_con_pollinations(image_prompt)
-            
-            if image_url:
-                respuesta_json['instagram']['generated_image_url'] = image_url
-                print(f"Imagen generada y añadida al JSON: {image_url}")
-                
-                # --- NUEVO: Compartir la imagen con Facebook ---
-                if 'facebook' in respuesta_json:
-                    respuesta_json['facebook']['generated_image_url'] = image_url
-                    print("Imagen compartida con Facebook.")
+        # Llamada síncrona (sin 'await'); el modelo ya pide respuesta JSON.
+        # Pasa por la cadena de modelos con plazo, hedge y failover (api/llm_router.py).
+        # Tokens, latencia y errores quedan en LLMCallMetric (api/llm_metrics.py)
+        with MedicionLLM('adaptar') as medicion:
+            text_response = llm_router.generar(prompt, config_respuesta(tuple(plataformas)), medicion)
+            medicion.registrar_respuesta(text_response)
+            modelos = {medicion.modelo}
+            respuesta_json = json.loads(text_response.text)
+            # Solo las redes pedidas, con el texto dentro de los límites de cada una
+            respuesta_json = validar_adaptaciones(titulo, contenido, respuesta_json, plataformas, modelos)
+            if not respuesta_json:
+                raise ValueError("Gemini no devolvió ninguna adaptación válida")
+
+            # --- 2. GENERACIÓN DE IMAGEN (POLLINATIONS) ---
+            medicion.imagen_ms = agregar_imagen_generada(respuesta_json)
 
         # --- 3. GENERACIÓN DE AUDIO (DESACTIVADA) ---
         # (Sección comentada para evitar el error de cuota 429)
@@ -145,8 +417,136 @@ def adaptar_contenido_con_gemini(titulo: str, contenido: str):
         #     audio_text = respuesta_json['tiktok']['video_hook']
         #     ...
 
+        guardar_en_cache(clave, respuesta_json, modelos)
         return respuesta_json
 
     except Exception as e:
         print(f"Error en adaptar_contenido_con_gemini: {e}")
-        return {"error": f"Error al procesar la solicitud: {e}"}
\ No newline at end of file
+        return {"error": f"Error al procesar la solicitud: {e}"}
+
+def adaptar_contenido_con_gemini_stream(titulo: str, contenido: str, plataformas=None):
+    """
+    Versión streaming de adaptar_contenido_con_gemini: genera tuplas
+    (plataforma, datos) a medida que Gemini termina de escribir cada
+    plataforma, en lugar de esperar el JSON completo.
+
+    Cada plataforma se corrige al llegar (validar_adaptaciones); las que no
+    tienen arreglo local se piden de nuevo juntas al final del stream.
+    Facebook se retiene hasta que llega Instagram (la siguiente) para
+    compartir su imagen generada. Al terminar guarda el JSON completo en la
+    misma cache que la versión no streaming. Lanza excepción si Gemini falla
+    (ValueError si alguna plataforma no existe).
+    """
+    plataformas = normalizar_plataformas(plataformas)
+    clave = clave_adaptacion(titulo, contenido, plataformas)
+    en_cache = llm_cache.obtener(clave)
+    if en_cache is not None:
+        yield from en_cache.items()
+        return
+
+    if not api_key_from_env:
+        raise RuntimeError("API Key de Gemini no configurada.")
+
+    parser = ParserJSONIncremental()
+    respuesta_json = {}
+    originales = {}
+    motivos = {}
+    facebook_pendiente = False
+
+    def emitir(plataforma, datos):
+        nonlocal facebook_pendiente
+        respuesta_json[plataforma] = datos
+
+        if plataforma == 'facebook':
+            if 'instagram' in plataformas and 'instagram' not in respuesta_json:
+                facebook_pendiente = True
+                return
+            if respuesta_json.get('instagram', {}).get('generated_image_url'):
+                datos['generated_image_url'] = respuesta_json['instagram']['generated_image_url']
+
+        if plataforma == 'instagram':
+            medicion.imagen_ms = agregar_imagen_generada(respuesta_json)
+            if facebook_pendiente:
+                facebook_pendiente = False
+                yield 'facebook', respuesta_json['facebook']
+
+        yield plataforma, datos
+
+    with MedicionLLM('stream') as medicion:
+        for chunk in llm_router.generar_stream(
+            crear_prompt(titulo, contenido, plataformas), config_respuesta(tuple(plataformas)), medicion
+        ):
+            medicion.registrar_chunk(chunk)
+            for plataforma, datos in parser.agregar(chunk.text):
+                if plataforma not in plataformas or plataforma in originales:
+                    continue
+                originales[plataforma] = datos
+                corregidos, motivo = corregir_adaptacion(plataforma, datos)
+                if motivo:
+                    # Se regenera al final, junto con las demás que fallen
+                    motivos[plataforma] = motivo
+                    continue
+                yield from emitir(plataforma, corregidos)
+        medicion.registrar_respuesta(None)
+        modelos = {medicion.modelo}
+
+        # Redes que no vinieron o no se pudieron corregir: un solo pedido más
+        motivos.update({p: "no vino en la respuesta" for p in plataformas if p not in originales})
+        if motivos:
+            for plataforma, datos in validar_adaptaciones(titulo, contenido, originales, list(motivos), modelos).items():
+                yield from emitir(plataforma, datos)
+
+    # Gemini no devolvió Instagram: Facebook sale sin imagen
+    if facebook_pendiente:
+        yield 'facebook', respuesta_json['facebook']
+
+    if respuesta_json:
+        guardar_en_cache(clave, respuesta_json, modelos)
+
+
+def adaptar_lote_con_gemini(semillas, plataformas=None):
+    """
+    Adapta varias semillas (titulo, contenido) con UNA llamada a Gemini.
+    Retorna una lista alineada con `semillas`: el JSON de adaptaciones de
+    cada una o {"error": ...}.
+
+    Las semillas que ya están en cache no entran al prompt. Si el modelo
+    omite alguna, esa se pide sola con adaptar_contenido_con_gemini; si le
+    faltan o fallan algunas redes, validar_adaptaciones pide solo esas.
+    """
+    plataformas = normalizar_plataformas(plataformas)
+    claves = [clave_adaptacion(titulo, contenido, plataformas) for titulo, contenido in semillas]
+    resultados = [llm_cache.obtener(clave) for clave in claves]
+    faltan = [i for i, resultado in enumerate(resultados) if resultado is None]
+
+    if len(faltan) > 1 and api_key_from_env:
+        modelo_lote = settings.GEMINI_MODEL
+        try:
+            prompt = crear_prompt_lote([semillas[i] for i in faltan], plataformas)
+            with MedicionLLM('lote', semillas=len(faltan)) as medicion:
+                respuesta = llm_router.generar(prompt, config_respuesta(tuple(plataformas), len(faltan)), medicion)
+                medicion.registrar_respuesta(respuesta)
+                modelo_lote = medicion.modelo
+                respuesta_json = json.loads(respuesta.text)
+        except Exception as e:
+            print(f"Error en adaptar_lote_con_gemini: {e}")
+            respuesta_json = {}
+
+        for n, i in enumerate(faltan):
+            datos = respuesta_json.get(str(n)) if isinstance(respuesta_json, dict) else None
+            if not isinstance(datos, dict):
+                continue
+            # Las redes que falten o no tengan arreglo se piden solas para esta semilla
+            modelos = {modelo_lote}
+            adaptaciones = validar_adaptaciones(*semillas[i], datos, plataformas, modelos)
+            if not adaptaciones:
+                continue
+            agregar_imagen_generada(adaptaciones)
+            guardar_en_cache(claves[i], adaptaciones, modelos)
+            resultados[i] = adaptaciones
+
+    # Lo que el lote no resolvió se pide de a una semilla
+    for i, resultado in enumerate(resultados):
+        if resultado is None:
+            resultados[i] = adaptar_contenido_con_gemini(*semillas[i], plataformas)
+    return resultados
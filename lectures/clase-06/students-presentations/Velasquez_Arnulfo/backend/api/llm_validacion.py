@@ -0,0 +1,222 @@
+import re
+import unicodedata
+
+# Límite de 'text' por red, en grafemas (lo que el usuario ve como un carácter:
+# un emoji con tono de piel o una bandera cuentan 1)
+LIMITES_CARACTERES = {
+    'facebook': 500,
+    'instagram': 200,
+    'linkedin': 600,
+    'tiktok': 150,
+    'whatsapp': 300,
+}
+
+# Instagram rechaza publicaciones con más de 30 hashtags
+MAX_HASHTAGS = {'instagram': 30}
+
+MAX_PALABRAS_GANCHO = 15
+
+# Campos sin los cuales la adaptación no sirve (no se pueden inventar localmente)
+CAMPOS_OBLIGATORIOS = {
+    'instagram': ['suggested_image_prompt'],
+    'tiktok': ['video_hook'],
+}
+# Campos fijos que se completan si el modelo los omite
+CAMPOS_FIJOS = {
+    'linkedin': {'tone': 'professional'},
+    'whatsapp': {'format': 'conversational'},
+}
+
+# Un corte de oración solo vale si conserva al menos esta fracción del límite;
+# si no, es mejor pedirle al modelo un texto más corto
+MIN_FRACCION_RECORTE = 0.5
+
+ZWJ = '\u200d'
+FIN_ORACION = re.compile(r'[.!?…]+["\')\]»]*(?=\s|$)|\n')
+HASHTAG_EN_TEXTO = re.compile(r'\s*(?<!\w)#[^\W\d_]\w*')
+
+
+def _extiende_grafema(c):
+    cp = ord(c)
+    return (
+        unicodedata.category(c) in ('Mn', 'Me', 'Mc')   # Acentos combinados, keycaps
+        or c == ZWJ
+        or 0xFE00 <= cp <= 0xFE0F                       # Selectores de variación
+        or 0x1F3FB <= cp <= 0x1F3FF                     # Tonos de piel
+        or 0xE0020 <= cp <= 0xE007F                     # Tags (banderas de subdivisiones)
+    )
+
+
+def _es_regional(c):
+    return 0x1F1E6 <= ord(c) <= 0x1F1FF
+
+
+def separar_grafemas(texto):
+    """
+    Divide el texto en grafemas (aproximación de UAX #29 suficiente para
+    emojis, banderas y acentos combinados) sin dependencias externas.
+    """
+    grafemas = []
+    for c in texto:
+        if grafemas and (
+            _extiende_grafema(c)
+            or grafemas[-1].endswith(ZWJ)
+            or (c == '\n' and grafemas[-1] == '\r')
+            or (_es_regional(c) and len(grafemas[-1]) == 1 and _es_regional(grafemas[-1]))
+        ):
+            grafemas[-1] += c
+        else:
+            grafemas.append(c)
+    return grafemas
+
+
+def contar_grafemas(texto):
+    return len(separar_grafemas(texto))
+
+
+def normalizar_hashtags(hashtags, maximo=None):
+    """
+    Acepta una lista o un string ("#a #b, c"), deja cada hashtag como
+    '#palabra' (sin espacios ni signos), quita los vacíos o solo numéricos y
+    los repetidos sin importar mayúsculas, conservando el primero.
+    """
+    if isinstance(hashtags, str):
+        hashtags = re.split(r'[\s,]+', hashtags)
+    if not isinstance(hashtags, list):
+        return []
+
+    normalizados, vistos = [], set()
+    for hashtag in hashtags:
+        if not isinstance(hashtag, str):
+            continue
+        palabra = re.sub(r'\W', '', hashtag)
+        if not palabra or palabra.isdigit() or palabra.casefold() in vistos:
+            continue
+        vistos.add(palabra.casefold())
+        normalizados.append(f'#{palabra}')
+    return normalizados[:maximo] if maximo else normalizados
+
+
+def recortar_en_oracion(texto, limite):
+    """
+    Recorta el texto al último fin de oración dentro de `limite` grafemas.
+    Retorna None si no hay un corte que conserve MIN_FRACCION_RECORTE del límite.
+    """
+    grafemas = separar_grafemas(texto)
+    if len(grafemas) <= limite:
+        return texto
+
+    prefijo = ''.join(grafemas[:limite])
+    # Se busca sobre el prefijo + el grafema siguiente para saber si el punto
+    # realmente cierra una oración (y no es "3.5" cortado por la mitad)
+    candidatos = [
+        m.start() if m.group() == '\n' else m.end()
+        for m in FIN_ORACION.finditer(prefijo + grafemas[limite])
+        if m.end() <= len(prefijo)
+    ]
+    for corte in reversed(candidatos):
+        recorte = prefijo[:corte].rstrip()
+        if contar_grafemas(recorte) >= limite * MIN_FRACCION_RECORTE:
+            return recorte
+    return None
+
+
+def recortar_en_palabra(texto, limite):
+    """
+    Último recurso: corta en el último espacio dentro del límite y agrega '…'.
+    """
+    grafemas = separar_grafemas(texto)
+    if len(grafemas) <= limite:
+        return texto
+    prefijo = ''.join(grafemas[:limite - 1])
+    corte = prefijo.rfind(' ')
+    if corte > 0:
+        prefijo = prefijo[:corte]
+    return prefijo.rstrip(' ,;:-') + '…'
+
+
+def _tiene_valor(datos, campo):
+    return isinstance(datos.get(campo), str) and bool(datos[campo].strip())
+
+
+def _normalizar_campos(plataforma, datos):
+    """
+    Correcciones que no dependen de que la adaptación esté completa:
+    campos fijos, hashtags (WhatsApp no lleva, ni en el texto) y gancho de
+    TikTok. Retorna una copia con 'text' sin espacios sobrantes.
+    """
+    datos = dict(datos)
+    for campo, valor in CAMPOS_FIJOS.get(plataforma, {}).items():
+        datos.setdefault(campo, valor)
+
+    texto = datos['text'].strip()
+    if plataforma == 'whatsapp':
+        datos.pop('hashtags', None)
+        texto = HASHTAG_EN_TEXTO.sub('', texto).strip()
+    else:
+        datos['hashtags'] = normalizar_hashtags(datos.get('hashtags'), MAX_HASHTAGS.get(plataforma))
+    datos['text'] = texto
+
+    if plataforma == 'tiktok' and _tiene_valor(datos, 'video_hook'):
+        palabras = datos['video_hook'].split()
+        datos['video_hook'] = ' '.join(palabras[:MAX_PALABRAS_GANCHO])
+    return datos
+
+
+def corregir_adaptacion(plataforma, datos):
+    """
+    Valida y corrige localmente la adaptación de una red: hashtags
+    normalizados, campos fijos, gancho de TikTok, texto dentro del límite
+    y 'character_count' real.
+
+    Retorna (datos_corregidos, None) o (None, motivo) si no se puede
+    arreglar sin volver a llamar al modelo.
+    """
+    if not isinstance(datos, dict):
+        return None, "no vino en la respuesta"
+    if not _tiene_valor(datos, 'text'):
+        return None, "vino sin texto"
+    for campo in CAMPOS_OBLIGATORIOS.get(plataforma, []):
+        if not _tiene_valor(datos, campo):
+            return None, f"falta '{campo}'"
+
+    datos = _normalizar_campos(plataforma, datos)
+    if not datos['text']:
+        return None, "vino solo con hashtags"
+
+    limite = LIMITES_CARACTERES[plataforma]
+    recortado = recortar_en_oracion(datos['text'], limite)
+    if recortado is None:
+        return None, f"excede {limite} caracteres ({contar_grafemas(datos['text'])}) sin un fin de oración donde cortar"
+
+    datos['text'] = recortado
+    datos['character_count'] = contar_grafemas(recortado)
+    return datos, None
+
+
+def forzar_adaptacion(plataforma, datos, respaldo=None):
+    """
+    Para cuando ni la corrección local ni una nueva llamada alcanzaron:
+    normaliza igual que corregir_adaptacion y recorta en una palabra.
+    Los campos obligatorios que falten se toman de `respaldo` (la otra
+    respuesta del modelo); si tampoco están, se omiten en vez de dejarlos
+    vacíos. Retorna None si no hay texto que salvar.
+    """
+    if not isinstance(datos, dict) or not _tiene_valor(datos, 'text'):
+        return None
+
+    datos = dict(datos)
+    respaldo = respaldo if isinstance(respaldo, dict) else {}
+    for campo in CAMPOS_OBLIGATORIOS.get(plataforma, []):
+        if not _tiene_valor(datos, campo):
+            if _tiene_valor(respaldo, campo):
+                datos[campo] = respaldo[campo]
+            else:
+                datos.pop(campo, None)
+
+    datos = _normalizar_campos(plataforma, datos)
+    if not datos['text']:
+        return None
+    datos['text'] = recortar_en_palabra(datos['text'], LIMITES_CARACTERES[plataforma])
+    datos['character_count'] = contar_grafemas(datos['text'])
+    return datos
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bulk_service import leer_semillas, adaptar_en_lote
+from api.llm_service import normalizar_plataformas
+
+
+class Command(BaseCommand):
+    help = "Adapta con Gemini una campaña de posts desde un archivo CSV (titulo,contenido) o JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .jsonl.")
+        parser.add_argument('--plataformas', default='',
+                            help="Redes a generar separadas por coma (por defecto las 5).")
+        parser.add_argument('--batch-size', type=int, default=settings.LLM_BULK_BATCH_SIZE,
+                            help="Posts por llamada a Gemini.")
+        parser.add_argument('--concurrency', type=int, default=settings.LLM_BULK_CONCURRENCY,
+                            help="Llamadas a Gemini en paralelo.")
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        try:
+            semillas = leer_semillas(ruta.read_bytes(), ruta.name)
+            plataformas = normalizar_plataformas([p.strip() for p in options['plataformas'].split(',') if p.strip()])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"📦 {len(semillas)} posts para {', '.join(plataformas)} "
+                          f"(lote={options['batch_size']}, hilos={options['concurrency']})")
+
+        for progreso in adaptar_en_lote(semillas, plataformas, options['batch_size'], options['concurrency']):
+            if progreso.get('fin'):
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {progreso['ok']} adaptados, {progreso['errores']} con error en {progreso['segundos']}s "
+                    f"({progreso['posts_por_minuto']} posts/min, {progreso['lotes']} llamadas en lote)"
+                ))
+                continue
+
+            self.stdout.write(f"   {progreso['hechos']}/{progreso['total']}")
+            for post in progreso['posts']:
+                if 'error' in post:
+                    self.stdout.write(self.style.ERROR(f"   Post #{post['post_id']} ({post['titulo']}): {post['error']}"))
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.job_queue import generar_worker_id, reclamar_programadas, procesar_trabajo, proxima_programada
+
+
+class Command(BaseCommand):
+    help = "Despacha las publicaciones programadas (scheduled_at) que ya vencieron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SCHEDULER_BATCH_SIZE,
+                            help="Publicaciones vencidas a reclamar por vuelta.")
+        parser.add_argument('--concurrency', type=int, default=settings.SCHEDULER_CONCURRENCY,
+                            help="Hilos que publican en paralelo.")
+        parser.add_argument('--poll-interval', type=float, default=settings.SCHEDULER_POLL_INTERVAL,
+                            help="Segundos máximos de espera cuando no hay nada vencido.")
+        parser.add_argument('--once', action='store_true',
+                            help="Despacha una sola tanda y termina (útil para cron).")
+
+    def handle(self, *args, **options):
+        worker_id = generar_worker_id()
+        batch_size = options['batch_size']
+        self.stdout.write(f"⏰ Dispatcher {worker_id} iniciado (batch={batch_size}, hilos={options['concurrency']})")
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while True:
+                close_old_connections()
+                jobs = reclamar_programadas(worker_id, batch_size)
+
+                # Los errores transitorios quedan 'pending' y los reintenta publish_worker
+                for job in executor.map(procesar_trabajo, jobs):
+                    self.stdout.write(f"   Publicación #{job.publication_id} (job #{job.id}) -> {job.estado}")
+
+                if options['once']:
+                    break
+
+                # Tanda llena: probablemente quedan vencidas, seguimos sin dormir
+                if len(jobs) < batch_size:
+                    time.sleep(self.espera(options['poll_interval']))
+
+    def espera(self, maximo):
+        """
+        Duerme hasta la próxima publicación programada, sin pasar de `maximo`.
+        """
+        proxima = proxima_programada()
+        if proxima is None:
+            return maximo
+        return min(maximo, max(0.0, (proxima - timezone.now()).total_seconds()))
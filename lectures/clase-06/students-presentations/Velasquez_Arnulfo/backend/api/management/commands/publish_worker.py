@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.job_queue import generar_worker_id, reclamar_trabajos, procesar_trabajo
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de publicaciones (PublishJob) en segundo plano."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PUBLISH_WORKER_BATCH_SIZE,
+                            help="Cantidad de trabajos a reclamar por vuelta.")
+        parser.add_argument('--concurrency', type=int, default=settings.PUBLISH_WORKER_CONCURRENCY,
+                            help="Hilos que publican en paralelo.")
+        parser.add_argument('--poll-interval', type=float, default=settings.PUBLISH_WORKER_POLL_INTERVAL,
+                            help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument('--lease', type=int, default=settings.PUBLISH_WORKER_LEASE,
+                            help="Segundos tras los cuales un trabajo 'running' se considera abandonado.")
+        parser.add_argument('--once', action='store_true',
+                            help="Procesa una sola tanda y termina (útil para cron).")
+
+    def handle(self, *args, **options):
+        worker_id = generar_worker_id()
+        batch_size = options['batch_size']
+        self.stdout.write(f"🧵 Worker {worker_id} iniciado (batch={batch_size}, hilos={options['concurrency']})")
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while True:
+                close_old_connections()
+                jobs = reclamar_trabajos(worker_id, batch_size, options['lease'])
+
+                if jobs:
+                    for job in executor.map(procesar_trabajo, jobs):
+                        self.stdout.write(f"   Job #{job.id} -> {job.estado}")
+
+                if options['once']:
+                    break
+
+                # Si la tanda vino llena probablemente hay más trabajo: no dormimos
+                if len(jobs) < batch_size:
+                    time.sleep(options['poll_interval'])
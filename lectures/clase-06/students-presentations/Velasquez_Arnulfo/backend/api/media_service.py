@@ -0,0 +1,225 @@
+import io
+import uuid
+import asyncio
+import mimetypes
+import tempfile
+import urllib.parse
+from contextlib import contextmanager, asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .http_client import get_session, get_async_client
+
+# Tamaño de bloque al descargar o leer archivos (nunca se carga el archivo completo)
+BLOQUE_LECTURA = 1024 * 1024
+
+
+def es_host_propio(url):
+    """
+    True si la URL es relativa o su host es uno de los nuestros (MEDIA_HOSTS).
+    Un host que empieza con '.' acepta también sus subdominios, como en ALLOWED_HOSTS.
+    """
+    host = (urllib.parse.urlparse(url).hostname or '').lower()
+    if not host:
+        return True
+    return any(
+        host == propio or (propio.startswith('.') and (host.endswith(propio) or host == propio[1:]))
+        for propio in settings.MEDIA_HOSTS
+    )
+
+
+def nombre_media(url):
+    """
+    Nombre en el storage de una URL de nuestro MEDIA_URL, o None si la URL
+    es de otro host o no apunta a media.
+    Ej: http://localhost:8000/media/generated_images/img.jpg -> generated_images/img.jpg
+    """
+    if not url or not es_host_propio(url):
+        return None
+
+    path = urllib.parse.urlparse(url).path
+    if settings.MEDIA_URL not in path:
+        return None
+
+    return urllib.parse.unquote(path.split(settings.MEDIA_URL, 1)[-1]) or None
+
+
+def resolver_media_local(url):
+    """
+    Si la URL apunta a un archivo de MEDIA_ROOT (nuestro host, contiene
+    MEDIA_URL y existe en el storage), retorna su nombre en el storage.
+    Si no, retorna None.
+    """
+    nombre = nombre_media(url)
+    if not nombre:
+        return None
+
+    try:
+        if default_storage.exists(nombre):
+            return nombre
+    except Exception as e:
+        # SuspiciousFileOperation si intentan salir de MEDIA_ROOT con '..'
+        print(f"Error resolviendo ruta local: {e}")
+    return None
+
+
+@contextmanager
+def abrir_media(url):
+    """
+    Abre un archivo de media para leerlo por partes sin cargarlo en memoria.
+    - Archivo local (MEDIA_ROOT): se abre directo desde el storage.
+    - URL remota: se descarga en streaming a un archivo temporal en disco.
+
+    Yields:
+        (archivo, tamaño) donde archivo es binario y permite seek()
+    """
+    nombre = resolver_media_local(url)
+    if nombre:
+        print(f"   📂 Usando archivo local: {nombre}")
+        with default_storage.open(nombre, 'rb') as archivo:
+            yield archivo, default_storage.size(nombre)
+        return
+
+    if nombre_media(url):
+        # Es nuestra pero no está en el storage: pedírnosla por HTTP daría 404 igual
+        raise FileNotFoundError(f"{url} no existe en MEDIA_ROOT")
+
+    print(f"   📥 Descargando (streaming) desde {url}...")
+    with get_session('media').get(url, stream=True) as response:
+        if response.status_code != 200:
+            raise IOError(f"No se pudo descargar el archivo (HTTP {response.status_code})")
+
+        with tempfile.TemporaryFile() as temporal:
+            for bloque in response.iter_content(chunk_size=BLOQUE_LECTURA):
+                temporal.write(bloque)
+            tamano = temporal.tell()
+            temporal.seek(0)
+            response.close()
+            yield temporal, tamano
+
+
+class SeccionArchivo:
+    """
+    Vista de solo lectura sobre [inicio, inicio + longitud) de un archivo.
+    requests la envía como body leyendo de a bloques (no la carga en memoria)
+    y usa __len__ para el Content-Length.
+    """
+    def __init__(self, archivo, inicio, longitud):
+        self.archivo = archivo
+        self.inicio = inicio
+        self.longitud = longitud
+        self.restante = longitud
+        archivo.seek(inicio)
+
+    def __len__(self):
+        return self.longitud
+
+    def read(self, size=-1):
+        if self.restante <= 0:
+            return b''
+        if size is None or size < 0 or size > self.restante:
+            size = self.restante
+        datos = self.archivo.read(size)
+        self.restante -= len(datos)
+        return datos
+
+
+@asynccontextmanager
+async def abrir_media_async(url):
+    """
+    Versión async de abrir_media: la descarga usa el cliente httpx y la
+    lectura/escritura de disco va a un hilo para no bloquear el event loop.
+
+    Yields:
+        (archivo, tamaño) igual que abrir_media
+    """
+    nombre = await sync_to_async(resolver_media_local)(url)
+    if nombre:
+        print(f"   📂 Usando archivo local: {nombre}")
+        archivo = await sync_to_async(default_storage.open)(nombre, 'rb')
+        try:
+            yield archivo, await sync_to_async(default_storage.size)(nombre)
+        finally:
+            archivo.close()
+        return
+
+    if nombre_media(url):
+        raise FileNotFoundError(f"{url} no existe en MEDIA_ROOT")
+
+    print(f"   📥 Descargando (streaming) desde {url}...")
+    with tempfile.TemporaryFile() as temporal:
+        async with get_async_client('media').stream('GET', url) as response:
+            if response.status_code != 200:
+                raise IOError(f"No se pudo descargar el archivo (HTTP {response.status_code})")
+            async for bloque in response.aiter_bytes(chunk_size=BLOQUE_LECTURA):
+                await asyncio.to_thread(temporal.write, bloque)
+
+        tamano = temporal.tell()
+        temporal.seek(0)
+        yield temporal, tamano
+
+
+class MultipartStreaming:
+    """
+    Body multipart/form-data con un archivo que se lee de a bloques mientras
+    se envía. Solo los campos de texto y los encabezados de cada parte se
+    arman en memoria; el archivo nunca se carga completo.
+    requests lo envía con Content-Length (usa __len__ y read()); httpx lo
+    consume con `async for`.
+    """
+    def __init__(self, campos, campo_archivo, nombre_archivo, archivo, tamano):
+        boundary = uuid.uuid4().hex
+        content_type = mimetypes.guess_type(nombre_archivo)[0] or 'application/octet-stream'
+
+        inicio = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'
+            for nombre, valor in campos.items()
+        )
+        inicio += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{campo_archivo}"; '
+            f'filename="{nombre_archivo}"\r\nContent-Type: {content_type}\r\n\r\n'
+        )
+        inicio = inicio.encode('utf-8')
+        fin = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.longitud = len(inicio) + tamano + len(fin)
+        self.partes = [io.BytesIO(inicio), SeccionArchivo(archivo, 0, tamano), io.BytesIO(fin)]
+
+    def __len__(self):
+        return self.longitud
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(parte.read() for parte in self.partes)
+
+        datos = b''
+        while self.partes and len(datos) < size:
+            bloque = self.partes[0].read(size - len(datos))
+            if bloque:
+                datos += bloque
+            else:
+                self.partes.pop(0)
+        return datos
+
+    async def __aiter__(self):
+        while True:
+            bloque = await asyncio.to_thread(self.read, BLOQUE_LECTURA)
+            if not bloque:
+                return
+            yield bloque
+
+
+async def leer_seccion_async(archivo, inicio, longitud):
+    """
+    Generador async con los bytes [inicio, inicio + longitud) del archivo,
+    de a BLOQUE_LECTURA. httpx lo envía como body sin cargarlo en memoria.
+    """
+    seccion = SeccionArchivo(archivo, inicio, longitud)
+    while True:
+        bloque = await asyncio.to_thread(seccion.read, BLOQUE_LECTURA)
+        if not bloque:
+            return
+        yield bloque
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_socialcredential'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='publication',
+            name='estado',
+            field=models.CharField(choices=[('draft', 'Borrador'), ('published', 'Publicado'), ('failed', 'Fallido'), ('manual', 'Manual Pendiente'), ('queued', 'En Cola')], default='draft', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PublishJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opciones', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En Ejecución'), ('done', 'Terminado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('intentos', models.IntegerField(default=0)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('worker_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('reclamado_en', models.DateTimeField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='api.publication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='publishjob_cola_idx')],
+            },
+        ),
+    ]
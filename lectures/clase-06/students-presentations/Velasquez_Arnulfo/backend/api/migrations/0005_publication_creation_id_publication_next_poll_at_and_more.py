@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_alter_publication_estado_publishjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='creation_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='poll_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='publication',
+            name='estado',
+            field=models.CharField(choices=[('draft', 'Borrador'), ('published', 'Publicado'), ('failed', 'Fallido'), ('manual', 'Manual Pendiente'), ('queued', 'En Cola'), ('processing', 'Procesando')], default='draft', max_length=20),
+        ),
+    ]
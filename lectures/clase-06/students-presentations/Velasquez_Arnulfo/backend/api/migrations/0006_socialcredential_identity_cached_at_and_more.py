@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_publication_creation_id_publication_next_poll_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socialcredential',
+            name='identity_cached_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='socialcredential',
+            name='identity_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='socialcredential',
+            name='identity_urn',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
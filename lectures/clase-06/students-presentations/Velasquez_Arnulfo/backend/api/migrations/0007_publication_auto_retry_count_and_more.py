@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_socialcredential_identity_cached_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='auto_retry_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_publication_auto_retry_count_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True)),
+                ('plataforma', models.CharField(max_length=20)),
+                ('tokens', models.FloatField()),
+                ('actualizado', models.FloatField()),
+                ('version', models.IntegerField(default=0)),
+                ('esperas', models.IntegerField(default=0)),
+                ('espera_total_ms', models.BigIntegerField(default=0)),
+                ('rechazos', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CircuitBreakerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plataforma', models.CharField(max_length=20, unique=True)),
+                ('estado', models.CharField(choices=[('closed', 'Cerrado'), ('open', 'Abierto'), ('half_open', 'Semiabierto')], default='closed', max_length=20)),
+                ('version', models.IntegerField(default=0)),
+                ('ventana_inicio', models.FloatField()),
+                ('llamadas', models.IntegerField(default=0)),
+                ('fallos', models.IntegerField(default=0)),
+                ('lentas', models.IntegerField(default=0)),
+                ('abierto_en', models.FloatField(default=0)),
+                ('prueba_desde', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
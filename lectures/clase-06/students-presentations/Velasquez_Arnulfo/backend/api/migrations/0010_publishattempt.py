@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_circuitbreakerstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255)),
+                ('huella', models.CharField(max_length=64)),
+                ('estado', models.CharField(choices=[('in_progress', 'En Curso'), ('completed', 'Completado')], default='in_progress', max_length=20)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('terminado_en', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos', to='api.publishjob')),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos', to='api.publication')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('publication', 'idempotency_key'), name='publishattempt_clave_unica')],
+            },
+        ),
+    ]
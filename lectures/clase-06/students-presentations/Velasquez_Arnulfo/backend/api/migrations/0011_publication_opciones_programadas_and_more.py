@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_publishattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='opciones_programadas',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='scheduled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='publication',
+            name='estado',
+            field=models.CharField(choices=[('draft', 'Borrador'), ('published', 'Publicado'), ('failed', 'Fallido'), ('manual', 'Manual Pendiente'), ('queued', 'En Cola'), ('processing', 'Procesando'), ('scheduled', 'Programada')], default='draft', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='publication',
+            index=models.Index(fields=['estado', 'scheduled_at'], name='publication_programada_idx'),
+        ),
+    ]
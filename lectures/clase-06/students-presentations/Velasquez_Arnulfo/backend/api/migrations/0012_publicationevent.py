@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_publication_opciones_programadas_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('queued', 'Encolada'), ('processing', 'Publicando'), ('pending', 'Esperando a la red social'), ('retry', 'Reintento programado'), ('published', 'Publicada'), ('failed', 'Fallida'), ('manual', 'Acción manual')], max_length=20)),
+                ('mensaje', models.TextField(blank=True)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='api.post')),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='api.publication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['post', 'id'], name='publicationevent_post_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_publicationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdaptacionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('modelo', models.CharField(max_length=100)),
+                ('prompt_version', models.IntegerField()),
+                ('respuesta', models.JSONField()),
+                ('hits', models.IntegerField(default=0)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso', models.DateTimeField(db_index=True)),
+                ('expira_en', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_adaptacioncache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCallMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('operacion', models.CharField(max_length=20)),
+                ('semillas', models.IntegerField(default=1)),
+                ('prompt_tokens', models.IntegerField(blank=True, null=True)),
+                ('respuesta_tokens', models.IntegerField(blank=True, null=True)),
+                ('total_tokens', models.IntegerField(blank=True, null=True)),
+                ('costo_usd', models.FloatField(blank=True, null=True)),
+                ('latencia_ms', models.FloatField()),
+                ('primer_chunk_ms', models.FloatField(blank=True, null=True)),
+                ('imagen_ms', models.FloatField(blank=True, null=True)),
+                ('json_error', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_llmcallmetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagenGenerada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('prompt', models.TextField()),
+                ('seed', models.IntegerField()),
+                ('url_origen', models.TextField()),
+                ('archivo', models.CharField(blank=True, max_length=200)),
+                ('bytes', models.IntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pending', 'Descargando'), ('ready', 'Lista'), ('failed', 'Falló'), ('evicted', 'Desalojada')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_imagengenerada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='creation_source',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
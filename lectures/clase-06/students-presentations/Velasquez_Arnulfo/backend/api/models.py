@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Post(models.Model):
     """
@@ -74,6 +75,9 @@ class Publication(models.Model):
         ('published', 'Publicado'),       # Enviado exitosamente a la API
         ('failed', 'Fallido'),            # Error al enviar
         ('manual', 'Manual Pendiente'),   # Para TikTok (copiar y pegar)
+        ('queued', 'En Cola'),            # Esperando a que un worker la publique
+        ('processing', 'Procesando'),     # Contenedor creado, esperando a la red social
+        ('scheduled', 'Programada'),      # Se publica en scheduled_at (python manage.py dispatch_scheduled)
     ]
 
     post = models.ForeignKey(Post, related_name='publications', on_delete=models.CASCADE)
@@ -96,6 +100,27 @@ class Publication(models.Model):
 
     fecha_publicacion = models.DateTimeField(null=True, blank=True)
 
+    # Publicación en 2 pasos (Instagram): contenedor creado y sondeo de su estado
+    creation_id = models.CharField(max_length=100, blank=True, null=True)
+    next_poll_at = models.DateTimeField(blank=True, null=True)
+    poll_count = models.IntegerField(default=0)
+    # TikTok: 'PULL_FROM_URL' o 'FILE_UPLOAD', para pasar a FILE_UPLOAD si la descarga falla
+    creation_source = models.CharField(max_length=20, blank=True, default='')
+
+    # Reintentos automáticos programados por el scheduler (sin dormir el worker)
+    next_retry_at = models.DateTimeField(blank=True, null=True)
+    auto_retry_count = models.IntegerField(default=0)
+
+    # Publicación programada: fecha y opciones (image_url, video_url, whatsapp_number)
+    scheduled_at = models.DateTimeField(blank=True, null=True)
+    opciones_programadas = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # El dispatcher solo recorre las programadas que ya vencieron
+            models.Index(fields=['estado', 'scheduled_at'], name='publication_programada_idx'),
+        ]
+
     def __str__(self):
         return f"{self.plataforma} - {self.post.titulo}"
 
@@ -116,5 +141,231 @@ class SocialCredential(models.Model):
     expires_at = models.DateTimeField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Identidad cacheada (ej. URN de LinkedIn) ligada a la huella SHA-256 del token
+    identity_fingerprint = models.CharField(max_length=64, blank=True, null=True)
+    identity_urn = models.CharField(max_length=200, blank=True, null=True)
+    identity_cached_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Credential for {self.plataforma}"
+
+class PublishJob(models.Model):
+    """
+    Trabajo de publicación en cola. Lo procesan los workers de
+    `python manage.py publish_worker` fuera del ciclo request/response.
+    """
+    ESTADOS = [
+        ('pending', 'Pendiente'),
+        ('running', 'En Ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+
+    publication = models.ForeignKey(Publication, related_name='jobs', on_delete=models.CASCADE)
+    opciones = models.JSONField(default=dict, blank=True)  # image_url, video_url, whatsapp_number
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pending')
+    resultado = models.JSONField(blank=True, null=True)    # Respuesta de social_service
+
+    intentos = models.IntegerField(default=0)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # No se reclama antes de esta fecha
+    worker_id = models.CharField(max_length=100, blank=True, null=True)
+    reclamado_en = models.DateTimeField(blank=True, null=True)
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    terminado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='publishjob_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} ({self.estado}) - {self.publication}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket compartido por todos los procesos (workers de gunicorn y
+    publish_worker) para respetar una sola cuota por plataforma y credencial.
+    """
+    clave = models.CharField(max_length=100, unique=True)  # plataforma[:huella_credencial]
+    plataforma = models.CharField(max_length=20)
+    tokens = models.FloatField()
+    actualizado = models.FloatField()                      # time.time() de la última recarga
+    version = models.IntegerField(default=0)               # Para el UPDATE condicional
+
+    # Métricas de espera por throttling
+    esperas = models.IntegerField(default=0)
+    espera_total_ms = models.BigIntegerField(default=0)
+    rechazos = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Bucket {self.clave} ({self.tokens:.1f} tokens)"
+
+
+class CircuitBreakerState(models.Model):
+    """
+    Estado del circuit breaker de una plataforma, compartido por todos los
+    procesos para dejar de llamar a un proveedor caído.
+    """
+    ESTADOS = [
+        ('closed', 'Cerrado'),       # Normal: las llamadas pasan
+        ('open', 'Abierto'),         # Proveedor caído: se falla al instante
+        ('half_open', 'Semiabierto'),  # Se deja pasar una llamada de prueba
+    ]
+
+    plataforma = models.CharField(max_length=20, unique=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='closed')
+    version = models.IntegerField(default=0)  # Para transiciones con UPDATE condicional
+
+    # Contadores de la ventana actual
+    ventana_inicio = models.FloatField()      # time.time()
+    llamadas = models.IntegerField(default=0)
+    fallos = models.IntegerField(default=0)
+    lentas = models.IntegerField(default=0)
+
+    abierto_en = models.FloatField(default=0)
+    prueba_desde = models.FloatField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Circuito {self.plataforma}: {self.estado}"
+
+
+class PublishAttempt(models.Model):
+    """
+    Registro (ledger) de los pedidos de publicación de una Publication.
+    Un pedido repetido con el mismo Idempotency-Key devuelve el resultado
+    guardado en vez de volver a llamar a la red social.
+    """
+    ESTADOS = [
+        ('in_progress', 'En Curso'),
+        ('completed', 'Completado'),
+    ]
+
+    publication = models.ForeignKey(Publication, related_name='pedidos', on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64)  # sha256 de las opciones, para detectar reuso de la clave
+    job = models.ForeignKey(PublishJob, related_name='pedidos', on_delete=models.SET_NULL, blank=True, null=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='in_progress')
+    resultado = models.JSONField(blank=True, null=True)  # Resultado final de social_service
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    terminado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['publication', 'idempotency_key'], name='publishattempt_clave_unica'),
+        ]
+
+    def __str__(self):
+        return f"Intento {self.idempotency_key} ({self.estado}) - {self.publication}"
+
+
+class PublicationEvent(models.Model):
+    """
+    Cambio de estado de una Publication (encolada, esperando a Meta,
+    publicada, fallida...). Lo escriben el worker y las vistas y lo lee el
+    stream SSE /api/posts/<id>/events/ desde cualquier proceso.
+    """
+    TIPOS = [
+        ('queued', 'Encolada'),
+        ('processing', 'Publicando'),
+        ('pending', 'Esperando a la red social'),
+        ('retry', 'Reintento programado'),
+        ('published', 'Publicada'),
+        ('failed', 'Fallida'),
+        ('manual', 'Acción manual'),
+    ]
+
+    post = models.ForeignKey(Post, related_name='eventos', on_delete=models.CASCADE)
+    publication = models.ForeignKey(Publication, related_name='eventos', on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    mensaje = models.TextField(blank=True)
+    datos = models.JSONField(default=dict, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # El stream lee "eventos del post con id > último enviado"
+            models.Index(fields=['post', 'id'], name='publicationevent_post_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} - {self.publication}"
+
+
+class AdaptacionCache(models.Model):
+    """
+    Adaptaciones de Gemini ya generadas, por hash de (título, contenido,
+    versión del prompt, modelo). Es el nivel persistente de api/llm_cache.py:
+    lo comparten todos los procesos y sobrevive a los reinicios.
+    """
+    clave = models.CharField(max_length=64, unique=True)  # sha256 hex
+    modelo = models.CharField(max_length=100)
+    prompt_version = models.IntegerField()
+    respuesta = models.JSONField()
+    hits = models.IntegerField(default=0)
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(db_index=True)  # Se desalojan primero las menos usadas
+    expira_en = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Cache {self.clave[:12]} ({self.modelo}, v{self.prompt_version})"
+
+
+class LLMCallMetric(models.Model):
+    """
+    Una llamada a Gemini: tokens (usage_metadata), latencia, costo estimado
+    y errores. Se agrega por día y modelo en /api/llm-metrics/.
+    """
+    modelo = models.CharField(max_length=100)
+    operacion = models.CharField(max_length=20)  # adaptar, stream, lote o reparar
+    semillas = models.IntegerField(default=1)    # Posts adaptados en la llamada (lote > 1)
+
+    prompt_tokens = models.IntegerField(blank=True, null=True)
+    respuesta_tokens = models.IntegerField(blank=True, null=True)
+    total_tokens = models.IntegerField(blank=True, null=True)
+    costo_usd = models.FloatField(blank=True, null=True)
+
+    latencia_ms = models.FloatField()
+    primer_chunk_ms = models.FloatField(blank=True, null=True)  # Solo en streaming
+    imagen_ms = models.FloatField(blank=True, null=True)        # Armado de la URL de Pollinations
+
+    json_error = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+
+    creado_en = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.modelo} {self.operacion} {self.latencia_ms:.0f}ms"
+
+
+class ImagenGenerada(models.Model):
+    """
+    Imagen de Pollinations descargada a MEDIA_ROOT/generated_images/ apenas
+    se adapta el post (api/image_cache.py). Una fila por (prompt, seed); el
+    archivo se nombra por el hash de su contenido, así que dos prompts que
+    dan la misma imagen comparten archivo.
+    """
+    ESTADOS = [
+        ('pending', 'Descargando'),
+        ('ready', 'Lista'),
+        ('failed', 'Falló'),
+        ('evicted', 'Desalojada'),  # Se borró el archivo por espacio; se vuelve a bajar si se pide
+    ]
+
+    clave = models.CharField(max_length=64, unique=True)  # sha256 de (prompt, seed)
+    prompt = models.TextField()
+    seed = models.IntegerField()
+    url_origen = models.TextField()                       # URL de Pollinations
+    archivo = models.CharField(max_length=200, blank=True)  # generated_images/<sha256 del contenido>.jpg
+    bytes = models.IntegerField(default=0)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pending')
+    error = models.TextField(blank=True)
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(db_index=True)  # Se desalojan primero las menos usadas
+
     def __str__(self):
-        return f"Credential for {self.plataforma}"
\ No newline at end of file
+        return f"Imagen {self.clave[:12]} ({self.estado})"
@@ -48,6 +48,17 @@ def notify_manual_action(platform, post_id):
     
     return message
 
+def notify_event(pub, tipo, message='', **datos):
+    """
+    Guarda un cambio de estado de la Publication para el stream SSE
+    (/api/posts/<id>/events/). Los clientes lo reciben sin esperar la respuesta del POST.
+    """
+    from .models import PublicationEvent
+
+    return PublicationEvent.objects.create(
+        post_id=pub.post_id, publication=pub, tipo=tipo, mensaje=message, datos=datos
+    )
+
 def log_api_call(platform, endpoint, status_code, response_data=None):
     """
     Registra detalles de llamadas a APIs externas.
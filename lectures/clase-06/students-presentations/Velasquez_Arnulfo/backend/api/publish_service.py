@@ -0,0 +1,227 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .social_service import publicar_en_facebook, publicar_en_linkedin, publicar_en_whatsapp, avanzar_publicacion_instagram, avanzar_publicacion_tiktok
+from .social_service_async import (
+    publicar_en_facebook_async, publicar_en_linkedin_async, publicar_en_whatsapp_async,
+    publicar_en_instagram_async, publicar_en_tiktok_async, esperar_publicacion_tiktok_async
+)
+from .image_cache import url_para_publicar
+from .notification_service import notify_success, notify_error, notify_manual_action, notify_event
+from .retry_service import en_modo_diferido, es_reintentable, calcular_espera
+
+
+def validar_opciones(pub, opciones):
+    """
+    Verifica que vengan los datos que cada plataforma necesita.
+    Retorna un mensaje de error o None si todo está bien.
+    """
+    if pub.plataforma == 'whatsapp' and not opciones.get('whatsapp_number'):
+        return "WhatsApp requiere número destino"
+
+    if pub.plataforma == 'tiktok' and not (opciones.get('video_url') or opciones.get('image_url')):
+        return "TikTok requiere video_url"
+
+    return None
+
+
+def despachar_publicacion(pub, opciones):
+    """
+    Llama a la función de social_service que corresponde a la plataforma.
+    Puede retornar status 'pending' con 'retry_in' si la red social
+    sigue procesando (Instagram, TikTok); hay que volver a llamar más tarde.
+    """
+    # Imagen generada: se usa la copia local si ya se descargó (api/image_cache.py)
+    image_url = url_para_publicar(opciones.get('image_url'), pub.plataforma)
+    video_url = opciones.get('video_url')
+
+    # --- SWITCH DE PLATAFORMAS ---
+    if pub.plataforma == 'facebook':
+        # Facebook soporta imagen opcional
+        return publicar_en_facebook(pub.contenido_adaptado, image_url)
+
+    elif pub.plataforma == 'whatsapp':
+        return publicar_en_whatsapp(pub.contenido_adaptado, opciones.get('whatsapp_number'))
+
+    elif pub.plataforma == 'instagram':
+        # Un paso de la máquina de estados; puede retornar 'pending'
+        return avanzar_publicacion_instagram(pub, image_url)
+
+    elif pub.plataforma == 'linkedin':
+        return publicar_en_linkedin(pub.contenido_adaptado)
+
+    elif pub.plataforma == 'tiktok':
+        # Usar video_url si viene, sino intentar con image_url.
+        # También es una máquina de estados (sondeo del publish_id)
+        return avanzar_publicacion_tiktok(pub, video_url or image_url)
+
+    return {"platform": pub.plataforma, "status": "error", "message": f"Plataforma no soportada: {pub.plataforma}"}
+
+
+async def despachar_publicacion_async(pub, opciones):
+    """
+    Versión async de despachar_publicacion: espera en el event loop (sin
+    ocupar un hilo) hasta el resultado final, incluido el procesamiento de
+    Instagram y TikTok.
+    """
+    image_url = await sync_to_async(url_para_publicar)(opciones.get('image_url'), pub.plataforma)
+    video_url = opciones.get('video_url')
+
+    if pub.plataforma == 'facebook':
+        return await publicar_en_facebook_async(pub.contenido_adaptado, image_url)
+
+    elif pub.plataforma == 'whatsapp':
+        return await publicar_en_whatsapp_async(pub.contenido_adaptado, opciones.get('whatsapp_number'))
+
+    elif pub.plataforma == 'instagram':
+        return await publicar_en_instagram_async(pub.contenido_adaptado, image_url)
+
+    elif pub.plataforma == 'linkedin':
+        return await publicar_en_linkedin_async(pub.contenido_adaptado)
+
+    elif pub.plataforma == 'tiktok':
+        resultado = await publicar_en_tiktok_async(video_url or image_url, pub.contenido_adaptado)
+        if resultado.get('status') != 'success' or not resultado.get('id'):
+            return resultado
+        final = await esperar_publicacion_tiktok_async(resultado['id'])
+        if final.get('tiktok_failed') and resultado.get('source') == 'PULL_FROM_URL':
+            # TikTok no pudo descargar el video de nuestro dominio: lo subimos nosotros
+            print(f"   ⚠️ (TikTok) PULL_FROM_URL falló ({final.get('message')}), usando FILE_UPLOAD")
+            resultado = await publicar_en_tiktok_async(video_url or image_url, pub.contenido_adaptado, pull=False)
+            if resultado.get('status') != 'success' or not resultado.get('id'):
+                return resultado
+            final = await esperar_publicacion_tiktok_async(resultado['id'])
+        return final
+
+    return {"platform": pub.plataforma, "status": "error", "message": f"Plataforma no soportada: {pub.plataforma}"}
+
+
+def aplicar_resultado(pub, resultado):
+    """
+    Actualiza la Publication según el resultado y dispara las notificaciones
+    (también como evento para el stream SSE).
+    """
+    if resultado.get('status') != 'retry':
+        pub.next_retry_at = None
+
+    if resultado.get('status') == 'success':
+        pub.estado = 'published'
+        pub.api_id = str(resultado.get('id') or resultado.get('sid'))
+        pub.published_url = resultado.get('url', '')
+        pub.fecha_publicacion = timezone.now()
+        pub.last_error = None
+
+        mensaje = notify_success(pub.plataforma, pub.post_id, pub.api_id)
+        evento = ('published', mensaje, {"id": pub.api_id, "url": pub.published_url})
+
+    elif resultado.get('status') == 'pending':
+        pub.estado = 'processing'
+        evento = ('pending', f"Esperando a {pub.plataforma.upper()}",
+                  {"creation_id": resultado.get('creation_id'), "retry_in": resultado.get('retry_in')})
+
+    elif resultado.get('status') == 'retry':
+        # Error transitorio: el scheduler la vuelve a intentar en next_retry_at
+        pub.estado = 'queued'
+        pub.last_error = str(resultado.get('message'))
+        evento = ('retry', pub.last_error, {"retry_in": resultado.get('retry_in')})
+
+    elif resultado.get('status') == 'manual_action_required':
+        pub.estado = 'manual'
+        mensaje = notify_manual_action(pub.plataforma, pub.post_id)
+        evento = ('manual', mensaje, {})
+
+    else:
+        pub.estado = 'failed'
+        error_msg = str(resultado.get('message'))
+        pub.error_log = error_msg
+        pub.last_error = error_msg
+        # Igual que reiniciar_sondeo: el próximo pedido (quizás con otra imagen)
+        # crea un contenedor nuevo en vez de retomar uno de un intento fallido
+        pub.creation_id = None
+        pub.creation_source = ''
+        pub.poll_count = 0
+        pub.next_poll_at = None
+
+        mensaje = notify_error(pub.plataforma, pub.post_id, error_msg)
+        evento = ('failed', mensaje, {"error": error_msg})
+
+    pub.save()
+    tipo, mensaje, datos = evento
+    notify_event(pub, tipo, mensaje, **datos)
+
+
+def programar_reintento(pub, resultado):
+    """
+    Si el error es transitorio y queda presupuesto de reintentos para la
+    plataforma (RETRY_BUDGETS), guarda next_retry_at y convierte el resultado
+    en status 'retry' con 'retry_in'. Si no, lo deja como error final.
+    """
+    presupuesto = settings.RETRY_BUDGETS.get(pub.plataforma, 0)
+    if not es_reintentable(resultado) or pub.auto_retry_count >= presupuesto:
+        return resultado
+
+    # Esperar cuota (rate limit) o a que cierre el circuito no consume el presupuesto de reintentos
+    if not (resultado.get('throttled') or resultado.get('circuit_open')):
+        pub.auto_retry_count += 1
+    espera = calcular_espera(
+        max(pub.auto_retry_count, 1), settings.RETRY_INITIAL_DELAY, settings.RETRY_BACKOFF_FACTOR, resultado.get('retry_after')
+    )
+    pub.next_retry_at = timezone.now() + timedelta(seconds=espera)
+    pub.save(update_fields=['auto_retry_count', 'next_retry_at'])
+
+    return {**resultado, "status": "retry", "retry_in": espera}
+
+
+def ejecutar_publicacion(pub, opciones):
+    """
+    Avanza la publicación de una Publication: incrementa reintentos
+    (solo al empezar, no en cada sondeo), llama a la API real y guarda el resultado.
+    """
+    # Ya publicada (job duplicado o reclamado de nuevo): no volver a llamar a la red social
+    if pub.estado == 'published':
+        return {
+            "platform": pub.plataforma,
+            "status": "success",
+            "id": pub.api_id,
+            "url": pub.published_url,
+            "message": "La publicación ya estaba publicada"
+        }
+
+    if not pub.creation_id:
+        pub.retry_count += 1
+        pub.save(update_fields=['retry_count'])
+        notify_event(pub, 'processing', f"Publicando en {pub.plataforma.upper()}")
+
+    resultado = despachar_publicacion(pub, opciones)
+
+    # En el worker los errores transitorios se reprograman en vez de dormir
+    if en_modo_diferido() and resultado.get('status') == 'error':
+        resultado = programar_reintento(pub, resultado)
+
+    aplicar_resultado(pub, resultado)
+    return resultado
+
+
+async def ejecutar_publicacion_async(pub, opciones):
+    """
+    Versión async de ejecutar_publicacion para las vistas async.
+    """
+    if pub.estado == 'published':
+        return {
+            "platform": pub.plataforma,
+            "status": "success",
+            "id": pub.api_id,
+            "url": pub.published_url,
+            "message": "La publicación ya estaba publicada"
+        }
+
+    pub.retry_count += 1
+    await pub.asave(update_fields=['retry_count'])
+    await sync_to_async(notify_event)(pub, 'processing', f"Publicando en {pub.plataforma.upper()}")
+
+    resultado = await despachar_publicacion_async(pub, opciones)
+    await sync_to_async(aplicar_resultado)(pub, resultado)
+    return resultado
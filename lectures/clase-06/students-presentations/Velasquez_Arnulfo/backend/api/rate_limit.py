@@ -0,0 +1,210 @@
+import time
+import asyncio
+import hashlib
+import logging
+import contextvars
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+
+from .models import RateLimitBucket
+from .retry_service import en_modo_diferido
+
+logger = logging.getLogger(__name__)
+
+# Segundos que la última llamada esperó por un token. Es un ContextVar y no un
+# threading.local para que funcione igual en hilos y en tareas de asyncio.
+_espera = contextvars.ContextVar('espera_rate_limit', default=0.0)
+
+
+def ultima_espera():
+    return _espera.get()
+
+
+def reiniciar_espera():
+    _espera.set(0.0)
+
+
+def clave_bucket(plataforma, credencial=None):
+    """
+    Un bucket por plataforma y por credencial (huella del token, nunca el token).
+    """
+    if not credencial:
+        return plataforma
+    return f"{plataforma}:{hashlib.sha256(credencial.encode('utf-8')).hexdigest()[:16]}"
+
+
+def intentar_token(plataforma, credencial=None):
+    """
+    Intenta consumir un token del bucket compartido (en la BD, visible para
+    todos los procesos) sin esperar.
+
+    El UPDATE es condicional a la versión leída (compare-and-swap), así que
+    funciona igual en Postgres y SQLite sin bloqueos explícitos.
+
+    Returns:
+        (True, 0) o (False, segundos_que_faltan_para_el_proximo_token)
+    """
+    limite = settings.SOCIAL_RATE_LIMITS.get(plataforma)
+    if not limite:
+        return True, 0.0
+
+    capacidad, periodo = limite
+    tasa = capacidad / periodo  # tokens por segundo
+    clave = clave_bucket(plataforma, credencial)
+
+    while True:
+        ahora = time.time()
+        bucket, _ = RateLimitBucket.objects.get_or_create(
+            clave=clave,
+            defaults={'plataforma': plataforma, 'tokens': capacidad, 'actualizado': ahora}
+        )
+
+        tokens = min(capacidad, bucket.tokens + max(0.0, ahora - bucket.actualizado) * tasa)
+
+        if tokens < 1:
+            return False, (1 - tokens) / tasa
+
+        tomado = RateLimitBucket.objects.filter(id=bucket.id, version=bucket.version).update(
+            tokens=tokens - 1, actualizado=ahora, version=F('version') + 1
+        )
+        if tomado:
+            return True, 0.0
+        # Otro proceso tomó el token primero: releemos
+
+
+def registrar_espera(plataforma, credencial, esperado):
+    """
+    Suma una espera (o un rechazo si esperado es None) a las métricas del bucket.
+    """
+    buckets = RateLimitBucket.objects.filter(clave=clave_bucket(plataforma, credencial))
+    if esperado is None:
+        buckets.update(rechazos=F('rechazos') + 1)
+    elif esperado:
+        buckets.update(esperas=F('esperas') + 1, espera_total_ms=F('espera_total_ms') + int(esperado * 1000))
+
+
+def adquirir_token(plataforma, credencial=None, max_espera=None):
+    """
+    Consume un token del bucket de la plataforma. Si el bucket está vacío
+    espera en cola hasta `max_espera` segundos.
+
+    Returns:
+        (True, segundos_esperados) o (False, segundos_que_faltan)
+    """
+    if max_espera is None:
+        max_espera = settings.RATE_LIMIT_MAX_WAIT
+
+    esperado = 0.0
+    while True:
+        ok, falta = intentar_token(plataforma, credencial)
+        if ok:
+            break
+
+        if esperado + falta > max_espera:
+            registrar_espera(plataforma, credencial, None)
+            return False, falta
+
+        logger.info(f"Rate limit {clave_bucket(plataforma, credencial)}: esperando {falta:.2f}s")
+        time.sleep(falta)
+        esperado += falta
+
+    registrar_espera(plataforma, credencial, esperado)
+    return True, esperado
+
+
+async def adquirir_token_async(plataforma, credencial=None, max_espera=None):
+    """
+    Igual que adquirir_token pero la espera es un asyncio.sleep, así que no
+    bloquea el event loop (las consultas a la BD van a un hilo).
+    """
+    if max_espera is None:
+        max_espera = settings.RATE_LIMIT_MAX_WAIT
+
+    esperado = 0.0
+    while True:
+        ok, falta = await sync_to_async(intentar_token)(plataforma, credencial)
+        if ok:
+            break
+
+        if esperado + falta > max_espera:
+            await sync_to_async(registrar_espera)(plataforma, credencial, None)
+            return False, falta
+
+        await asyncio.sleep(falta)
+        esperado += falta
+
+    await sync_to_async(registrar_espera)(plataforma, credencial, esperado)
+    return True, esperado
+
+
+def _resultado_limitado(plataforma, segundos):
+    return {
+        "platform": plataforma,
+        "status": "error",
+        "message": f"Límite de llamadas a {plataforma} alcanzado, reintentar en {segundos:.0f}s",
+        "throttled": True,
+        "retryable": True,
+        "retry_after": segundos
+    }
+
+
+def rate_limited(plataforma, credencial=None):
+    """
+    Decorador: antes de llamar a la API pide un token del bucket de la plataforma.
+    `credencial` es una función que retorna el token/cuenta en uso, para que
+    cada credencial tenga su propia cuota.
+    En el worker (modo diferido) no espera: retorna un error reintentable con
+    retry_after para que el job se reprograme cuando haya token.
+    Funciona también sobre funciones async (espera con asyncio.sleep).
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper_async(*args, **kwargs):
+                cuenta = await sync_to_async(credencial)() if credencial else None
+                ok, segundos = await adquirir_token_async(plataforma, cuenta)
+                _espera.set(segundos if ok else 0.0)
+
+                if not ok:
+                    return _resultado_limitado(plataforma, segundos)
+                return await func(*args, **kwargs)
+
+            return wrapper_async
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            max_espera = 0 if en_modo_diferido() else settings.RATE_LIMIT_MAX_WAIT
+            ok, segundos = adquirir_token(plataforma, credencial() if credencial else None, max_espera)
+            _espera.set(segundos if ok else 0.0)
+
+            if not ok:
+                return _resultado_limitado(plataforma, segundos)
+            return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def estado_buckets():
+    """
+    Estado y métricas de espera de todos los buckets (para el endpoint).
+    """
+    ahora = time.time()
+    estados = []
+    for bucket in RateLimitBucket.objects.order_by('clave'):
+        capacidad, periodo = settings.SOCIAL_RATE_LIMITS.get(bucket.plataforma, (0, 1))
+        tokens = min(capacidad, bucket.tokens + max(0.0, ahora - bucket.actualizado) * capacidad / periodo)
+        estados.append({
+            "clave": bucket.clave,
+            "plataforma": bucket.plataforma,
+            "limite": f"{capacidad}/{periodo}s",
+            "tokens_disponibles": round(tokens, 2),
+            "esperas": bucket.esperas,
+            "espera_total_ms": bucket.espera_total_ms,
+            "espera_promedio_ms": bucket.espera_total_ms // bucket.esperas if bucket.esperas else 0,
+            "rechazos": bucket.rechazos
+        })
+    return estados
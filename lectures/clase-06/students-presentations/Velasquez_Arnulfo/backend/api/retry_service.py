@@ -1,53 +1,231 @@
+import json
 import time
+import random
+import asyncio
 import logging
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
 from functools import wraps
 
+import httpx
+import requests
+from urllib3.exceptions import NewConnectionError
+
 logger = logging.getLogger(__name__)
 
+# Modo de reintento del hilo actual: inline (time.sleep) o diferido (scheduler)
+_contexto = threading.local()
+
+# Códigos HTTP que vale la pena reintentar; el resto de 4xx son permanentes
+HTTP_REINTENTABLES = {408, 425, 429, 500, 502, 503, 504}
+
+# Excepciones de red transitorias
+EXCEPCIONES_REINTENTABLES = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    # Cuerpo no-JSON: casi siempre una página de error de un proxy (502/503)
+    requests.exceptions.JSONDecodeError,
+    # Cliente async (httpx): timeouts, errores de conexión y de protocolo
+    httpx.TransportError,
+    json.JSONDecodeError,
+)
+
+
+@contextmanager
+def reintentos_diferidos():
+    """
+    Dentro de este bloque retry_with_backoff NO duerme: hace un solo intento
+    y, si el error es reintentable, anota en el resultado 'retry_in' (segundos)
+    para que el scheduler (publish_worker) lo vuelva a encolar.
+    """
+    anterior = getattr(_contexto, 'diferido', False)
+    _contexto.diferido = True
+    try:
+        yield
+    finally:
+        _contexto.diferido = anterior
+
+
+def en_modo_diferido():
+    return getattr(_contexto, 'diferido', False)
+
+
+def info_http(response):
+    """
+    Datos de una respuesta HTTP fallida para clasificar el error.
+    """
+    return {
+        "http_status": response.status_code,
+        "retry_after": response.headers.get('Retry-After'),
+    }
+
+
+def request_no_enviado(e):
+    """
+    True si la excepción ocurrió antes de que el request llegara al servidor
+    (no se pudo conectar). En ese caso reintentar un POST es seguro.
+    """
+    if isinstance(e, (requests.exceptions.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        return isinstance(getattr(e.args[0], 'reason', None), NewConnectionError)
+    return False
+
+
+def info_excepcion(e, idempotente=True):
+    """
+    Datos de una excepción para clasificar el error (solo la red es transitoria).
+
+    Con idempotente=False (POST que crea un post o envía un mensaje) un timeout
+    de lectura o una conexión cortada a mitad de respuesta NO se reintenta:
+    la red social pudo haberlo aceptado y reintentar lo duplicaría.
+    """
+    reintentable = isinstance(e, EXCEPCIONES_REINTENTABLES)
+    if reintentable and not idempotente and not request_no_enviado(e) \
+            and not isinstance(e, (requests.exceptions.JSONDecodeError, json.JSONDecodeError)):
+        return {
+            "exception": type(e).__name__,
+            "retryable": False,
+            "ambiguous": True,  # Resultado desconocido: revisar en la red social antes de reintentar
+        }
+    return {
+        "exception": type(e).__name__,
+        "retryable": reintentable,
+    }
+
+
+def parsear_retry_after(valor):
+    """
+    Convierte un header Retry-After (segundos o fecha HTTP) a segundos.
+    """
+    if valor in (None, ''):
+        return None
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def es_reintentable(resultado):
+    """
+    Clasifica un resultado con status 'error':
+    - 'retryable' explícito manda.
+    - 408/425/429/5xx son transitorios; el resto de códigos HTTP son permanentes.
+    - Sin código HTTP (faltan credenciales, datos inválidos) es permanente.
+    """
+    if 'retryable' in resultado:
+        return bool(resultado['retryable'])
+
+    http_status = resultado.get('http_status')
+    if http_status is not None:
+        return http_status in HTTP_REINTENTABLES
+
+    return False
+
+
+def calcular_espera(intento, initial_delay, backoff_factor, retry_after=None):
+    """
+    Backoff exponencial con jitter ("equal jitter") y respeto de Retry-After.
+    """
+    base = initial_delay * (backoff_factor ** (intento - 1))
+    espera = base / 2 + random.uniform(0, base / 2)
+
+    segundos_retry_after = parsear_retry_after(retry_after)
+    if segundos_retry_after is not None:
+        espera = max(espera, segundos_retry_after)
+    return espera
+
+
 def retry_with_backoff(max_attempts=3, initial_delay=1, backoff_factor=2):
     """
     Decorador para reintentar funciones con backoff exponencial.
-    
+    Solo reintenta errores transitorios (ver es_reintentable), agrega jitter
+    y respeta Retry-After. En modo diferido (reintentos_diferidos) no duerme:
+    retorna el error con 'retry_in' para que lo reprograme el scheduler.
+    Sobre una función async espera con asyncio.sleep (ver _retry_async).
+
     Args:
         max_attempts: Número máximo de intentos
         initial_delay: Delay inicial en segundos
         backoff_factor: Factor de multiplicación para el delay
     """
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            return _retry_async(func, max_attempts, initial_delay, backoff_factor)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
+            diferido = en_modo_diferido()
+            intentos = 1 if diferido else max_attempts
             last_exception = None
-            
-            for attempt in range(1, max_attempts + 1):
+
+            for attempt in range(1, intentos + 1):
                 try:
-                    logger.info(f"Intento {attempt}/{max_attempts} para {func.__name__}")
+                    logger.info(f"Intento {attempt}/{intentos} para {func.__name__}")
                     result = func(*args, **kwargs)
-                    
-                    # Si la función retorna un dict con status 'error', reintentamos
+
+                    # Si la función retorna un dict con status 'error', vemos si vale la pena reintentar
                     if isinstance(result, dict) and result.get('status') == 'error':
-                        if attempt < max_attempts:
-                            logger.warning(f"Error en {func.__name__}: {result.get('message')}. Reintentando en {delay}s...")
-                            time.sleep(delay)
-                            delay *= backoff_factor
+                        if not es_reintentable(result):
+                            logger.error(f"Error permanente en {func.__name__}: {result.get('message')}")
+                            return result
+
+                        espera = calcular_espera(attempt, initial_delay, backoff_factor, result.get('retry_after'))
+
+                        # Circuito abierto: en línea fallamos rápido en vez de esperar a que cierre
+                        if result.get('circuit_open') and not diferido:
+                            return result
+
+                        if diferido:
+                            logger.warning(f"Error en {func.__name__}: {result.get('message')}. Se reprograma en {espera:.1f}s")
+                            return {**result, "retryable": True, "retry_in": espera}
+
+                        if attempt < intentos:
+                            logger.warning(f"Error en {func.__name__}: {result.get('message')}. Reintentando en {espera:.1f}s...")
+                            time.sleep(espera)
                             continue
                         else:
                             logger.error(f"Todos los intentos fallaron para {func.__name__}")
                             return result
-                    
+
                     # Éxito
                     if attempt > 1:
                         logger.info(f"Éxito en {func.__name__} después de {attempt} intentos")
                     return result
-                    
+
                 except Exception as e:
                     last_exception = e
                     logger.error(f"Excepción en {func.__name__} (intento {attempt}): {str(e)}")
-                    
-                    if attempt < max_attempts:
-                        logger.info(f"Reintentando en {delay} segundos...")
-                        time.sleep(delay)
-                        delay *= backoff_factor
+                    info = info_excepcion(e)
+
+                    # Solo la red es transitoria: un KeyError o TypeError falla igual en cada intento
+                    if not info['retryable']:
+                        return {
+                            "platform": getattr(func, '__name__', 'unknown'),
+                            "status": "error",
+                            "message": str(e),
+                            **info
+                        }
+
+                    espera = calcular_espera(attempt, initial_delay, backoff_factor)
+                    if diferido:
+                        return {
+                            "platform": getattr(func, '__name__', 'unknown'),
+                            "status": "error",
+                            "message": str(e),
+                            **info,
+                            "retry_in": espera
+                        }
+
+                    if attempt < intentos:
+                        logger.info(f"Reintentando en {espera:.1f} segundos...")
+                        time.sleep(espera)
                     else:
                         logger.error(f"Todos los intentos fallaron para {func.__name__}")
                         return {
@@ -55,12 +233,56 @@ def retry_with_backoff(max_attempts=3, initial_delay=1, backoff_factor=2):
                             "status": "error",
                             "message": f"Error después de {max_attempts} intentos: {str(last_exception)}"
                         }
-            
+
             return {
                 "platform": getattr(func, '__name__', 'unknown'),
                 "status": "error",
                 "message": f"Error después de {max_attempts} intentos"
             }
-        
+
         return wrapper
     return decorator
+
+
+def _retry_async(func, max_attempts, initial_delay, backoff_factor):
+    """
+    Versión async de retry_with_backoff: misma clasificación de errores,
+    pero la espera es un asyncio.sleep que no bloquea el event loop.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                logger.info(f"Intento {attempt}/{max_attempts} para {func.__name__}")
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Excepción en {func.__name__} (intento {attempt}): {str(e)}")
+                info = info_excepcion(e)
+                if not info['retryable']:
+                    return {
+                        "platform": getattr(func, '__name__', 'unknown'),
+                        "status": "error",
+                        "message": str(e),
+                        **info
+                    }
+                if attempt == max_attempts:
+                    return {
+                        "platform": getattr(func, '__name__', 'unknown'),
+                        "status": "error",
+                        "message": f"Error después de {max_attempts} intentos: {str(e)}"
+                    }
+                await asyncio.sleep(calcular_espera(attempt, initial_delay, backoff_factor))
+                continue
+
+            if not (isinstance(result, dict) and result.get('status') == 'error'):
+                return result
+
+            # Permanente, circuito abierto o último intento: no hay nada que esperar
+            if not es_reintentable(result) or result.get('circuit_open') or attempt == max_attempts:
+                return result
+
+            espera = calcular_espera(attempt, initial_delay, backoff_factor, result.get('retry_after'))
+            logger.warning(f"Error en {func.__name__}: {result.get('message')}. Reintentando en {espera:.1f}s...")
+            await asyncio.sleep(espera)
+
+    return wrapper
@@ -1,16 +1,27 @@
-import requests
 import os
 import json
 import time
-from .retry_service import retry_with_backoff
+import hashlib
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.core.files.storage import default_storage
+from .retry_service import retry_with_backoff, info_http, info_excepcion
+from .http_client import get_session
+from .rate_limit import rate_limited
+from .circuit_breaker import circuit_breaker
+from .media_service import abrir_media, SeccionArchivo, resolver_media_local, nombre_media, MultipartStreaming
 from .notification_service import log_api_call
 
 # --- FACEBOOK ---
 @retry_with_backoff(max_attempts=3, initial_delay=2)
+@circuit_breaker('facebook')
+@rate_limited('facebook', credencial=lambda: os.getenv('FACEBOOK_ACCESS_TOKEN'))
 def publicar_en_facebook(texto, image_url=None):
     """
     Publica texto o imagen con texto en una Página de Facebook usando Graph API.
-    Soporta URLs remotas y archivos locales (si la URL contiene '/media/').
+    Soporta URLs remotas y archivos de nuestro MEDIA_ROOT (se suben en streaming).
     """
     page_id = os.getenv('FACEBOOK_PAGE_ID')
     token = os.getenv('FACEBOOK_ACCESS_TOKEN')
@@ -23,57 +34,29 @@ def publicar_en_facebook(texto, image_url=None):
         'message': texto,
         'access_token': token
     }
-    files = None
 
     # Si hay imagen
     if image_url:
-        # Cambiamos al endpoint de fotos
+        # Cambiamos al endpoint de fotos; para fotos se usa 'caption' en vez de 'message'
         url = f"https://graph.facebook.com/v19.0/{page_id}/photos"
-        
-        # Lógica para detectar si es un archivo local (generado por nosotros)
-        # Asumimos que si tiene '/media/' es local y tratamos de buscar el archivo
-        local_path = None
-        if '/media/' in image_url:
-            try:
-                # Extraer la parte relativa desde /media/
-                # Ej: http://localhost:8000/media/generated_images/img.jpg -> generated_images/img.jpg
-                relative_path = image_url.split('/media/')[-1]
-                # Construir ruta absoluta en el sistema de archivos
-                # Asumimos que 'media' está en la raíz del proyecto (donde corre manage.py)
-                possible_path = os.path.join('media', relative_path)
-                # Decodificar URL (por si tiene espacios o caracteres especiales)
-                possible_path = urllib.parse.unquote(possible_path)
-                
-                if os.path.exists(possible_path):
-                    local_path = possible_path
-            except Exception as e:
-                print(f"Error resolviendo ruta local: {e}")
-
-        if local_path:
-            # SUBIDA DE ARCHIVO BINARIO (Multipart)
-            print(f"   📂 (FB) Subiendo archivo local: {local_path}")
-            # 'source' es el campo para subir archivos en Graph API
-            files = {
-                'source': open(local_path, 'rb')
-            }
-            # Quitamos 'message' y usamos 'caption' para fotos
-            del payload['message']
-            payload['caption'] = texto
-        else:
-            # URL REMOTA (Facebook la descarga)
-            print(f"   🔗 (FB) Usando URL remota: {image_url}")
-            del payload['message']
-            payload['url'] = image_url
-            payload['caption'] = texto
+        del payload['message']
+        payload['caption'] = texto
+
+        # Archivo de nuestro MEDIA_ROOT: se sube directo desde el storage, sin
+        # que Facebook (ni nosotros) lo descargue por HTTP
+        nombre = resolver_media_local(image_url)
+        if nombre:
+            return _subir_foto_facebook(url, payload, nombre)
+
+        if nombre_media(image_url):
+            return {"platform": "facebook", "status": "error", "message": f"La imagen {image_url} no existe en MEDIA_ROOT"}
+
+        # URL REMOTA (Facebook la descarga)
+        print(f"   🔗 (FB) Usando URL remota: {image_url}")
+        payload['url'] = image_url
 
     try:
-        # Si hay files, requests usa multipart/form-data automáticamente
-        response = requests.post(url, data=payload, files=files)
-        
-        # Importante: Cerrar el archivo si lo abrimos
-        if files:
-            files['source'].close()
-            
+        response = get_session('facebook').post(url, data=payload)
         data = response.json()
         
         log_api_call("facebook", url, response.status_code, data)
@@ -88,16 +71,77 @@ def publicar_en_facebook(texto, image_url=None):
                 "url": published_url
             }
         else:
-            return {"platform": "facebook", "status": "error", "message": data}
+            return {"platform": "facebook", "status": "error", "message": data, **info_http(response)}
+    except Exception as e:
+        return {"platform": "facebook", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+def _subir_foto_facebook(url, payload, nombre):
+    """
+    Sube una imagen del storage al endpoint de fotos como multipart en
+    streaming (MultipartStreaming): el archivo se lee de a bloques mientras
+    se envía y nunca se carga completo en memoria.
+    """
+    print(f"   📂 (FB) Subiendo archivo local: {nombre}")
+    try:
+        with default_storage.open(nombre, 'rb') as archivo:
+            body = MultipartStreaming(payload, 'source', os.path.basename(nombre), archivo, default_storage.size(nombre))
+            response = get_session('facebook').post(
+                url, data=body, headers={'Content-Type': body.content_type},
+                timeout=(settings.SOCIAL_HTTP_CONNECT_TIMEOUT, settings.SOCIAL_HTTP_UPLOAD_READ_TIMEOUT)
+            )
+        data = response.json()
+
+        log_api_call("facebook", url, response.status_code, data)
+
+        if response.status_code == 200:
+            post_id = data.get("id") or data.get("post_id")
+            return {"platform": "facebook", "status": "success", "id": post_id, "url": f"https://www.facebook.com/{post_id}"}
+        return {"platform": "facebook", "status": "error", "message": data, **info_http(response)}
     except Exception as e:
-        return {"platform": "facebook", "status": "error", "message": str(e)}
+        return {"platform": "facebook", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+# --- INSTAGRAM (2 PASOS CON SONDEO DEL CONTENEDOR) ---
+# Intervalos crecientes para consultar el estado de un proceso remoto
+# (contenedor de Instagram, publish_id de TikTok)
+POLL_INICIAL = 2      # segundos
+POLL_FACTOR = 1.5
+POLL_MAXIMO = 30      # segundos
+POLL_MAX_INTENTOS = 40
+
+def intervalo_sondeo(poll_count):
+    """
+    Segundos a esperar antes del sondeo número `poll_count` (crece hasta POLL_MAXIMO).
+    """
+    return min(POLL_INICIAL * (POLL_FACTOR ** poll_count), POLL_MAXIMO)
+
+def programar_sondeo(pub, plataforma):
+    """
+    Guarda en la Publication cuándo toca el próximo sondeo y retorna el
+    resultado 'pending' con 'retry_in' para el scheduler.
+    """
+    espera = intervalo_sondeo(pub.poll_count)
+    pub.poll_count += 1
+    pub.next_poll_at = timezone.now() + timedelta(seconds=espera)
+    pub.save(update_fields=['creation_id', 'poll_count', 'next_poll_at'])
+    return {"platform": plataforma, "status": "pending", "creation_id": pub.creation_id, "retry_in": espera}
+
+def reiniciar_sondeo(pub):
+    """
+    Limpia el proceso remoto pendiente (terminado o fallido).
+    """
+    pub.creation_id = None
+    pub.creation_source = ''
+    pub.poll_count = 0
+    pub.next_poll_at = None
+    pub.save(update_fields=['creation_id', 'creation_source', 'poll_count', 'next_poll_at'])
 
-# --- INSTAGRAM (MODIFICADA CON PAUSA) ---
 @retry_with_backoff(max_attempts=2, initial_delay=3)
-def publicar_en_instagram(texto, image_url):
+@circuit_breaker('instagram')
+@rate_limited('instagram', credencial=lambda: os.getenv('INSTAGRAM_ACCOUNT_ID'))
+def crear_contenedor_instagram(texto, image_url):
     """
-    Publica una imagen con descripción en Instagram Business.
-    Flujo de 2 pasos con PAUSA de seguridad.
+    PASO 1: Crea el contenedor de la imagen en Instagram Business.
+    Retorna el creation_id que luego se publica con media_publish.
     """
     ig_user_id = os.getenv('INSTAGRAM_ACCOUNT_ID')
     token = os.getenv('FACEBOOK_ACCESS_TOKEN')
@@ -112,9 +156,8 @@ def publicar_en_instagram(texto, image_url):
     if not image_url:
          return {"platform": "instagram", "status": "error", "message": "Instagram requiere una URL de imagen"}
 
-    # PASO 1: Crear el contenedor (Subir la foto)
-    url_step_1 = f"https://graph.facebook.com/v19.0/{ig_user_id}/media"
-    payload_1 = {
+    url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media"
+    payload = {
         'image_url': image_url,
         'caption': texto,
         'access_token': token
@@ -122,53 +165,257 @@ def publicar_en_instagram(texto, image_url):
 
     try:
         print("   📸 (IG) Subiendo imagen a servidores de Meta...")
-        response_1 = requests.post(url_step_1, data=payload_1)
-        data_1 = response_1.json()
+        response = get_session('instagram').post(url, data=payload)
+        data = response.json()
         
-        log_api_call("instagram", url_step_1, response_1.status_code, data_1)
+        log_api_call("instagram", url, response.status_code, data)
         
-        if response_1.status_code != 200 or 'id' not in data_1:
-             return {"platform": "instagram", "status": "error", "step": "1", "message": data_1}
+        if response.status_code != 200 or 'id' not in data:
+             return {"platform": "instagram", "status": "error", "step": "1", "message": data, **info_http(response)}
         
-        creation_id = data_1['id']
-        print(f"   ✅ (IG) Imagen subida (ID: {creation_id}).")
-
-        # --- PAUSA DE SEGURIDAD (EL FIX) ---
-        # Esperamos 25 segundos para asegurar que Meta procese la imagen
-        print("   ⏳ (IG) Esperando 25 segundos a que Meta procese la imagen...")
-        time.sleep(25) 
-        # -----------------------------------
-
-        # PASO 2: Publicar el contenedor
-        print("   🚀 (IG) Publicando ahora...")
-        url_step_2 = f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish"
-        payload_2 = {
-            'creation_id': creation_id,
-            'access_token': token
+        print(f"   ✅ (IG) Contenedor creado (ID: {data['id']}).")
+        return {"platform": "instagram", "status": "success", "creation_id": data['id']}
+
+    except Exception as e:
+        return {"platform": "instagram", "status": "error", "step": "1", "message": str(e), **info_excepcion(e)}
+
+def consultar_contenedor_instagram(creation_id):
+    """
+    Consulta el status_code del contenedor: IN_PROGRESS, FINISHED, ERROR, EXPIRED o PUBLISHED.
+    """
+    token = os.getenv('FACEBOOK_ACCESS_TOKEN')
+    url = f"https://graph.facebook.com/v19.0/{creation_id}"
+    params = {
+        'fields': 'status_code,status',
+        'access_token': token
+    }
+
+    try:
+        response = get_session('instagram').get(url, params=params)
+        data = response.json()
+
+        log_api_call("instagram", url, response.status_code, data)
+
+        if response.status_code != 200:
+            return {"platform": "instagram", "status": "error", "step": "status", "message": data, **info_http(response)}
+
+        return {
+            "platform": "instagram",
+            "status": "success",
+            "status_code": data.get('status_code'),
+            "detail": data.get('status')
         }
+    except Exception as e:
+        return {"platform": "instagram", "status": "error", "step": "status", "message": str(e), **info_excepcion(e)}
 
-        response_2 = requests.post(url_step_2, data=payload_2)
-        data_2 = response_2.json()
+@retry_with_backoff(max_attempts=2, initial_delay=3)
+@circuit_breaker('instagram')
+def publicar_contenedor_instagram(creation_id):
+    """
+    PASO 2: Publica un contenedor que ya está FINISHED.
+    """
+    ig_user_id = os.getenv('INSTAGRAM_ACCOUNT_ID')
+    token = os.getenv('FACEBOOK_ACCESS_TOKEN')
+
+    print("   🚀 (IG) Publicando ahora...")
+    url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish"
+    payload = {
+        'creation_id': creation_id,
+        'access_token': token
+    }
+
+    try:
+        response = get_session('instagram').post(url, data=payload)
+        data = response.json()
         
-        log_api_call("instagram", url_step_2, response_2.status_code, data_2)
+        log_api_call("instagram", url, response.status_code, data)
 
-        if response_2.status_code == 200:
-            media_id = data_2.get("id")
+        if response.status_code == 200:
+            media_id = data.get("id")
             published_url = f"https://www.instagram.com/p/{media_id}/"
             return {"platform": "instagram", "status": "success", "id": media_id, "url": published_url}
         else:
-             return {"platform": "instagram", "status": "error", "step": "2", "message": data_2}
+             return {"platform": "instagram", "status": "error", "step": "2", "message": data, **info_http(response)}
 
     except Exception as e:
-        return {"platform": "instagram", "status": "error", "message": str(e)}
+        return {"platform": "instagram", "status": "error", "step": "2", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+def avanzar_publicacion_instagram(pub, image_url):
+    """
+    Máquina de estados reanudable para Instagram. Cada llamada hace UN paso
+    sin dormir el hilo:
+      - Sin creation_id: crea el contenedor y lo guarda en la Publication.
+      - Con creation_id: consulta status_code; si está FINISHED ejecuta media_publish.
+    Mientras Meta procesa retorna status 'pending' con 'retry_in' (segundos)
+    para que el scheduler vuelva a llamar más tarde.
+    """
+    # ESTADO 1: crear el contenedor
+    if not pub.creation_id:
+        resultado = crear_contenedor_instagram(pub.contenido_adaptado, image_url)
+        if resultado.get('status') != 'success':
+            return resultado
+
+        pub.creation_id = resultado['creation_id']
+        pub.poll_count = 0
+        return programar_sondeo(pub, 'instagram')
+
+    # ESTADO 2: esperar a que Meta procese la imagen
+    estado = consultar_contenedor_instagram(pub.creation_id)
+    if estado.get('status') != 'success':
+        return estado
+
+    status_code = estado.get('status_code')
+    print(f"   ⏳ (IG) Contenedor {pub.creation_id}: {status_code}")
+
+    if status_code in ('ERROR', 'EXPIRED'):
+        creation_id = pub.creation_id
+        reiniciar_sondeo(pub)
+        return {"platform": "instagram", "status": "error", "step": "status",
+                "message": f"Contenedor {creation_id} en estado {status_code}: {estado.get('detail')}"}
+
+    if status_code != 'FINISHED':
+        if pub.poll_count >= POLL_MAX_INTENTOS:
+            reiniciar_sondeo(pub)
+            return {"platform": "instagram", "status": "error", "step": "status",
+                    "message": "Meta no terminó de procesar la imagen a tiempo"}
+        return programar_sondeo(pub, 'instagram')
+
+    # ESTADO 3: publicar
+    resultado = publicar_contenedor_instagram(pub.creation_id)
+    if resultado.get('status') == 'success':
+        reiniciar_sondeo(pub)
+    return resultado
+
+def publicar_en_instagram(texto, image_url):
+    """
+    Publica una imagen con descripción en Instagram Business (versión bloqueante).
+    Sondea el status_code del contenedor con intervalos crecientes en lugar
+    de una pausa fija. Los workers usan avanzar_publicacion_instagram.
+    """
+    resultado = crear_contenedor_instagram(texto, image_url)
+    if resultado.get('status') != 'success':
+        return resultado
+
+    creation_id = resultado['creation_id']
+    for intento in range(POLL_MAX_INTENTOS):
+        time.sleep(intervalo_sondeo(intento))
+
+        estado = consultar_contenedor_instagram(creation_id)
+        if estado.get('status') != 'success':
+            return estado
+
+        status_code = estado.get('status_code')
+        if status_code == 'FINISHED':
+            return publicar_contenedor_instagram(creation_id)
+        if status_code in ('ERROR', 'EXPIRED'):
+            return {"platform": "instagram", "status": "error", "step": "status",
+                    "message": f"Contenedor {creation_id} en estado {status_code}: {estado.get('detail')}"}
+
+    return {"platform": "instagram", "status": "error", "step": "status",
+            "message": "Meta no terminó de procesar la imagen a tiempo"}
 
 # --- LINKEDIN ---
+# Caché del URN del miembro por huella del token: memoria del proceso + SocialCredential
+_urn_linkedin_cache = {}  # huella -> (urn, expira_en timestamp)
+_urn_linkedin_lock = threading.Lock()
+
+def huella_token(token):
+    """
+    Huella SHA-256 del access token (nunca guardamos el token como clave).
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def urn_linkedin_cacheado(huella):
+    """
+    URN vigente (LINKEDIN_URN_CACHE_TTL) de la huella: memoria o SocialCredential.
+    Retorna None si hay que consultar /v2/userinfo.
+    """
+    from .models import SocialCredential
+
+    with _urn_linkedin_lock:
+        cacheado = _urn_linkedin_cache.get(huella)
+    if cacheado and cacheado[1] > time.time():
+        return cacheado[0]
+
+    vigente_desde = timezone.now() - timedelta(seconds=settings.LINKEDIN_URN_CACHE_TTL)
+    credential = SocialCredential.objects.filter(
+        plataforma='linkedin', identity_fingerprint=huella, identity_cached_at__gte=vigente_desde
+    ).first()
+    if credential and credential.identity_urn:
+        expira = credential.identity_cached_at.timestamp() + settings.LINKEDIN_URN_CACHE_TTL
+        with _urn_linkedin_lock:
+            _urn_linkedin_cache[huella] = (credential.identity_urn, expira)
+        return credential.identity_urn
+    return None
+
+def guardar_urn_linkedin(huella, person_urn):
+    """
+    Cachea el URN en memoria y, si ya existe la credencial de LinkedIn, en
+    SocialCredential.
+    """
+    from .models import SocialCredential
+
+    with _urn_linkedin_lock:
+        _urn_linkedin_cache[huella] = (person_urn, time.time() + settings.LINKEDIN_URN_CACHE_TTL)
+
+    # El token sigue viviendo en .env; aquí solo persistimos la identidad.
+    # No se crea la fila: una credencial con access_token vacío parecería
+    # configurada para el resto del código
+    SocialCredential.objects.filter(plataforma='linkedin').update(
+        identity_fingerprint=huella,
+        identity_urn=person_urn,
+        identity_cached_at=timezone.now()
+    )
+
+def obtener_urn_linkedin(session, headers, token):
+    """
+    Retorna (person_urn, None) o (None, resultado_error).
+    Busca primero en memoria, luego en SocialCredential y solo si no hay
+    un valor vigente (LINKEDIN_URN_CACHE_TTL) llama a /v2/userinfo.
+    """
+    huella = huella_token(token)
+    person_urn = urn_linkedin_cacheado(huella)
+    if person_urn:
+        return person_urn, None
+
+    # OBTENER DATOS DEL USUARIO (getUserInfo)
+    # Documentación: https://learn.microsoft.com/en-us/linkedin/consumer/integrations/self-serve/sign-in-with-linkedin-v2#api-request-to-retreive-member-details
+    user_info_url = "https://api.linkedin.com/v2/userinfo"
+    resp_user = session.get(user_info_url, headers=headers)
+    
+    log_api_call("linkedin", user_info_url, resp_user.status_code)
+    
+    if resp_user.status_code != 200:
+        return None, {"platform": "linkedin", "status": "error", "step": "1_user_info", "message": resp_user.json(), **info_http(resp_user)}
+    
+    user_data = resp_user.json()
+    person_urn = f"urn:li:person:{user_data['sub']}" # Construimos el URN: urn:li:person:ID
+
+    guardar_urn_linkedin(huella, person_urn)
+    return person_urn, None
+
+def invalidar_urn_linkedin(token):
+    """
+    Borra el URN cacheado del token (memoria y BD), por ejemplo tras un 401.
+    """
+    from .models import SocialCredential
+
+    huella = huella_token(token)
+    with _urn_linkedin_lock:
+        _urn_linkedin_cache.pop(huella, None)
+    SocialCredential.objects.filter(plataforma='linkedin', identity_fingerprint=huella).update(
+        identity_urn=None, identity_cached_at=None
+    )
+
 @retry_with_backoff(max_attempts=3, initial_delay=2)
+@circuit_breaker('linkedin')
+@rate_limited('linkedin', credencial=lambda: os.getenv('LINKEDIN_ACCESS_TOKEN'))
 def publicar_en_linkedin(texto):
     """
     Publica en LinkedIn en 2 pasos:
-    1. Obtiene el ID del usuario (URN) dinámicamente.
+    1. Obtiene el ID del usuario (URN), cacheado por token con TTL.
     2. Crea el post UGC (User Generated Content).
+    Con el URN en caché, publicar es una sola llamada a ugcPosts.
     """
     token = os.getenv('LINKEDIN_ACCESS_TOKEN')
 
@@ -181,19 +428,14 @@ def publicar_en_linkedin(texto):
         'X-Restli-Protocol-Version': '2.0.0' # Obligatorio según documentación
     }
 
+    # Misma sesión (y conexión keep-alive) para los 2 pasos
+    session = get_session('linkedin')
+
     try:
-        # PASO 1: OBTENER DATOS DEL USUARIO (getUserInfo)
-        # Documentación: https://learn.microsoft.com/en-us/linkedin/consumer/integrations/self-serve/sign-in-with-linkedin-v2#api-request-to-retreive-member-details
-        user_info_url = "https://api.linkedin.com/v2/userinfo"
-        resp_user = requests.get(user_info_url, headers=headers)
-        
-        log_api_call("linkedin", user_info_url, resp_user.status_code)
-        
-        if resp_user.status_code != 200:
-            return {"platform": "linkedin", "status": "error", "step": "1_user_info", "message": resp_user.json()}
-        
-        user_data = resp_user.json()
-        person_urn = f"urn:li:person:{user_data['sub']}" # Construimos el URN: urn:li:person:ID
+        # PASO 1: URN DEL USUARIO (desde caché o getUserInfo)
+        person_urn, error = obtener_urn_linkedin(session, headers, token)
+        if error:
+            return error
         
         # PASO 2: PUBLICAR ARTÍCULO (postArticle)
         post_url = "https://api.linkedin.com/v2/ugcPosts"
@@ -214,7 +456,7 @@ def publicar_en_linkedin(texto):
             }
         }
 
-        resp_post = requests.post(post_url, headers=headers, json=payload)
+        resp_post = session.post(post_url, headers=headers, json=payload)
         post_data = resp_post.json()
         
         log_api_call("linkedin", post_url, resp_post.status_code, post_data)
@@ -224,12 +466,18 @@ def publicar_en_linkedin(texto):
             # LinkedIn no proporciona URL directa en la respuesta, pero podemos construirla
             return {"platform": "linkedin", "status": "success", "id": post_id, "url": "https://www.linkedin.com/feed/"}
         else:
-             return {"platform": "linkedin", "status": "error", "step": "2_publish", "message": post_data}
+            if resp_post.status_code == 401:
+                # Token revocado/renovado: el URN cacheado ya no es confiable
+                invalidar_urn_linkedin(token)
+            return {"platform": "linkedin", "status": "error", "step": "2_publish", "message": post_data, **info_http(resp_post)}
 
     except Exception as e:
-        return {"platform": "linkedin", "status": "error", "message": str(e)}
+        return {"platform": "linkedin", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
 # --- WHATSAPP (Twilio) ---
 @retry_with_backoff(max_attempts=3, initial_delay=1)
+@circuit_breaker('whatsapp')
+@rate_limited('whatsapp', credencial=lambda: os.getenv('TWILIO_WHATSAPP_FROM'))
 def publicar_en_whatsapp(texto, numero_destino):
     """
     Envía mensaje vía Twilio Sandbox.
@@ -249,7 +497,7 @@ def publicar_en_whatsapp(texto, numero_destino):
     }
 
     try:
-        response = requests.post(url, data=data, auth=(account_sid, auth_token))
+        response = get_session('whatsapp').post(url, data=data, auth=(account_sid, auth_token))
         response_data = response.json()
         
         log_api_call("whatsapp", url, response.status_code, response_data)
@@ -257,9 +505,9 @@ def publicar_en_whatsapp(texto, numero_destino):
         if response.status_code in [200, 201]:
             return {"platform": "whatsapp", "status": "success", "sid": response_data.get("sid")}
         else:
-            return {"platform": "whatsapp", "status": "error", "message": response_data}
+            return {"platform": "whatsapp", "status": "error", "message": response_data, **info_http(response)}
     except Exception as e:
-        return {"platform": "whatsapp", "status": "error", "message": str(e)}
+        return {"platform": "whatsapp", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
 
 # --- TIKTOK ---
 import hashlib
@@ -339,22 +587,116 @@ def get_tiktok_access_token(code, code_verifier):
     }
     
     try:
-        response = requests.post(url, headers=headers, data=data)
+        response = get_session('tiktok').post(url, headers=headers, data=data)
         data = response.json()
         log_api_call("tiktok_auth", url, response.status_code, data)
         return data
     except Exception as e:
         return {"error": str(e)}
 
-def publicar_en_tiktok(video_url, titulo="", descripcion=""):
+def _token_tiktok():
+    """
+    Access token de TikTok guardado (para el bucket de rate limit).
+    """
+    from .models import SocialCredential
+    credential = SocialCredential.objects.filter(plataforma='tiktok').first()
+    return credential.access_token if credential else None
+
+# Reglas de FILE_UPLOAD de TikTok: chunks de 5 MB a 64 MB; el último absorbe
+# el resto (hasta 128 MB) y los videos menores a 5 MB van en un solo chunk.
+TIKTOK_CHUNK_MINIMO = 5 * 1024 * 1024
+TIKTOK_CHUNK_MAXIMO = 64 * 1024 * 1024
+TIKTOK_CHUNK_MAX_INTENTOS = 3
+
+def calcular_chunks_tiktok(video_size, chunk_size=None):
+    """
+    Retorna (chunk_size, total_chunk_count) válidos para la Content Posting API.
+    """
+    chunk_size = chunk_size or settings.TIKTOK_UPLOAD_CHUNK_SIZE
+    chunk_size = max(TIKTOK_CHUNK_MINIMO, min(chunk_size, TIKTOK_CHUNK_MAXIMO))
+
+    if video_size <= chunk_size:
+        return video_size, 1
+
+    # División entera: el último chunk se lleva los bytes sobrantes
+    return chunk_size, video_size // chunk_size
+
+def subir_chunk_tiktok(session, upload_url, archivo, inicio, fin, video_size):
+    """
+    Sube los bytes [inicio, fin] del archivo con su Content-Range.
+    Si falla por red o error 5xx/429 reintenta SOLO este chunk.
+    """
+    longitud = fin - inicio + 1
+    headers = {
+        'Content-Type': 'video/mp4',
+        'Content-Length': str(longitud),
+        'Content-Range': f'bytes {inicio}-{fin}/{video_size}'
+    }
+    delay = 1
+
+    for intento in range(1, TIKTOK_CHUNK_MAX_INTENTOS + 1):
+        try:
+            # SeccionArchivo se envía leyendo de a bloques, sin cargar el chunk en memoria
+            response = session.put(
+                upload_url, headers=headers, data=SeccionArchivo(archivo, inicio, longitud),
+                timeout=(settings.SOCIAL_HTTP_CONNECT_TIMEOUT, settings.SOCIAL_HTTP_UPLOAD_READ_TIMEOUT)
+            )
+            log_api_call("tiktok_upload", headers['Content-Range'], response.status_code)
+
+            # 206 = chunk recibido (faltan más), 201/200 = archivo completo
+            if response.status_code in [200, 201, 206]:
+                return {"platform": "tiktok", "status": "success"}
+
+            if response.status_code < 500 and response.status_code != 429:
+                return {"platform": "tiktok", "status": "error",
+                        "message": f"Error subiendo bytes {inicio}-{fin}: {response.text}", **info_http(response)}
+
+            error = f"HTTP {response.status_code}: {response.text}"
+        except Exception as e:
+            error = str(e)
+
+        if intento < TIKTOK_CHUNK_MAX_INTENTOS:
+            print(f"   🔁 (TikTok) Reintentando bytes {inicio}-{fin} en {delay}s ({error})")
+            time.sleep(delay)
+            delay *= 2
+
+    return {"platform": "tiktok", "status": "error",
+            "message": f"Error subiendo bytes {inicio}-{fin} tras {TIKTOK_CHUNK_MAX_INTENTOS} intentos: {error}", "retryable": True}
+
+def subir_video_tiktok(session, upload_url, archivo, video_size, chunk_size, total_chunk_count):
+    """
+    Sube el video chunk por chunk. Un chunk fallido se reintenta sin
+    volver a enviar los que ya se subieron.
+    """
+    for indice in range(total_chunk_count):
+        inicio = indice * chunk_size
+        fin = video_size - 1 if indice == total_chunk_count - 1 else inicio + chunk_size - 1
+
+        print(f"   ⬆️ (TikTok) Chunk {indice + 1}/{total_chunk_count} (bytes {inicio}-{fin})")
+        resultado = subir_chunk_tiktok(session, upload_url, archivo, inicio, fin, video_size)
+        if resultado.get('status') != 'success':
+            return resultado
+
+    return {"platform": "tiktok", "status": "success"}
+
+@circuit_breaker('tiktok')
+@rate_limited('tiktok', credencial=_token_tiktok)
+def publicar_en_tiktok(video_url, titulo="", descripcion="", pull=True):
     """
     Publica un video en TikTok usando la Content Posting API (Direct Post).
     Requiere el scope 'video.publish'.
+    Si el video está en un dominio verificado en TikTok usa PULL_FROM_URL
+    (TikTok lo descarga directo). Si no, o si falla, el video (archivo de
+    MEDIA_ROOT o URL remota) se lee en streaming y se sube en varios chunks
+    con FILE_UPLOAD, así nunca se carga completo en memoria.
+    El resultado trae el publish_id y 'source'; el estado final se consulta
+    con consultar_estado_tiktok.
     
     Args:
-        video_url: URL del video a publicar (debe ser accesible públicamente)
+        video_url: URL del video a publicar (local en /media/ o remota)
         titulo: Título del video (opcional)
         descripcion: Descripción/caption del video (opcional)
+        pull: False para ir directo a FILE_UPLOAD (la descarga de TikTok ya falló)
     
     Returns:
         dict con status y detalles de la publicación
@@ -372,17 +714,26 @@ def publicar_en_tiktok(video_url, titulo="", descripcion=""):
             "message": "No hay token de TikTok. Debes autenticarte primero en /api/tiktok/auth/"
         }
     
-    # Descargar el video primero para evitar problemas de verificación de dominio (ngrok)
-    print(f"   📥 Descargando video desde {video_url}...")
+    # Si el video está en nuestro dominio verificado, TikTok lo descarga directo
+    if pull and es_dominio_verificado_tiktok(video_url):
+        resultado = _publicar_url_tiktok(access_token, video_url, titulo, descripcion)
+        if resultado.get('status') == 'success':
+            return resultado
+        print(f"   ⚠️ (TikTok) PULL_FROM_URL falló, usando FILE_UPLOAD: {resultado.get('message')}")
+
     try:
-        video_response = requests.get(video_url)
-        if video_response.status_code != 200:
-             return {"platform": "tiktok", "status": "error", "message": "No se pudo descargar el video de la URL proporcionada."}
-        video_content = video_response.content
-        video_size = len(video_content)
-        print(f"   📦 Video descargado ({video_size} bytes).")
+        with abrir_media(video_url) as (archivo, video_size):
+            print(f"   📦 Video listo ({video_size} bytes).")
+            return _publicar_archivo_tiktok(access_token, archivo, video_size, titulo, descripcion)
     except Exception as e:
-        return {"platform": "tiktok", "status": "error", "message": f"Error descargando video: {str(e)}"}
+        return {"platform": "tiktok", "status": "error", "message": f"Error leyendo video: {str(e)}"}
+
+def _publicar_archivo_tiktok(access_token, archivo, video_size, titulo, descripcion):
+    """
+    Inicializa el FILE_UPLOAD en TikTok y sube el archivo por chunks.
+    """
+    session = get_session('tiktok')
+    chunk_size, total_chunk_count = calcular_chunks_tiktok(video_size)
 
     # Paso 1: Inicializar el upload (DIRECT POST)
     # Endpoint para publicación directa (NO inbox)
@@ -397,26 +748,18 @@ def publicar_en_tiktok(video_url, titulo="", descripcion=""):
         "source_info": {
             "source": "FILE_UPLOAD",
             "video_size": video_size,
-            "chunk_size": video_size,
-            "total_chunk_count": 1
+            "chunk_size": chunk_size,
+            "total_chunk_count": total_chunk_count
         }
     }
     
     # Si hay título o descripción, agregarlos
     if titulo or descripcion:
-        caption = f"{titulo}\n\n{descripcion}" if titulo and descripcion else (titulo or descripcion)
-        init_payload["post_info"] = {
-            "title": caption[:150],  # TikTok limita a 150 caracteres
-            "privacy_level": "SELF_ONLY",  # Restricción de TikTok para Apps no auditadas: Solo Privado
-            "disable_duet": False,
-            "disable_comment": False,
-            "disable_stitch": False,
-            "video_cover_timestamp_ms": 1000
-        }
+        init_payload["post_info"] = _post_info_tiktok(titulo, descripcion)
     
     try:
-        print(f"   🎬 (TikTok) Inicializando carga de video...")
-        response = requests.post(init_url, headers=headers, json=init_payload)
+        print(f"   🎬 (TikTok) Inicializando carga de video ({total_chunk_count} chunks)...")
+        response = session.post(init_url, headers=headers, json=init_payload)
         data = response.json()
         
         log_api_call("tiktok_publish_init", init_url, response.status_code, data)
@@ -425,22 +768,10 @@ def publicar_en_tiktok(video_url, titulo="", descripcion=""):
             publish_id = data['data'].get('publish_id')
             upload_url = data['data'].get('upload_url')
             
-            # Paso 2: Subir el archivo binario
-            print(f"   ⬆️ Subiendo archivo a TikTok...")
-            upload_headers = {
-                'Content-Type': 'video/mp4',
-                'Content-Length': str(video_size),
-                'Content-Range': f'bytes 0-{video_size-1}/{video_size}'
-            }
-            
-            upload_resp = requests.put(upload_url, headers=upload_headers, data=video_content)
-            
-            if upload_resp.status_code not in [200, 201]:
-                return {
-                    "platform": "tiktok", 
-                    "status": "error", 
-                    "message": f"Error subiendo binario: {upload_resp.text}"
-                }
+            # Paso 2: Subir el archivo binario por chunks
+            resultado = subir_video_tiktok(session, upload_url, archivo, video_size, chunk_size, total_chunk_count)
+            if resultado.get('status') != 'success':
+                return resultado
 
             return {
                 "platform": "tiktok",
@@ -450,32 +781,206 @@ def publicar_en_tiktok(video_url, titulo="", descripcion=""):
                 "url": f"https://www.tiktok.com/@me/video/{publish_id}" if publish_id else None
             }
         else:
-            error_msg = data.get('error', {}).get('message', 'Error desconocido')
-            error_code = data.get('error', {}).get('code', 'unknown')
-            
-            # Mensajes de error específicos
-            if error_code == 'access_token_invalid':
-                return {
-                    "platform": "tiktok",
-                    "status": "error",
-                    "message": "Token expirado. Vuelve a autenticarte en /api/tiktok/auth/"
-                }
-            elif error_code == 'scope_not_authorized':
-                return {
-                    "platform": "tiktok",
-                    "status": "error",
-                    "message": "Falta el permiso 'video.publish'. Solicítalo en el Portal de TikTok y re-autentícate."
-                }
-            else:
-                return {
-                    "platform": "tiktok",
-                    "status": "error",
-                    "message": f"Error de TikTok: {error_msg} (Código: {error_code})"
-                }
+            return _error_tiktok(data, response)
                 
     except Exception as e:
         return {
             "platform": "tiktok",
             "status": "error",
-            "message": f"Excepción: {str(e)}"
-        }
\ No newline at end of file
+            "message": f"Excepción: {str(e)}",
+            **info_excepcion(e)
+        }
+
+def _post_info_tiktok(titulo, descripcion):
+    """
+    Arma el bloque post_info del init con el caption del video.
+    """
+    caption = f"{titulo}\n\n{descripcion}" if titulo and descripcion else (titulo or descripcion)
+    return {
+        "title": caption[:150],  # TikTok limita a 150 caracteres
+        "privacy_level": "SELF_ONLY",  # Restricción de TikTok para Apps no auditadas: Solo Privado
+        "disable_duet": False,
+        "disable_comment": False,
+        "disable_stitch": False,
+        "video_cover_timestamp_ms": 1000
+    }
+
+def _error_tiktok(data, response=None):
+    """
+    Traduce el bloque 'error' de la API de TikTok a un resultado de error.
+    """
+    error_msg = data.get('error', {}).get('message', 'Error desconocido')
+    error_code = data.get('error', {}).get('code', 'unknown')
+    
+    # Mensajes de error específicos
+    if error_code == 'access_token_invalid':
+        return {
+            "platform": "tiktok",
+            "status": "error",
+            **(info_http(response) if response is not None else {}),
+            "message": "Token expirado. Vuelve a autenticarte en /api/tiktok/auth/"
+        }
+    elif error_code == 'scope_not_authorized':
+        return {
+            "platform": "tiktok",
+            "status": "error",
+            **(info_http(response) if response is not None else {}),
+            "message": "Falta el permiso 'video.publish'. Solicítalo en el Portal de TikTok y re-autentícate."
+        }
+    else:
+        return {
+            "platform": "tiktok",
+            "status": "error",
+            **(info_http(response) if response is not None else {}),
+            "message": f"Error de TikTok: {error_msg} (Código: {error_code})"
+        }
+
+def es_dominio_verificado_tiktok(video_url):
+    """
+    True si la URL es https y su host es (o es subdominio de) uno de los
+    dominios verificados en el portal de TikTok (TIKTOK_VERIFIED_DOMAINS).
+    """
+    partes = urllib.parse.urlparse(video_url or '')
+    host = (partes.hostname or '').lower()
+    if partes.scheme != 'https' or not host:
+        return False
+
+    return any(host == dominio or host.endswith('.' + dominio) for dominio in settings.TIKTOK_VERIFIED_DOMAINS)
+
+def _publicar_url_tiktok(access_token, video_url, titulo, descripcion):
+    """
+    Inicializa un Direct Post con source PULL_FROM_URL: TikTok descarga el
+    video de nuestro dominio verificado y nosotros no lo tocamos.
+    """
+    init_url = "https://open.tiktokapis.com/v2/post/publish/video/init/"
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json; charset=UTF-8'
+    }
+    init_payload = {
+        "source_info": {
+            "source": "PULL_FROM_URL",
+            "video_url": video_url
+        }
+    }
+    if titulo or descripcion:
+        init_payload["post_info"] = _post_info_tiktok(titulo, descripcion)
+
+    try:
+        print(f"   🔗 (TikTok) PULL_FROM_URL desde {video_url}...")
+        response = get_session('tiktok').post(init_url, headers=headers, json=init_payload)
+        data = response.json()
+
+        log_api_call("tiktok_publish_init", init_url, response.status_code, data)
+
+        if response.status_code == 200 and data.get('data'):
+            publish_id = data['data'].get('publish_id')
+            return {
+                "platform": "tiktok",
+                "status": "success",
+                "id": publish_id,
+                "message": "TikTok está descargando el video (PULL_FROM_URL).",
+                "url": f"https://www.tiktok.com/@me/video/{publish_id}" if publish_id else None,
+                "source": "PULL_FROM_URL"
+            }
+        return _error_tiktok(data, response)
+
+    except Exception as e:
+        return {"platform": "tiktok", "status": "error", "message": f"Excepción: {str(e)}", **info_excepcion(e, idempotente=False)}
+
+def consultar_estado_tiktok(access_token, publish_id):
+    """
+    Consulta el estado de un publish_id: PROCESSING_DOWNLOAD, PROCESSING_UPLOAD,
+    SEND_TO_USER_INBOX, PUBLISH_COMPLETE o FAILED.
+    """
+    url = "https://open.tiktokapis.com/v2/post/publish/status/fetch/"
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json; charset=UTF-8'
+    }
+
+    try:
+        response = get_session('tiktok').post(url, headers=headers, json={"publish_id": publish_id})
+        data = response.json()
+
+        log_api_call("tiktok_publish_status", url, response.status_code, data)
+
+        if response.status_code != 200 or not data.get('data'):
+            return _error_tiktok(data, response)
+
+        return {
+            "platform": "tiktok",
+            "status": "success",
+            "publish_status": data['data'].get('status'),
+            "fail_reason": data['data'].get('fail_reason'),
+            "post_ids": data['data'].get('publicaly_available_post_id') or []
+        }
+    except Exception as e:
+        return {"platform": "tiktok", "status": "error", "message": str(e), **info_excepcion(e)}
+
+def iniciar_publicacion_tiktok(pub, video_url, pull=True):
+    """
+    Inicia la publicación, guarda el publish_id y su origen, y programa el sondeo.
+    """
+    resultado = publicar_en_tiktok(video_url, pub.contenido_adaptado, pull=pull)
+    if resultado.get('status') != 'success' or not resultado.get('id'):
+        return resultado
+
+    pub.creation_id = resultado['id']
+    pub.creation_source = resultado.get('source', 'FILE_UPLOAD')
+    pub.poll_count = 0
+    pub.save(update_fields=['creation_source'])
+    return programar_sondeo(pub, 'tiktok')
+
+def avanzar_publicacion_tiktok(pub, video_url):
+    """
+    Máquina de estados reanudable para TikTok (igual que Instagram):
+      - Sin creation_id: inicia la publicación y guarda el publish_id.
+      - Con creation_id: consulta el estado hasta PUBLISH_COMPLETE o FAILED.
+    Mientras TikTok procesa retorna status 'pending' con 'retry_in'.
+    """
+    from .models import SocialCredential
+
+    # ESTADO 1: iniciar la publicación (PULL_FROM_URL o FILE_UPLOAD)
+    if not pub.creation_id:
+        return iniciar_publicacion_tiktok(pub, video_url)
+
+    # ESTADO 2: esperar a que TikTok termine de procesar
+    credential = SocialCredential.objects.filter(plataforma='tiktok').first()
+    if not credential:
+        return {"platform": "tiktok", "status": "error", "message": "No hay token de TikTok. Debes autenticarte primero en /api/tiktok/auth/"}
+
+    estado = consultar_estado_tiktok(credential.access_token, pub.creation_id)
+    if estado.get('status') != 'success':
+        return estado
+
+    publish_status = estado.get('publish_status')
+    print(f"   ⏳ (TikTok) publish_id {pub.creation_id}: {publish_status}")
+
+    if publish_status == 'FAILED':
+        publish_id, source = pub.creation_id, pub.creation_source
+        reiniciar_sondeo(pub)
+        if source == 'PULL_FROM_URL':
+            # TikTok aceptó el PULL_FROM_URL pero no pudo descargar el video: lo subimos nosotros
+            print(f"   ⚠️ (TikTok) PULL_FROM_URL {publish_id} falló ({estado.get('fail_reason')}), usando FILE_UPLOAD")
+            return iniciar_publicacion_tiktok(pub, video_url, pull=False)
+        return {"platform": "tiktok", "status": "error",
+                "message": f"TikTok rechazó el video {publish_id}: {estado.get('fail_reason')}"}
+
+    if publish_status in ('PUBLISH_COMPLETE', 'SEND_TO_USER_INBOX'):
+        publish_id = pub.creation_id
+        reiniciar_sondeo(pub)
+        post_ids = estado.get('post_ids')
+        video_id = post_ids[0] if post_ids else publish_id
+        return {
+            "platform": "tiktok",
+            "status": "success",
+            "id": video_id,
+            "message": "Video publicado exitosamente en TikTok (Direct Post).",
+            "url": f"https://www.tiktok.com/@me/video/{video_id}"
+        }
+
+    if pub.poll_count >= POLL_MAX_INTENTOS:
+        reiniciar_sondeo(pub)
+        return {"platform": "tiktok", "status": "error", "message": "TikTok no terminó de procesar el video a tiempo"}
+    return programar_sondeo(pub, 'tiktok')
@@ -0,0 +1,516 @@
+"""
+Versiones async de las funciones de publicación de social_service.
+
+Usan httpx.AsyncClient (api/http_client.get_async_client) en lugar de
+requests: mientras una publicación espera a la red social el event loop
+atiende a las demás, así un solo proceso ASGI (uvicorn) sostiene cientos de
+publicaciones concurrentes. Los decoradores de reintento, circuit breaker y
+rate limit son los mismos que en la versión síncrona.
+"""
+import os
+import asyncio
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .retry_service import retry_with_backoff, info_http, info_excepcion
+from .http_client import get_async_client
+from .rate_limit import rate_limited
+from .circuit_breaker import circuit_breaker
+from .media_service import resolver_media_local, nombre_media, MultipartStreaming, abrir_media_async, leer_seccion_async
+from .notification_service import log_api_call
+from .social_service import (
+    POLL_MAX_INTENTOS, intervalo_sondeo,
+    huella_token, urn_linkedin_cacheado, guardar_urn_linkedin, invalidar_urn_linkedin,
+    _token_tiktok, calcular_chunks_tiktok, TIKTOK_CHUNK_MAX_INTENTOS,
+    _post_info_tiktok, _error_tiktok, es_dominio_verificado_tiktok,
+)
+
+
+# --- FACEBOOK ---
+@retry_with_backoff(max_attempts=3, initial_delay=2)
+@circuit_breaker('facebook')
+@rate_limited('facebook', credencial=lambda: os.getenv('FACEBOOK_ACCESS_TOKEN'))
+async def publicar_en_facebook_async(texto, image_url=None):
+    """
+    Igual que publicar_en_facebook: texto o imagen con texto en la Página.
+    Las imágenes de MEDIA_ROOT se suben como archivo (multipart en streaming).
+    """
+    page_id = os.getenv('FACEBOOK_PAGE_ID')
+    token = os.getenv('FACEBOOK_ACCESS_TOKEN')
+
+    if not page_id or not token:
+        return {"platform": "facebook", "status": "error", "message": "Faltan credenciales"}
+
+    url = f"https://graph.facebook.com/v19.0/{page_id}/feed"
+    payload = {
+        'message': texto,
+        'access_token': token
+    }
+
+    if image_url:
+        url = f"https://graph.facebook.com/v19.0/{page_id}/photos"
+        del payload['message']
+        payload['caption'] = texto
+
+        nombre = await sync_to_async(resolver_media_local)(image_url)
+        if nombre:
+            return await _subir_foto_facebook_async(url, payload, nombre)
+
+        if nombre_media(image_url):
+            return {"platform": "facebook", "status": "error", "message": f"La imagen {image_url} no existe en MEDIA_ROOT"}
+
+        print(f"   🔗 (FB) Usando URL remota: {image_url}")
+        payload['url'] = image_url
+
+    try:
+        response = await get_async_client('facebook').post(url, data=payload)
+        data = response.json()
+
+        log_api_call("facebook", url, response.status_code, data)
+
+        if response.status_code == 200:
+            post_id = data.get("id") or data.get("post_id")
+            return {
+                "platform": "facebook",
+                "status": "success",
+                "id": post_id,
+                "url": f"https://www.facebook.com/{post_id}"
+            }
+        return {"platform": "facebook", "status": "error", "message": data, **info_http(response)}
+    except Exception as e:
+        return {"platform": "facebook", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+
+async def _subir_foto_facebook_async(url, payload, nombre):
+    """
+    Versión async de _subir_foto_facebook: httpx envía el multipart leyendo
+    el archivo de a bloques.
+    """
+    print(f"   📂 (FB) Subiendo archivo local: {nombre}")
+    try:
+        archivo = await sync_to_async(default_storage.open)(nombre, 'rb')
+        try:
+            body = MultipartStreaming(payload, 'source', os.path.basename(nombre), archivo, await sync_to_async(default_storage.size)(nombre))
+            response = await get_async_client('facebook').post(
+                url, content=body, headers={'Content-Type': body.content_type, 'Content-Length': str(len(body))},
+                timeout=httpx.Timeout(settings.SOCIAL_HTTP_UPLOAD_READ_TIMEOUT, connect=settings.SOCIAL_HTTP_CONNECT_TIMEOUT)
+            )
+        finally:
+            archivo.close()
+        data = response.json()
+
+        log_api_call("facebook", url, response.status_code, data)
+
+        if response.status_code == 200:
+            post_id = data.get("id") or data.get("post_id")
+            return {"platform": "facebook", "status": "success", "id": post_id, "url": f"https://www.facebook.com/{post_id}"}
+        return {"platform": "facebook", "status": "error", "message": data, **info_http(response)}
+    except Exception as e:
+        return {"platform": "facebook", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+
+# --- INSTAGRAM ---
+@retry_with_backoff(max_attempts=2, initial_delay=3)
+@circuit_breaker('instagram')
+@rate_limited('instagram', credencial=lambda: os.getenv('INSTAGRAM_ACCOUNT_ID'))
+async def crear_contenedor_instagram_async(texto, image_url):
+    """
+    PASO 1: Crea el contenedor de la imagen (ver crear_contenedor_instagram).
+    """
+    ig_user_id = os.getenv('INSTAGRAM_ACCOUNT_ID')
+    token = os.getenv('FACEBOOK_ACCESS_TOKEN')
+
+    if not ig_user_id or not token:
+        return {
+            "platform": "instagram",
+            "status": "manual_action_required",
+            "message": "Falta ID de Instagram. Acción manual requerida."
+        }
+
+    if not image_url:
+        return {"platform": "instagram", "status": "error", "message": "Instagram requiere una URL de imagen"}
+
+    url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media"
+    payload = {
+        'image_url': image_url,
+        'caption': texto,
+        'access_token': token
+    }
+
+    try:
+        response = await get_async_client('instagram').post(url, data=payload)
+        data = response.json()
+
+        log_api_call("instagram", url, response.status_code, data)
+
+        if response.status_code != 200 or 'id' not in data:
+            return {"platform": "instagram", "status": "error", "step": "1", "message": data, **info_http(response)}
+
+        return {"platform": "instagram", "status": "success", "creation_id": data['id']}
+    except Exception as e:
+        return {"platform": "instagram", "status": "error", "step": "1", "message": str(e), **info_excepcion(e)}
+
+
+async def consultar_contenedor_instagram_async(creation_id):
+    """
+    Consulta el status_code del contenedor (ver consultar_contenedor_instagram).
+    """
+    url = f"https://graph.facebook.com/v19.0/{creation_id}"
+    params = {
+        'fields': 'status_code,status',
+        'access_token': os.getenv('FACEBOOK_ACCESS_TOKEN')
+    }
+
+    try:
+        response = await get_async_client('instagram').get(url, params=params)
+        data = response.json()
+
+        log_api_call("instagram", url, response.status_code, data)
+
+        if response.status_code != 200:
+            return {"platform": "instagram", "status": "error", "step": "status", "message": data, **info_http(response)}
+
+        return {
+            "platform": "instagram",
+            "status": "success",
+            "status_code": data.get('status_code'),
+            "detail": data.get('status')
+        }
+    except Exception as e:
+        return {"platform": "instagram", "status": "error", "step": "status", "message": str(e), **info_excepcion(e)}
+
+
+@retry_with_backoff(max_attempts=2, initial_delay=3)
+@circuit_breaker('instagram')
+async def publicar_contenedor_instagram_async(creation_id):
+    """
+    PASO 2: Publica un contenedor que ya está FINISHED.
+    """
+    url = f"https://graph.facebook.com/v19.0/{os.getenv('INSTAGRAM_ACCOUNT_ID')}/media_publish"
+    payload = {
+        'creation_id': creation_id,
+        'access_token': os.getenv('FACEBOOK_ACCESS_TOKEN')
+    }
+
+    try:
+        response = await get_async_client('instagram').post(url, data=payload)
+        data = response.json()
+
+        log_api_call("instagram", url, response.status_code, data)
+
+        if response.status_code == 200:
+            media_id = data.get("id")
+            return {"platform": "instagram", "status": "success", "id": media_id, "url": f"https://www.instagram.com/p/{media_id}/"}
+        return {"platform": "instagram", "status": "error", "step": "2", "message": data, **info_http(response)}
+    except Exception as e:
+        return {"platform": "instagram", "status": "error", "step": "2", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+
+async def publicar_en_instagram_async(texto, image_url):
+    """
+    Igual que publicar_en_instagram: crea el contenedor, sondea su estado con
+    intervalos crecientes y lo publica. La espera no ocupa ningún hilo.
+    """
+    resultado = await crear_contenedor_instagram_async(texto, image_url)
+    if resultado.get('status') != 'success':
+        return resultado
+
+    creation_id = resultado['creation_id']
+    for intento in range(POLL_MAX_INTENTOS):
+        await asyncio.sleep(intervalo_sondeo(intento))
+
+        estado = await consultar_contenedor_instagram_async(creation_id)
+        if estado.get('status') != 'success':
+            return estado
+
+        status_code = estado.get('status_code')
+        if status_code == 'FINISHED':
+            return await publicar_contenedor_instagram_async(creation_id)
+        if status_code in ('ERROR', 'EXPIRED'):
+            return {"platform": "instagram", "status": "error", "step": "status",
+                    "message": f"Contenedor {creation_id} en estado {status_code}: {estado.get('detail')}"}
+
+    return {"platform": "instagram", "status": "error", "step": "status",
+            "message": "Meta no terminó de procesar la imagen a tiempo"}
+
+
+# --- LINKEDIN ---
+@retry_with_backoff(max_attempts=3, initial_delay=2)
+@circuit_breaker('linkedin')
+@rate_limited('linkedin', credencial=lambda: os.getenv('LINKEDIN_ACCESS_TOKEN'))
+async def publicar_en_linkedin_async(texto):
+    """
+    Igual que publicar_en_linkedin: URN del miembro (cacheado) y post UGC.
+    """
+    token = os.getenv('LINKEDIN_ACCESS_TOKEN')
+
+    if not token:
+        return {"platform": "linkedin", "status": "error", "message": "Falta LINKEDIN_ACCESS_TOKEN en .env"}
+
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json',
+        'X-Restli-Protocol-Version': '2.0.0'
+    }
+    client = get_async_client('linkedin')
+    huella = huella_token(token)
+
+    try:
+        # PASO 1: URN DEL USUARIO (desde caché o getUserInfo)
+        person_urn = await sync_to_async(urn_linkedin_cacheado)(huella)
+        if not person_urn:
+            user_info_url = "https://api.linkedin.com/v2/userinfo"
+            resp_user = await client.get(user_info_url, headers=headers)
+
+            log_api_call("linkedin", user_info_url, resp_user.status_code)
+
+            if resp_user.status_code != 200:
+                return {"platform": "linkedin", "status": "error", "step": "1_user_info", "message": resp_user.json(), **info_http(resp_user)}
+
+            person_urn = f"urn:li:person:{resp_user.json()['sub']}"
+            await sync_to_async(guardar_urn_linkedin)(huella, person_urn)
+
+        # PASO 2: PUBLICAR
+        post_url = "https://api.linkedin.com/v2/ugcPosts"
+        payload = {
+            "author": person_urn,
+            "lifecycleState": "PUBLISHED",
+            "specificContent": {
+                "com.linkedin.ugc.ShareContent": {
+                    "shareCommentary": {
+                        "text": texto
+                    },
+                    "shareMediaCategory": "NONE"
+                }
+            },
+            "visibility": {
+                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+            }
+        }
+
+        resp_post = await client.post(post_url, headers=headers, json=payload)
+        post_data = resp_post.json()
+
+        log_api_call("linkedin", post_url, resp_post.status_code, post_data)
+
+        if resp_post.status_code == 201:
+            return {"platform": "linkedin", "status": "success", "id": post_data.get("id"), "url": "https://www.linkedin.com/feed/"}
+
+        if resp_post.status_code == 401:
+            await sync_to_async(invalidar_urn_linkedin)(token)
+        return {"platform": "linkedin", "status": "error", "step": "2_publish", "message": post_data, **info_http(resp_post)}
+
+    except Exception as e:
+        return {"platform": "linkedin", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+
+# --- WHATSAPP (Twilio) ---
+@retry_with_backoff(max_attempts=3, initial_delay=1)
+@circuit_breaker('whatsapp')
+@rate_limited('whatsapp', credencial=lambda: os.getenv('TWILIO_WHATSAPP_FROM'))
+async def publicar_en_whatsapp_async(texto, numero_destino):
+    """
+    Envía mensaje vía Twilio Sandbox (ver publicar_en_whatsapp).
+    """
+    account_sid = os.getenv('TWILIO_ACCOUNT_SID')
+    auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+
+    if not account_sid or not auth_token:
+        return {"platform": "whatsapp", "status": "error", "message": "Faltan credenciales"}
+
+    url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+    data = {
+        'From': os.getenv('TWILIO_WHATSAPP_FROM'),
+        'To': f"whatsapp:{numero_destino}",
+        'Body': texto
+    }
+
+    try:
+        response = await get_async_client('whatsapp').post(url, data=data, auth=(account_sid, auth_token))
+        response_data = response.json()
+
+        log_api_call("whatsapp", url, response.status_code, response_data)
+
+        if response.status_code in [200, 201]:
+            return {"platform": "whatsapp", "status": "success", "sid": response_data.get("sid")}
+        return {"platform": "whatsapp", "status": "error", "message": response_data, **info_http(response)}
+    except Exception as e:
+        return {"platform": "whatsapp", "status": "error", "message": str(e), **info_excepcion(e, idempotente=False)}
+
+
+# --- TIKTOK ---
+def _headers_tiktok(access_token):
+    return {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json; charset=UTF-8'
+    }
+
+
+async def _init_tiktok_async(access_token, init_payload, idempotente):
+    """
+    POST al endpoint init de Direct Post. Retorna (data, None) o (None, error).
+    """
+    init_url = "https://open.tiktokapis.com/v2/post/publish/video/init/"
+    try:
+        response = await get_async_client('tiktok').post(init_url, headers=_headers_tiktok(access_token), json=init_payload)
+        data = response.json()
+        log_api_call("tiktok_publish_init", init_url, response.status_code, data)
+
+        if response.status_code == 200 and data.get('data'):
+            return data['data'], None
+        return None, _error_tiktok(data, response)
+    except Exception as e:
+        return None, {"platform": "tiktok", "status": "error", "message": f"Excepción: {str(e)}", **info_excepcion(e, idempotente=idempotente)}
+
+
+async def subir_chunk_tiktok_async(upload_url, archivo, inicio, fin, video_size):
+    """
+    Sube los bytes [inicio, fin] con su Content-Range (ver subir_chunk_tiktok).
+    El body se lee del archivo por bloques mientras se envía.
+    """
+    longitud = fin - inicio + 1
+    headers = {
+        'Content-Type': 'video/mp4',
+        'Content-Length': str(longitud),
+        'Content-Range': f'bytes {inicio}-{fin}/{video_size}'
+    }
+    timeout = httpx.Timeout(settings.SOCIAL_HTTP_UPLOAD_READ_TIMEOUT, connect=settings.SOCIAL_HTTP_CONNECT_TIMEOUT)
+    delay = 1
+
+    for intento in range(1, TIKTOK_CHUNK_MAX_INTENTOS + 1):
+        try:
+            response = await get_async_client('tiktok').put(
+                upload_url, headers=headers, content=leer_seccion_async(archivo, inicio, longitud), timeout=timeout
+            )
+            log_api_call("tiktok_upload", headers['Content-Range'], response.status_code)
+
+            if response.status_code in [200, 201, 206]:
+                return {"platform": "tiktok", "status": "success"}
+
+            if response.status_code < 500 and response.status_code != 429:
+                return {"platform": "tiktok", "status": "error",
+                        "message": f"Error subiendo bytes {inicio}-{fin}: {response.text}", **info_http(response)}
+
+            error = f"HTTP {response.status_code}: {response.text}"
+        except Exception as e:
+            error = str(e)
+
+        if intento < TIKTOK_CHUNK_MAX_INTENTOS:
+            print(f"   🔁 (TikTok) Reintentando bytes {inicio}-{fin} en {delay}s ({error})")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    return {"platform": "tiktok", "status": "error",
+            "message": f"Error subiendo bytes {inicio}-{fin} tras {TIKTOK_CHUNK_MAX_INTENTOS} intentos: {error}", "retryable": True}
+
+
+@circuit_breaker('tiktok')
+@rate_limited('tiktok', credencial=_token_tiktok)
+async def publicar_en_tiktok_async(video_url, titulo="", descripcion="", pull=True):
+    """
+    Igual que publicar_en_tiktok: PULL_FROM_URL si el video está en un
+    dominio verificado (y pull=True) y, si no (o si falla), FILE_UPLOAD por chunks.
+    Retorna el publish_id; el estado final se espera con
+    esperar_publicacion_tiktok_async.
+    """
+    access_token = await sync_to_async(_token_tiktok)()
+    if not access_token:
+        return {
+            "platform": "tiktok",
+            "status": "error",
+            "message": "No hay token de TikTok. Debes autenticarte primero en /api/tiktok/auth/"
+        }
+
+    post_info = {"post_info": _post_info_tiktok(titulo, descripcion)} if titulo or descripcion else {}
+
+    if pull and es_dominio_verificado_tiktok(video_url):
+        data, error = await _init_tiktok_async(access_token, {
+            "source_info": {"source": "PULL_FROM_URL", "video_url": video_url}, **post_info
+        }, idempotente=False)
+        if data:
+            publish_id = data.get('publish_id')
+            return {
+                "platform": "tiktok",
+                "status": "success",
+                "id": publish_id,
+                "message": "TikTok está descargando el video (PULL_FROM_URL).",
+                "url": f"https://www.tiktok.com/@me/video/{publish_id}" if publish_id else None,
+                "source": "PULL_FROM_URL"
+            }
+        print(f"   ⚠️ (TikTok) PULL_FROM_URL falló, usando FILE_UPLOAD: {error.get('message')}")
+
+    try:
+        async with abrir_media_async(video_url) as (archivo, video_size):
+            chunk_size, total_chunk_count = calcular_chunks_tiktok(video_size)
+            data, error = await _init_tiktok_async(access_token, {
+                "source_info": {
+                    "source": "FILE_UPLOAD",
+                    "video_size": video_size,
+                    "chunk_size": chunk_size,
+                    "total_chunk_count": total_chunk_count
+                },
+                **post_info
+            }, idempotente=True)
+            if error:
+                return error
+
+            for indice in range(total_chunk_count):
+                inicio = indice * chunk_size
+                fin = video_size - 1 if indice == total_chunk_count - 1 else inicio + chunk_size - 1
+                resultado = await subir_chunk_tiktok_async(data.get('upload_url'), archivo, inicio, fin, video_size)
+                if resultado.get('status') != 'success':
+                    return resultado
+    except Exception as e:
+        return {"platform": "tiktok", "status": "error", "message": f"Error leyendo video: {str(e)}"}
+
+    publish_id = data.get('publish_id')
+    return {
+        "platform": "tiktok",
+        "status": "success",
+        "id": publish_id,
+        "message": "Video publicado exitosamente en TikTok (Direct Post).",
+        "url": f"https://www.tiktok.com/@me/video/{publish_id}" if publish_id else None
+    }
+
+
+async def esperar_publicacion_tiktok_async(publish_id):
+    """
+    Sondea el publish_id hasta PUBLISH_COMPLETE o FAILED
+    (versión async de la máquina de estados avanzar_publicacion_tiktok).
+    """
+    access_token = await sync_to_async(_token_tiktok)()
+    url = "https://open.tiktokapis.com/v2/post/publish/status/fetch/"
+
+    for intento in range(POLL_MAX_INTENTOS):
+        await asyncio.sleep(intervalo_sondeo(intento))
+        try:
+            response = await get_async_client('tiktok').post(url, headers=_headers_tiktok(access_token), json={"publish_id": publish_id})
+            data = response.json()
+        except Exception as e:
+            return {"platform": "tiktok", "status": "error", "message": str(e), **info_excepcion(e)}
+
+        log_api_call("tiktok_publish_status", url, response.status_code, data)
+
+        if response.status_code != 200 or not data.get('data'):
+            return _error_tiktok(data, response)
+
+        publish_status = data['data'].get('status')
+        if publish_status == 'FAILED':
+            return {"platform": "tiktok", "status": "error", "tiktok_failed": True,
+                    "message": f"TikTok rechazó el video {publish_id}: {data['data'].get('fail_reason')}"}
+
+        if publish_status in ('PUBLISH_COMPLETE', 'SEND_TO_USER_INBOX'):
+            post_ids = data['data'].get('publicaly_available_post_id') or []
+            video_id = post_ids[0] if post_ids else publish_id
+            return {
+                "platform": "tiktok",
+                "status": "success",
+                "id": video_id,
+                "message": "Video publicado exitosamente en TikTok (Direct Post).",
+                "url": f"https://www.tiktok.com/@me/video/{video_id}"
+            }
+
+    return {"platform": "tiktok", "status": "error", "message": "TikTok no terminó de procesar el video a tiempo"}
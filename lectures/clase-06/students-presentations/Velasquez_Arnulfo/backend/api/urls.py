@@ -1,23 +1,51 @@
 from django.urls import path
 from .views import (
     AdaptarContenidoView, 
+    AdaptarContenidoStreamView,
+    AdaptarLoteView,
+    RegenerarPublicacionView,
     PublicarContenidoView, 
+    EstadoPublicacionView,
+    ProgramarPublicacionView,
     ListaPostsView,    
     DetallePostView,
     EliminarPostView,
+    PublicarTodoView,
+    RateLimitsView,
+    CircuitosView,
+    LLMCacheView,
+    LLMMetricsView,
+    LLMModelosView,
+    ImagenesGeneradasView,
     TikTokAuthView,
     TikTokCallbackView,
     TikTokTokenView,
     UploadMediaView
 )
+from .async_views import AsyncAdaptarContenidoView, AsyncPublicarContenidoView, EventosPostView
 
 urlpatterns = [
     path('adaptar/', AdaptarContenidoView.as_view(), name='adaptar-contenido'),
+    path('adaptar/stream/', AdaptarContenidoStreamView.as_view(), name='adaptar-contenido-stream'),
+    path('adaptar/lote/', AdaptarLoteView.as_view(), name='adaptar-lote'),
+    path('publicaciones/<int:id>/regenerar/', RegenerarPublicacionView.as_view(), name='regenerar-publicacion'),
     path('publicar/', PublicarContenidoView.as_view(), name='publicar-contenido'),
+    path('async/adaptar/', AsyncAdaptarContenidoView.as_view(), name='adaptar-contenido-async'),
+    path('async/publicar/', AsyncPublicarContenidoView.as_view(), name='publicar-contenido-async'),
+    path('publicar/programar/', ProgramarPublicacionView.as_view(), name='programar-publicacion'),
+    path('publicar/jobs/<int:id>/', EstadoPublicacionView.as_view(), name='estado-publicacion'),
     path('upload/', UploadMediaView.as_view(), name='upload_media'),
     path('posts/', ListaPostsView.as_view(), name='lista_posts'),
     path('posts/<int:id>/', DetallePostView.as_view(), name='detalle_post'),
     path('posts/<int:id>/eliminar/', EliminarPostView.as_view(), name='eliminar_post'),
+    path('posts/<int:id>/events/', EventosPostView.as_view(), name='eventos_post'),
+    path('posts/<int:id>/publicar-todo/', PublicarTodoView.as_view(), name='publicar_todo'),
+    path('rate-limits/', RateLimitsView.as_view(), name='rate_limits'),
+    path('circuitos/', CircuitosView.as_view(), name='circuitos'),
+    path('llm-cache/', LLMCacheView.as_view(), name='llm_cache'),
+    path('llm-metrics/', LLMMetricsView.as_view(), name='llm_metrics'),
+    path('llm-modelos/', LLMModelosView.as_view(), name='llm_modelos'),
+    path('imagenes-generadas/', ImagenesGeneradasView.as_view(), name='imagenes_generadas'),
     path('tiktok/auth/', TikTokAuthView.as_view(), name='tiktok_auth'),
     path('tiktok/callback/', TikTokCallbackView.as_view(), name='tiktok_callback'),
     path('tiktok/token/', TikTokTokenView.as_view(), name='tiktok_token'),
@@ -2,24 +2,50 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import redirect, render, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.db.models import Max
 import os
+import json
 
 # Importamos tus modelos y servicios
-from .models import Post, Publication, SocialCredential
-from .llm_service import adaptar_contenido_con_gemini
-from .social_service import publicar_en_facebook, publicar_en_linkedin, publicar_en_whatsapp, publicar_en_instagram, publicar_en_tiktok, get_tiktok_auth_url, get_tiktok_access_token
+from .models import Post, Publication, SocialCredential, PublishJob, PublicationEvent
+from .llm_service import adaptar_contenido_con_gemini, adaptar_contenido_con_gemini_stream, normalizar_plataformas
+from .social_service import get_tiktok_auth_url, get_tiktok_access_token
 from .serializers import PostSerializer
-from .notification_service import notify_success, notify_error, notify_manual_action
+from .publish_service import validar_opciones
+from .job_queue import encolar_si_libre, encolar_pedido, encolar_post_completo, huella_opciones, programar_publicaciones
+from .rate_limit import estado_buckets
+from .circuit_breaker import estado_circuitos
+from .llm_cache import estadisticas as estadisticas_cache
+from .llm_metrics import resumen_metricas
+from .llm_router import estado_modelos
+from .image_cache import estadisticas as estadisticas_imagenes
+from .async_views import iterar_en_hilo
+from .bulk_service import leer_semillas, validar_semillas, adaptar_en_lote
 
 # --- VISTAS DE ESCRITURA/PUBLICACIÓN (POST) ---
 
+def serializar_adaptacion(pub, datos):
+    """
+    Adaptación de una plataforma tal como la recibe el frontend.
+    """
+    return {
+        "id": pub.id,
+        "texto": pub.contenido_adaptado,
+        "hashtags": pub.hashtags,
+        "image_prompt": datos.get('suggested_image_prompt'),
+        "generated_image_url": datos.get('generated_image_url'),
+        "video_hook": datos.get('video_hook')
+    }
+
 class AdaptarContenidoView(APIView):
     """
-    1. Recibe Título y Contenido.
+    1. Recibe Título, Contenido y opcionalmente 'plataformas' (lista; por defecto las 5).
     2. Guarda el Post original en BD.
     3. Llama a Gemini.
     4. Guarda los Borradores (Drafts) en la tabla Publication.
@@ -31,11 +57,16 @@ class AdaptarContenidoView(APIView):
         if not titulo or not contenido:
             return Response({"error": "Faltan datos"}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            plataformas = normalizar_plataformas(request.data.get('plataformas'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # A. Guardar el Post Original (Semilla)
         nuevo_post = Post.objects.create(titulo=titulo, contenido_original=contenido)
 
         # B. Llamar a Gemini
-        adaptaciones_json = adaptar_contenido_con_gemini(titulo, contenido)
+        adaptaciones_json = adaptar_contenido_con_gemini(titulo, contenido, plataformas)
         
         if "error" in adaptaciones_json:
             return Response(adaptaciones_json, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -55,87 +86,347 @@ class AdaptarContenidoView(APIView):
                 estado='draft'
             )
             
-            response_data["adaptaciones"][plataforma] = {
-                "id": pub.id,
-                "texto": texto_adaptado,
-                "hashtags": hashtags,
-                "image_prompt": datos.get('suggested_image_prompt'),
-                "generated_image_url": datos.get('generated_image_url'),
-                "video_hook": datos.get('video_hook')
-            }
+            response_data["adaptaciones"][plataforma] = serializar_adaptacion(pub, datos)
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+class AdaptarContenidoStreamView(APIView):
+    """
+    Igual que AdaptarContenidoView pero responde en streaming (NDJSON, un
+    objeto JSON por línea) a medida que Gemini escribe cada plataforma.
+    Cada borrador se guarda apenas llega su parte, sin esperar al resto.
+    Endpoint: POST /api/adaptar/stream/ (acepta 'plataformas' igual que /api/adaptar/)
+
+    Líneas: {"tipo": "post", "post_id"}, una {"tipo": "adaptacion",
+    "plataforma", "adaptacion"} por red y al final {"tipo": "fin"} o
+    {"tipo": "error", "error"}.
+    """
+    def post(self, request, *args, **kwargs):
+        titulo = request.data.get('titulo')
+        contenido = request.data.get('contenido')
+
+        if not titulo or not contenido:
+            return Response({"error": "Faltan datos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            plataformas = normalizar_plataformas(request.data.get('plataformas'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        nuevo_post = Post.objects.create(titulo=titulo, contenido_original=contenido)
+
+        eventos = self.eventos(nuevo_post, titulo, contenido, plataformas)
+        if isinstance(request._request, ASGIRequest):
+            eventos = iterar_en_hilo(eventos)
+
+        response = StreamingHttpResponse(eventos, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def eventos(self, post, titulo, contenido, plataformas):
+        yield self.linea({"tipo": "post", "post_id": post.id})
+        try:
+            for plataforma, datos in adaptar_contenido_con_gemini_stream(titulo, contenido, plataformas):
+                pub = Publication.objects.create(
+                    post=post,
+                    plataforma=plataforma,
+                    contenido_adaptado=datos.get('text', ''),
+                    hashtags=datos.get('hashtags', []),
+                    estado='draft'
+                )
+                yield self.linea({"tipo": "adaptacion", "plataforma": plataforma, "adaptacion": serializar_adaptacion(pub, datos)})
+        except Exception as e:
+            print(f"Error en adaptar_contenido_con_gemini_stream: {e}")
+            yield self.linea({"tipo": "error", "error": f"Error al procesar la solicitud: {e}"})
+            return
+        yield self.linea({"tipo": "fin", "post_id": post.id})
+
+    def linea(self, datos):
+        return json.dumps(datos, ensure_ascii=False) + "\n"
+
+class AdaptarLoteView(APIView):
+    """
+    Adapta una campaña completa: muchas semillas agrupadas en pocas llamadas
+    a Gemini, con un pool de hilos acotado (ver api/bulk_service.py).
+    Endpoint: POST /api/adaptar/lote/
+    Body: 'posts' ([{titulo, contenido}, ...]) o un archivo 'archivo' (.csv o
+    .jsonl, multipart) y 'plataformas' opcional (lista o separadas por coma).
+
+    Responde en streaming (NDJSON): una línea {"tipo": "progreso", "hechos",
+    "total", "posts"} por lote terminado y al final {"tipo": "fin", ...}.
+    """
+    def post(self, request, *args, **kwargs):
+        plataformas = request.data.get('plataformas')
+        if isinstance(plataformas, str):
+            plataformas = [p.strip() for p in plataformas.split(',') if p.strip()]
+
+        try:
+            plataformas = normalizar_plataformas(plataformas)
+            archivo = request.FILES.get('archivo')
+            if archivo:
+                semillas = leer_semillas(archivo.read(), archivo.name)
+            else:
+                semillas = validar_semillas(request.data.get('posts') or [])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        eventos = self.eventos(semillas, plataformas)
+        if isinstance(request._request, ASGIRequest):
+            eventos = iterar_en_hilo(eventos)
+
+        response = StreamingHttpResponse(eventos, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def eventos(self, semillas, plataformas):
+        for progreso in adaptar_en_lote(semillas, plataformas):
+            tipo = "fin" if progreso.pop('fin', False) else "progreso"
+            yield json.dumps({"tipo": tipo, **progreso}, ensure_ascii=False) + "\n"
+
+class RegenerarPublicacionView(APIView):
+    """
+    Vuelve a generar con Gemini el texto de UNA Publicación existente (ej.
+    "rehacer solo LinkedIn") y la actualiza en el lugar. El prompt lleva solo
+    el esquema de esa plataforma y no se usa la cache: siempre es un texto nuevo.
+    Endpoint: POST /api/publicaciones/<id>/regenerar/
+    """
+    def post(self, request, id, *args, **kwargs):
+        pub = get_object_or_404(Publication.objects.select_related('post'), id=id)
+        if pub.estado in ('published', 'queued', 'processing', 'scheduled'):
+            return Response({"error": f"No se puede regenerar una publicación en estado '{pub.estado}'"},
+                            status=status.HTTP_409_CONFLICT)
+
+        adaptaciones_json = adaptar_contenido_con_gemini(
+            pub.post.titulo, pub.post.contenido_original, [pub.plataforma], usar_cache=False
+        )
+        if "error" in adaptaciones_json:
+            return Response(adaptaciones_json, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if pub.plataforma not in adaptaciones_json:
+            return Response({"error": f"Gemini no devolvió la adaptación de {pub.plataforma}"},
+                            status=status.HTTP_502_BAD_GATEWAY)
+
+        datos = adaptaciones_json[pub.plataforma]
+        pub.contenido_adaptado = datos.get('text', '')
+        pub.hashtags = datos.get('hashtags', [])
+        pub.estado = 'draft'
+        pub.save(update_fields=['contenido_adaptado', 'hashtags', 'estado'])
+
+        return Response({"post_id": pub.post_id, "plataforma": pub.plataforma, "adaptacion": serializar_adaptacion(pub, datos)})
+
+def eventos_desde(publication_ids):
+    """
+    Desde dónde escuchar /api/posts/<id>/events/ (?desde=) para no recibir
+    intentos anteriores: justo antes del último 'queued' más viejo.
+    """
+    encolados = PublicationEvent.objects.filter(publication_id__in=publication_ids, tipo='queued') \
+        .values('publication_id').annotate(ultimo=Max('id')).values_list('ultimo', flat=True)
+    return min(encolados, default=1) - 1
+
 class PublicarContenidoView(APIView):
     """
-    Recibe el ID de una Publicación y la lanza a la API real.
+    Recibe el ID de una Publicación y la encola para que un worker
+    (python manage.py publish_worker) la lance a la API real.
+    Responde 202 con el ID del trabajo.
+
+    El progreso se sigue por SSE en /api/posts/<id>/events/?desde=<eventos_desde>.
+
+    Header opcional Idempotency-Key: si se repite la misma clave para la misma
+    publicación se devuelve el pedido original (y su resultado si ya terminó)
+    sin volver a encolar ni llamar a la red social.
     """
     def post(self, request, *args, **kwargs):
         publication_id = request.data.get('publication_id')
-        image_url = request.data.get('image_url') 
-        video_url = request.data.get('video_url')
-        whatsapp_number = request.data.get('whatsapp_number')
+        opciones = {
+            'image_url': request.data.get('image_url'),
+            'video_url': request.data.get('video_url'),
+            'whatsapp_number': request.data.get('whatsapp_number'),
+        }
         try:
             pub = Publication.objects.get(id=publication_id)
         except Publication.DoesNotExist:
             return Response({"error": "Publicación no encontrada"}, status=404)
 
-        # Incrementar contador de reintentos
-        pub.retry_count += 1
-        pub.save()
+        error = validar_opciones(pub, opciones)
+        if error:
+            return Response({"error": error}, status=400)
 
-        resultado = {}
+        clave = request.headers.get('Idempotency-Key')
+        pedido = pub.pedidos.filter(idempotency_key=clave).first() if clave else None
+        if pedido:
+            if pedido.huella != huella_opciones(opciones):
+                return Response({"error": "Idempotency-Key ya usada con otros datos"}, status=422)
+            return self.respuesta(pub, pedido.job_id, pedido.resultado, repetido=True)
 
-        # --- SWITCH DE PLATAFORMAS ---
-        if pub.plataforma == 'facebook':
-            # Facebook ahora soporta imagen opcional
-            resultado = publicar_en_facebook(pub.contenido_adaptado, image_url)
-            
-        elif pub.plataforma == 'whatsapp':
-            if not whatsapp_number:
-                return Response({"error": "WhatsApp requiere número destino"}, status=400)
-            resultado = publicar_en_whatsapp(pub.contenido_adaptado, whatsapp_number)
+        # Ya publicada (doble click, reintento del cliente): no se vuelve a publicar
+        if pub.estado == 'published':
+            resultado = {"platform": pub.plataforma, "status": "success", "id": pub.api_id, "url": pub.published_url}
+            return self.respuesta(pub, None, resultado, repetido=True)
 
-        elif pub.plataforma == 'instagram':
-            resultado = publicar_en_instagram(pub.contenido_adaptado, image_url)
+        if clave:
+            pedido, creado = encolar_pedido(pub, opciones, clave)
+            return self.respuesta(pub, pedido.job_id, pedido.resultado, repetido=not creado)
 
-        elif pub.plataforma == 'linkedin':
-            resultado = publicar_en_linkedin(pub.contenido_adaptado)
-            
-        elif pub.plataforma == 'tiktok':
-            # Usar video_url si viene en el request, sino intentar usar image_url o fallar
-            media_url = video_url or image_url
-            if not media_url:
-                 return Response({"error": "TikTok requiere video_url"}, status=400)
-            resultado = publicar_en_tiktok(media_url, pub.contenido_adaptado)
-
-        # --- ACTUALIZAR BD Y NOTIFICAR ---
-        if resultado.get('status') == 'success':
-            pub.estado = 'published'
-            pub.api_id = str(resultado.get('id') or resultado.get('sid'))
-            pub.published_url = resultado.get('url', '')
-            pub.fecha_publicacion = timezone.now()
-            pub.last_error = None
-            
-            # Notificar éxito
-            notify_success(pub.plataforma, pub.post.id, pub.api_id)
-            
-        elif resultado.get('status') == 'manual_action_required':
-            pub.estado = 'manual'
-            notify_manual_action(pub.plataforma, pub.post.id)
-            
+        job, creado = encolar_si_libre(pub, opciones)
+        return self.respuesta(pub, job.id, None, repetido=not creado)
+
+    def respuesta(self, pub, job_id, resultado, repetido):
+        body = {
+            "status": "completed" if resultado else "queued",
+            "job_id": job_id,
+            "publication_id": pub.id,
+            "platform": pub.plataforma
+        }
+        if resultado:
+            body["resultado"] = resultado
         else:
-            pub.estado = 'failed'
-            error_msg = str(resultado.get('message'))
-            pub.error_log = error_msg
-            pub.last_error = error_msg
-            
-            # Notificar error
-            notify_error(pub.plataforma, pub.post.id, error_msg)
+            body["eventos_desde"] = eventos_desde([pub.id])
+        response = Response(body, status=status.HTTP_200_OK if resultado else status.HTTP_202_ACCEPTED)
+        if repetido:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+class EstadoPublicacionView(APIView):
+    """
+    Consulta el estado de un trabajo de publicación encolado.
+    Endpoint: GET /api/publicar/jobs/<id>/
+    """
+    def get(self, request, id, *args, **kwargs):
+        job = get_object_or_404(PublishJob, id=id)
+        return Response({
+            "job_id": job.id,
+            "publication_id": job.publication_id,
+            "estado": job.estado,
+            "intentos": job.intentos,
+            "resultado": job.resultado,
+            "creado_en": job.creado_en,
+            "terminado_en": job.terminado_en
+        })
+
+class ProgramarPublicacionView(APIView):
+    """
+    Programa una o varias Publicaciones para publicarse en `scheduled_at`.
+    Las despacha el comando dispatch_scheduled cuando vence la fecha.
+    Endpoint: POST /api/publicar/programar/
+    Body: publication_id o publication_ids, scheduled_at (ISO 8601),
+    image_url, video_url, whatsapp_number.
+    """
+    def post(self, request, *args, **kwargs):
+        ids = request.data.get('publication_ids') or [request.data.get('publication_id')]
+        scheduled_at = parse_datetime(str(request.data.get('scheduled_at') or ''))
+        if scheduled_at is None:
+            return Response({"error": "scheduled_at debe ser una fecha ISO 8601"}, status=400)
+        if timezone.is_naive(scheduled_at):
+            scheduled_at = timezone.make_aware(scheduled_at)
+
+        opciones = {
+            'image_url': request.data.get('image_url'),
+            'video_url': request.data.get('video_url'),
+            'whatsapp_number': request.data.get('whatsapp_number'),
+        }
+        pubs = list(Publication.objects.filter(id__in=[i for i in ids if i]))
+        if not pubs:
+            return Response({"error": "Publicación no encontrada"}, status=404)
+
+        for pub in pubs:
+            error = validar_opciones(pub, opciones)
+            if error:
+                return Response({"error": error, "publication_id": pub.id}, status=400)
+
+        programadas = programar_publicaciones([pub.id for pub in pubs], scheduled_at, opciones)
+        return Response({
+            "status": "scheduled",
+            "scheduled_at": scheduled_at,
+            "programadas": programadas,
+            "omitidas": len(pubs) - programadas  # Ya publicadas o en cola
+        }, status=status.HTTP_202_ACCEPTED)
+
+class PublicarTodoView(APIView):
+    """
+    Encola todas las Publicaciones de un Post (un job por red, igual que
+    POST /api/publicar/) y responde 202 con el job de cada una. El
+    progreso se sigue por SSE en /api/posts/<id>/events/?desde=<eventos_desde>
+    o consultando cada job.
+    Endpoint: POST /api/posts/<id>/publicar-todo/
+    Body: image_url, video_url, whatsapp_number (comunes), 'opciones'
+    ({plataforma: {...}}) y 'plataformas' (lista opcional).
+    Header opcional Idempotency-Key (por red queda '<clave>:<plataforma>').
+    """
+    def post(self, request, id, *args, **kwargs):
+        post = get_object_or_404(Post, id=id)
+
+        opciones = {
+            'image_url': request.data.get('image_url'),
+            'video_url': request.data.get('video_url'),
+            'whatsapp_number': request.data.get('whatsapp_number'),
+        }
+        opciones_por_plataforma = request.data.get('opciones') or {}
+        plataformas = request.data.get('plataformas')
+
+        resultados = encolar_post_completo(
+            post, opciones, opciones_por_plataforma, plataformas, request.headers.get('Idempotency-Key')
+        )
+
+        encoladas = [r['publication_id'] for r in resultados.values() if r['status'] == 'queued']
+        body = {"post_id": post.id, "resultados": resultados}
+        if encoladas:
+            body["eventos_desde"] = eventos_desde(encoladas)
+        return Response(body, status=status.HTTP_202_ACCEPTED if encoladas else status.HTTP_200_OK)
+
+class RateLimitsView(APIView):
+    """
+    Estado de los buckets de rate limit y métricas de espera por throttling.
+    Endpoint: GET /api/rate-limits/
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(estado_buckets())
+
+class CircuitosView(APIView):
+    """
+    Estado del circuit breaker de cada plataforma.
+    Endpoint: GET /api/circuitos/
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(estado_circuitos())
 
-        pub.save()
+class LLMCacheView(APIView):
+    """
+    Hits y misses de la cache de adaptaciones de Gemini.
+    Endpoint: GET /api/llm-cache/
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(estadisticas_cache())
+
+class LLMMetricsView(APIView):
+    """
+    Percentiles de latencia, tokens y costo de las llamadas a Gemini por día y modelo.
+    Endpoint: GET /api/llm-metrics/?dias=7&modelo=models/gemini-flash-latest
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            dias = int(request.query_params.get('dias', 7))
+        except ValueError:
+            return Response({"error": "'dias' debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resumen_metricas(dias, request.query_params.get('modelo')))
 
-        return Response(resultado, status=200)
+class LLMModelosView(APIView):
+    """
+    Cadena de modelos de Gemini y compuerta de cuota de este proceso:
+    llamadas en vuelo y en cola, modelos sin cuota, hedges y failovers.
+    Endpoint: GET /api/llm-modelos/
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(estado_modelos())
+
+class ImagenesGeneradasView(APIView):
+    """
+    Imágenes de Pollinations descargadas en MEDIA_ROOT/generated_images/:
+    cantidad por estado y espacio usado frente a GENERATED_IMAGES_MAX_MB.
+    Endpoint: GET /api/imagenes-generadas/
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(estadisticas_imagenes())
 
 class EliminarPostView(APIView):
     """
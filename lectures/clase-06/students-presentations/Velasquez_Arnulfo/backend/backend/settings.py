@@ -17,6 +17,19 @@ import dj_database_url
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'models/gemini-flash-latest')
+# Modelos de respaldo, en orden, para hedge y failover ante 429 (api/llm_router.py)
+GEMINI_FALLBACK_MODELS = [
+    modelo.strip() for modelo in os.getenv('GEMINI_FALLBACK_MODELS', 'models/gemini-flash-lite-latest').split(',')
+    if modelo.strip()
+]
+# Precio en USD por millón de tokens, para estimar el costo en /api/llm-metrics/
+GEMINI_PRICING = {
+    'input': float(os.getenv('GEMINI_PRICE_INPUT_PER_MTOK', 0.30)),
+    'output': float(os.getenv('GEMINI_PRICE_OUTPUT_PER_MTOK', 2.50)),
+}
+# Precargar el SDK de Gemini al arrancar cada proceso (api/apps.py)
+GEMINI_WARMUP = os.getenv('GEMINI_WARMUP', 'false').lower() in ('1', 'true', 'yes')
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -67,10 +80,15 @@ if FRONTEND_URL:
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# El frontend manda Idempotency-Key al publicar
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.middleware.WhiteNoiseAsyncMiddleware",  # WhiteNoise compatible con vistas async (ASGI)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,6 +126,10 @@ DATABASES = {
         conn_max_age=600
     )
 }
+# SQLite no tiene SELECT ... FOR UPDATE: con BEGIN IMMEDIATE cada transacción
+# toma el lock de escritura al empezar, así dos dispatchers no reclaman la misma fila
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
 
 
 # Password validation
@@ -159,4 +181,135 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Media files (uploads)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Hosts que sirven nuestro MEDIA_URL. Las URLs de media con estos hosts se leen
+# directo del storage en lugar de descargarlas por HTTP desde nosotros mismos.
+MEDIA_HOSTS = ['localhost', '127.0.0.1', '::1']
+MEDIA_HOSTS += [h.strip().lower() for h in os.environ.get('MEDIA_HOSTS', '').split(',') if h.strip()]
+MEDIA_HOSTS += [h.lower() for h in ALLOWED_HOSTS if h != '*']
+
+# True si /media/ responde por HTTP. Con DEBUG lo sirve Django; en producción
+# hay que activarlo (Django lo sirve con SERVE_MEDIA=true, o nginx/un CDN delante).
+# Sin esto las imágenes generadas se entregan con la URL de Pollinations
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', str(DEBUG)).lower() == 'true'
+
+# URL pública del backend (ej. https://api.midominio.com), solo explícita. Instagram
+# descarga las imágenes desde ahí (si SERVE_MEDIA): sin ella, se le pasan desde Pollinations
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+if PUBLIC_BASE_URL:
+    MEDIA_HOSTS.append(PUBLIC_BASE_URL.split('://', 1)[-1].split('/', 1)[0].split(':', 1)[0].lower())
+
+# Imágenes de Pollinations descargadas a MEDIA_ROOT/generated_images/ (api/image_cache.py)
+GENERATED_IMAGES_MAX_MB = float(os.environ.get('GENERATED_IMAGES_MAX_MB', 500))  # Luego se desalojan las menos usadas
+IMAGE_PREFETCH_CONCURRENCY = int(os.environ.get('IMAGE_PREFETCH_CONCURRENCY', 2))
+IMAGE_PREFETCH_TIMEOUT = float(os.environ.get('IMAGE_PREFETCH_TIMEOUT', 90))    # Pollinations renderiza al pedirla
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+
+# Cola de publicación (python manage.py publish_worker)
+PUBLISH_WORKER_BATCH_SIZE = int(os.environ.get('PUBLISH_WORKER_BATCH_SIZE', 10))
+PUBLISH_WORKER_CONCURRENCY = int(os.environ.get('PUBLISH_WORKER_CONCURRENCY', 4))
+PUBLISH_WORKER_POLL_INTERVAL = float(os.environ.get('PUBLISH_WORKER_POLL_INTERVAL', 2))
+PUBLISH_WORKER_LEASE = int(os.environ.get('PUBLISH_WORKER_LEASE', 600))
+
+# Publicaciones programadas (python manage.py dispatch_scheduled)
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', 100))
+SCHEDULER_CONCURRENCY = int(os.environ.get('SCHEDULER_CONCURRENCY', 8))
+SCHEDULER_POLL_INTERVAL = float(os.environ.get('SCHEDULER_POLL_INTERVAL', 5))
+
+# Tokens máximos (estimados) del contenido original que se manda a Gemini; lo que
+# sobra se recorta conservando el comienzo y el final (api/llm_service.py)
+LLM_MAX_CONTENT_TOKENS = int(os.environ.get('LLM_MAX_CONTENT_TOKENS', 2000))
+
+# Cache de adaptaciones de Gemini (api/llm_cache.py)
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 5000))    # Filas en la BD
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get('LLM_CACHE_MEMORY_ENTRIES', 256))  # LRU por proceso
+
+# Adaptación masiva (/api/adaptar/lote/ y python manage.py adaptar_lote)
+LLM_BULK_BATCH_SIZE = int(os.environ.get('LLM_BULK_BATCH_SIZE', 5))        # Posts por llamada a Gemini
+LLM_BULK_MAX_CHARS = int(os.environ.get('LLM_BULK_MAX_CHARS', 12000))      # Texto original máximo por llamada
+LLM_BULK_CONCURRENCY = int(os.environ.get('LLM_BULK_CONCURRENCY', 3))      # Llamadas a Gemini en paralelo
+
+# Cadena de modelos y compuerta de cuota por proceso (api/llm_router.py)
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 60))          # Plazo total por pedido, respaldos incluidos
+LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 95))        # 0 = sin hedge
+LLM_HEDGE_MIN_SECONDS = float(os.environ.get('LLM_HEDGE_MIN_SECONDS', 3))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.environ.get('LLM_HEDGE_DEFAULT_SECONDS', 10))  # Sin historial de latencias
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))             # Llamadas a Gemini en vuelo por proceso
+LLM_QUEUE_MAX_WAIT = float(os.environ.get('LLM_QUEUE_MAX_WAIT', 30))            # Espera máxima en cola por lugar o cuota
+LLM_QUOTA_COOLDOWN = float(os.environ.get('LLM_QUOTA_COOLDOWN', 60))            # Pausa tras un 429 sin retry_delay
+
+# Stream SSE de progreso (/api/posts/<id>/events/)
+SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 1))      # Cada cuánto se buscan eventos nuevos
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_MAX_SECONDS = float(os.environ.get('SSE_MAX_SECONDS', 300))        # Luego el navegador reconecta con Last-Event-ID
+
+# Clientes HTTP hacia las APIs sociales (api/http_client.py)
+SOCIAL_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SOCIAL_HTTP_CONNECT_TIMEOUT', 5))
+SOCIAL_HTTP_READ_TIMEOUT = float(os.environ.get('SOCIAL_HTTP_READ_TIMEOUT', 30))
+SOCIAL_HTTP_UPLOAD_READ_TIMEOUT = float(os.environ.get('SOCIAL_HTTP_UPLOAD_READ_TIMEOUT', 300))
+SOCIAL_HTTP_POOL_CONNECTIONS = int(os.environ.get('SOCIAL_HTTP_POOL_CONNECTIONS', 4))
+SOCIAL_HTTP_POOL_MAXSIZE = int(os.environ.get('SOCIAL_HTTP_POOL_MAXSIZE', 10))
+# Conexiones simultáneas máximas por plataforma en las vistas async (httpx)
+SOCIAL_HTTP_ASYNC_MAX_CONNECTIONS = int(os.environ.get('SOCIAL_HTTP_ASYNC_MAX_CONNECTIONS', 100))
+
+# Tamaño de cada chunk al subir videos a TikTok (entre 5 MB y 64 MB)
+TIKTOK_UPLOAD_CHUNK_SIZE = int(os.environ.get('TIKTOK_UPLOAD_CHUNK_SIZE', 10 * 1024 * 1024))
+
+# Dominios verificados en el portal de TikTok: los videos servidos desde
+# ellos se publican con PULL_FROM_URL (sin descargarlos y re-subirlos).
+# Solo explícitos: un dominio sin verificar (o que no sirve /media/) hace
+# que TikTok acepte el pedido y falle después al descargar
+TIKTOK_VERIFIED_DOMAINS = [d.strip().lower() for d in os.environ.get('TIKTOK_VERIFIED_DOMAINS', '').split(',') if d.strip()]
+
+# Segundos que se reutiliza el URN de LinkedIn antes de volver a consultar /v2/userinfo
+LINKEDIN_URN_CACHE_TTL = int(os.environ.get('LINKEDIN_URN_CACHE_TTL', 24 * 3600))
+
+# Reintentos automáticos máximos por plataforma cuando el worker reprograma un error transitorio
+RETRY_BUDGETS = {
+    plataforma: int(os.environ.get(f'RETRY_BUDGET_{plataforma.upper()}', presupuesto))
+    for plataforma, presupuesto in {
+        'facebook': 3,
+        'instagram': 3,
+        'linkedin': 3,
+        'whatsapp': 3,
+        'tiktok': 2,
+    }.items()
+}
+RETRY_INITIAL_DELAY = float(os.environ.get('RETRY_INITIAL_DELAY', 5))
+RETRY_BACKOFF_FACTOR = float(os.environ.get('RETRY_BACKOFF_FACTOR', 3))
+
+# Rate limit por plataforma y credencial, compartido vía BD entre procesos.
+# Formato "llamadas/segundos", ej: RATE_LIMIT_FACEBOOK=200/3600
+def _parsear_rate_limit(valor):
+    llamadas, segundos = valor.split('/')
+    return int(llamadas), float(segundos)
+
+SOCIAL_RATE_LIMITS = {
+    plataforma: _parsear_rate_limit(os.environ.get(f'RATE_LIMIT_{plataforma.upper()}', limite))
+    for plataforma, limite in {
+        'facebook': '200/3600',    # Graph API: 200 llamadas por usuario por hora
+        'instagram': '50/86400',   # Content Publishing: 50 publicaciones por día
+        'linkedin': '150/86400',   # Share API: 150 posts por miembro por día
+        'whatsapp': '1/1',         # Twilio: ~1 mensaje por segundo por número
+        'tiktok': '6/60',          # /post/publish/video/init/: 6 por minuto por token
+    }.items()
+}
+# Segundos máximos que una llamada espera en cola por un token antes de rendirse
+RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 30))
+
+# Circuit breaker por plataforma (api/circuit_breaker.py)
+CIRCUIT_BREAKER = {
+    'window_seconds': float(os.environ.get('CIRCUIT_WINDOW_SECONDS', 60)),
+    'min_calls': int(os.environ.get('CIRCUIT_MIN_CALLS', 5)),        # Llamadas mínimas antes de evaluar
+    'error_rate': float(os.environ.get('CIRCUIT_ERROR_RATE', 0.5)),
+    'slow_rate': float(os.environ.get('CIRCUIT_SLOW_RATE', 0.8)),
+    'open_seconds': float(os.environ.get('CIRCUIT_OPEN_SECONDS', 60)),
+    'probe_timeout': float(os.environ.get('CIRCUIT_PROBE_TIMEOUT', 30)),
+}
+# Una llamada más lenta que esto cuenta como "lenta" (la subida a TikTok tarda más)
+CIRCUIT_SLOW_CALL_SECONDS = {
+    'default': float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', 10)),
+    'tiktok': float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS_TIKTOK', 300)),
+}
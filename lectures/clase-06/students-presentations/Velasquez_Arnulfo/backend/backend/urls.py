@@ -31,9 +31,12 @@ urlpatterns = [
     path('tiktok5bKFy1LfPc3Xzmg91my2FQb4OLJImvpN.txt', lambda r: HttpResponse("tiktok-developers-site-verification=5bKFy1LfPc3Xzmg91my2FQb4OLJImvpN", content_type="text/plain")),
 ]
 
-# Servir archivos de media en desarrollo
+# Servir archivos de media (en desarrollo, o en producción con SERVE_MEDIA=true)
 from django.conf import settings
-from django.conf.urls.static import static
+from django.urls import re_path
+from django.views.static import serve
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
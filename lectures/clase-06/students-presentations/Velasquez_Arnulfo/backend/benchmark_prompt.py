@@ -0,0 +1,153 @@
+"""
+Compara los tokens de entrada por llamada del prompt anterior (v1: reglas
+y JSON de ejemplo dentro de cada pedido) contra el actual (v2:
+system_instruction + response_schema + contenido recortado).
+
+Sin API key estima ~4 caracteres por token. Con --api usa count_tokens de
+Gemini, que cuenta también la system_instruction y el response_schema.
+
+Uso:
+    python benchmark_prompt.py
+    python benchmark_prompt.py --api
+    python benchmark_prompt.py --archivo campana.csv   # semillas reales
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from api import llm_service  # noqa: E402
+from api.bulk_service import leer_semillas  # noqa: E402
+
+# --- Prompt v1 (antes de PROMPT_VERSION = 2), solo para comparar ---
+ESQUEMAS_V1 = {
+    'facebook': """"facebook": {
+        "text": "Texto adaptado para Facebook (tono casual/informativo, máximo 500 caracteres).",
+        "hashtags": ["#Innovacion", "#Tecnologia"],
+        "character_count": 0
+      }""",
+    'instagram': """"instagram": {
+        "text": "Texto adaptado para Instagram (tono visual/casual, máximo 200 caracteres, con emojis).",
+        "hashtags": ["#Tech", "#Innovation", "#NewFeature"],
+        "character_count": 0,
+        "suggested_image_prompt": "Prompt para IA de imagen (ej. 'Modern tech interface, abstract lines, vibrant colors, high detail')"
+      }""",
+    'linkedin': """"linkedin": {
+        "text": "Texto adaptado para LinkedIn (tono profesional, máximo 600 caracteres, con estructura profesional).",
+        "hashtags": ["#Technology", "#Innovation", "#Negocios"],
+        "character_count": 0,
+        "tone": "professional"
+      }""",
+    'tiktok': """"tiktok": {
+        "text": "Texto adaptado para TikTok (tono joven/trending, máximo 150 caracteres, con emojis).",
+        "hashtags": ["#Tech", "#Viral", "#NewFeature"],
+        "character_count": 0,
+        "video_hook": "Frase corta y muy llamativa para el inicio de un video de TikTok (max 15 palabras)."
+      }""",
+    'whatsapp': """"whatsapp": {
+        "text": "Texto adaptado para WhatsApp (tono conversacional/directo, máximo 300 caracteres, con emojis).",
+        "character_count": 0,
+        "format": "conversational"
+      }""",
+}
+
+
+def crear_prompt_v1(titulo, contenido, plataformas):
+    extras = ""
+    if 'instagram' in plataformas:
+        extras += "\n    Para Instagram, también debes sugerir un prompt para una IA de generación de imágenes."
+    if 'tiktok' in plataformas:
+        extras += "\n    Para TikTok, también debes sugerir un \"gancho\" para el video."
+    esquema = ",\n      ".join(ESQUEMAS_V1[p] for p in plataformas)
+    cantidad = f"{len(plataformas)} plataformas" if len(plataformas) > 1 else "1 plataforma"
+    return f"""
+    Eres un experto en marketing de redes sociales. Tu tarea es adaptar el siguiente contenido para {cantidad}.{extras}
+
+    Contenido Original:
+    Título: "{titulo}"
+    Contenido: "{contenido}"
+
+    Debes retornar ÚNICAMENTE un objeto JSON válido, sin ningún texto antes o después. La estructura debe ser la siguiente:
+
+    {{
+      {esquema}
+    }}
+
+    Instrucciones Adicionales:
+    - Reemplaza los textos de ejemplo con el contenido real adaptado.
+    - Calcula el 'character_count' real para cada texto.
+    - NO incluyas '```json' ni '```' en la respuesta. Solo el JSON.
+    """
+
+
+def estimar(texto):
+    return round(len(texto) / llm_service.CARACTERES_POR_TOKEN)
+
+
+def tokens_v1(titulo, contenido, plataformas, api):
+    prompt = crear_prompt_v1(titulo, contenido, plataformas)
+    if api:
+        import google.generativeai as genai
+        return genai.GenerativeModel(settings.GEMINI_MODEL).count_tokens(prompt).total_tokens
+    return estimar(prompt)
+
+
+def tokens_v2(titulo, contenido, plataformas, api):
+    prompt = llm_service.crear_prompt(titulo, contenido, plataformas)
+    config = llm_service.config_respuesta(tuple(plataformas))
+    if api:
+        return llm_service.obtener_modelo().count_tokens(prompt, generation_config=config).total_tokens
+    return estimar(llm_service.INSTRUCCION_SISTEMA + prompt + json.dumps(config['response_schema'], separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens de entrada: prompt v1 vs v2.")
+    parser.add_argument("--api", action="store_true", help="Contar con count_tokens de Gemini (requiere GEMINI_API_KEY).")
+    parser.add_argument("--archivo", help="CSV/JSONL con semillas (titulo, contenido).")
+    args = parser.parse_args()
+
+    if args.api and not llm_service.api_key_from_env:
+        raise SystemExit("--api requiere GEMINI_API_KEY")
+
+    if args.archivo:
+        ruta = Path(args.archivo)
+        semillas = leer_semillas(ruta.read_bytes(), ruta.name)
+    else:
+        parrafo = ("Lanzamos una nueva función que permite programar publicaciones en todas las redes "
+                   "desde un solo lugar, con métricas en tiempo real y sugerencias de horarios. ")
+        semillas = [
+            ("Nueva función de programación", parrafo * 2),
+            ("Resumen del trimestre", parrafo * 10),
+            ("Artículo largo del blog", parrafo * 400),  # Lo recorta el guard de tamaño
+        ]
+
+    casos = [("5 redes", llm_service.PLATAFORMAS), ("solo linkedin", ['linkedin'])]
+    modo = "count_tokens" if args.api else f"estimado (~{llm_service.CARACTERES_POR_TOKEN} caracteres/token)"
+    print(f"Tokens de entrada por llamada, {modo}\n")
+    print(f"{'semilla':<32} {'redes':<14} {'v1':>8} {'v2':>8} {'ahorro':>8}")
+
+    total_v1 = total_v2 = 0
+    for titulo, contenido in semillas:
+        for nombre, plataformas in casos:
+            v1 = tokens_v1(titulo, contenido, plataformas, args.api)
+            v2 = tokens_v2(titulo, contenido, plataformas, args.api)
+            total_v1 += v1
+            total_v2 += v2
+            print(f"{titulo[:32]:<32} {nombre:<14} {v1:>8} {v2:>8} {1 - v2 / v1:>7.0%}")
+
+    print(f"\nTotal: v1 {total_v1} tokens, v2 {total_v2} tokens ({1 - total_v2 / total_v1:.0%} menos)")
+
+
+if __name__ == "__main__":
+    main()
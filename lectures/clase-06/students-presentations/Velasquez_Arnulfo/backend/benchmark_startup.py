@@ -0,0 +1,108 @@
+"""
+Mide cuánto tarda en arrancar un worker del backend y qué módulos pesan más.
+
+Lanza N procesos nuevos con `python -X importtime` que hacen lo mismo que
+gunicorn al arrancar (django.setup() + cargar las urls) y promedia el tiempo
+de import acumulado de cada módulo.
+
+Uso:
+    python benchmark_startup.py
+    python benchmark_startup.py --runs 10 --top 30 --json startup.json
+    python benchmark_startup.py --warmup   # incluye la precarga de Gemini
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+ARRANQUE = (
+    "import django, os; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings'); "
+    "django.setup(); "
+    "import backend.wsgi, backend.urls"
+)
+
+
+def medir_arranque(warmup):
+    """
+    Arranca un proceso y retorna (segundos totales, {módulo: microsegundos acumulados}).
+    """
+    env = {**os.environ, "GEMINI_WARMUP": "true" if warmup else "false"}
+    codigo = ARRANQUE
+    if warmup:
+        # La precarga corre en un hilo: la esperamos para medirla
+        codigo += "; from api.llm_service import calentar; calentar()"
+
+    inicio = time.perf_counter()
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    total = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        raise SystemExit(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+
+    modulos = {}
+    for linea in proceso.stderr.splitlines():
+        # Formato: "import time:  self [us] | cumulative | imported package"
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos[nombre.strip()] = int(acumulado)
+    return total, modulos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del arranque del backend.")
+    parser.add_argument("--runs", type=int, default=5, help="Procesos a medir.")
+    parser.add_argument("--top", type=int, default=20, help="Módulos más lentos a mostrar.")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados.")
+    parser.add_argument("--warmup", action="store_true", help="Incluir la precarga de Gemini (GEMINI_WARMUP).")
+    args = parser.parse_args()
+
+    totales = []
+    por_modulo = defaultdict(list)
+    for _ in range(args.runs):
+        total, modulos = medir_arranque(args.warmup)
+        totales.append(total)
+        for nombre, acumulado in modulos.items():
+            por_modulo[nombre].append(acumulado)
+
+    # Solo paquetes de primer nivel y módulos del proyecto, ordenados por mediana
+    medianas = {
+        nombre: statistics.median(tiempos) / 1000
+        for nombre, tiempos in por_modulo.items()
+        if "." not in nombre or nombre.startswith(("api.", "backend."))
+    }
+    ranking = sorted(medianas.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"Arranque ({args.runs} procesos): mediana {statistics.median(totales):.3f}s, "
+          f"min {min(totales):.3f}s, max {max(totales):.3f}s")
+    print(f"\n{'ms acumulados':>14}  módulo")
+    for nombre, ms in ranking:
+        print(f"{ms:14.1f}  {nombre}")
+
+    cargados_lazy = [m for m in ("google.generativeai", "PIL") if m in por_modulo]
+    if cargados_lazy:
+        print(f"\nADVERTENCIA: se importaron al arrancar: {', '.join(cargados_lazy)}")
+
+    if args.json:
+        with open(args.json, "w") as archivo:
+            json.dump({
+                "runs": args.runs,
+                "warmup": args.warmup,
+                "total_segundos": totales,
+                "modulos_ms": dict(ranking),
+            }, archivo, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -83,6 +83,56 @@ const PreviewAdaptations = () => {
         setEditedContent(prev => ({ ...prev, [platform]: value }));
     };
 
+    // Respaldo del stream: consultamos el job hasta que termine
+    const esperarTrabajo = async (jobId) => {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const { data } = await axios.get(`${API_BASE_URL}/publicar/jobs/${jobId}/`);
+            if (data.estado === 'done' || data.estado === 'failed') {
+                return data.resultado || {};
+            }
+        }
+    };
+
+    // El backend encola las publicaciones (202); escuchamos el stream SSE del post hasta que terminen.
+    // jobs: { publicationId: jobId }. Resuelve { publicationId: resultado }
+    const esperarPublicaciones = (jobs, desde) => new Promise(resolve => {
+        const finales = { published: 'success', manual: 'manual_action_required', failed: 'error' };
+        const eventos = new EventSource(`${API_BASE_URL}/posts/${adaptations.post_id}/events/?desde=${desde || 0}`);
+        const resultados = {};
+        const faltan = () => Object.keys(jobs).filter(id => !(id in resultados));
+        let terminado = false;
+
+        Object.keys(finales).forEach(tipo => {
+            eventos.addEventListener(tipo, (e) => {
+                const evento = JSON.parse(e.data);
+                const id = String(evento.publication_id);
+                if (terminado || !(id in jobs) || id in resultados) return;
+                resultados[id] = { status: finales[tipo], message: evento.mensaje, ...evento.datos };
+                if (faltan().length === 0) {
+                    terminado = true;
+                    eventos.close();
+                    resolve(resultados);
+                }
+            });
+        });
+
+        // El stream terminó sin el evento final de alguna o se cortó
+        // (EventSource reconectaría con el mismo ?desde=): pasamos a consultar sus jobs
+        const sondear = () => {
+            if (terminado) return;
+            terminado = true;
+            eventos.close();
+            Promise.all(faltan().map(id =>
+                esperarTrabajo(jobs[id])
+                    .catch(() => ({ status: 'error' }))
+                    .then(resultado => { resultados[id] = resultado; })
+            )).then(() => resolve(resultados));
+        };
+        eventos.addEventListener('end', sondear);
+        eventos.onerror = sondear;
+    });
+
     const handlePublish = async (platform, publicationId) => {
         setPublishingStatus(prev => ({ ...prev, [platform]: 'publishing' }));
 
@@ -128,11 +178,16 @@ const PreviewAdaptations = () => {
                 body.video_url = videoURL;
             }
 
-            const response = await axios.post(`${API_BASE_URL}/publicar/`, body);
+            // La misma clave en un reintento hace que el backend no publique dos veces
+            const response = await axios.post(`${API_BASE_URL}/publicar/`, body, {
+                headers: { 'Idempotency-Key': `${publicationId}-${crypto.randomUUID()}` }
+            });
+            const resultado = response.data.resultado ||
+                (await esperarPublicaciones({ [publicationId]: response.data.job_id }, response.data.eventos_desde))[publicationId];
 
-            if (response.data.status === 'success') {
+            if (resultado.status === 'success') {
                 setPublishingStatus(prev => ({ ...prev, [platform]: 'success' }));
-            } else if (response.data.status === 'manual_action_required') {
+            } else if (resultado.status === 'manual_action_required') {
                 setPublishingStatus(prev => ({ ...prev, [platform]: 'manual' }));
             } else {
                 setPublishingStatus(prev => ({ ...prev, [platform]: 'error' }));
@@ -143,13 +198,50 @@ const PreviewAdaptations = () => {
         }
     };
 
-    const handlePublishAll = () => {
-        Object.keys(editedContent).forEach(platform => {
-            if (selectedPlatforms[platform] && !publishingStatus[platform]) {
-                const publicationId = adaptations.adaptaciones[platform].id;
-                handlePublish(platform, publicationId);
+    // Una sola llamada: el backend encola todas las plataformas y los workers las publican en paralelo
+    const handlePublishAll = async () => {
+        const plataformas = Object.keys(editedContent).filter(
+            platform => selectedPlatforms[platform] && !publishingStatus[platform]
+        );
+        if (plataformas.length === 0) return;
+
+        const opciones = {};
+        plataformas.forEach(platform => {
+            const generatedImage = adaptations.adaptaciones[platform].generated_image_url;
+            if (platform === 'instagram' || (platform === 'facebook' && includeImage[platform])) {
+                opciones[platform] = { image_url: generatedImage };
             }
         });
+
+        plataformas.forEach(platform => setPublishingStatus(prev => ({ ...prev, [platform]: 'publishing' })));
+
+        try {
+            const response = await axios.post(`${API_BASE_URL}/posts/${adaptations.post_id}/publicar-todo/`, {
+                plataformas,
+                opciones,
+                video_url: videoURL || undefined,
+                whatsapp_number: whatsappNumber || undefined
+            });
+
+            // Cada red queda encolada como un job; esperamos a que terminen todas
+            const jobs = {};
+            Object.values(response.data.resultados).forEach(r => {
+                if (r.status === 'queued') jobs[r.publication_id] = r.job_id;
+            });
+            const finales = Object.keys(jobs).length ? await esperarPublicaciones(jobs, response.data.eventos_desde) : {};
+
+            plataformas.forEach(platform => {
+                const encolado = response.data.resultados[platform] || {};
+                const resultado = encolado.status === 'queued' ? finales[encolado.publication_id] || {} : encolado;
+                let estado = 'error';
+                if (resultado.status === 'success') estado = 'success';
+                else if (resultado.status === 'manual_action_required') estado = 'manual';
+                setPublishingStatus(prev => ({ ...prev, [platform]: estado }));
+            });
+        } catch (error) {
+            console.error('Error:', error);
+            plataformas.forEach(platform => setPublishingStatus(prev => ({ ...prev, [platform]: 'error' })));
+        }
     };
 
     const getStatusBadge = (platform) => {